@@ -2,18 +2,19 @@ from ._anvil_designer import ArchivesFormTemplate
 from anvil import *
 import anvil.server
 import anvil.users
-from ...Cache import reports_cache_manager
+import anvil.js
+import anvil.media
+from ...Cache import reports_cache_manager, patient_cache_manager
 from ... import TranslationService as t
 from ...LoggingClient import ClientLogger
 from ...AppEvents import events
 from ...AuthHelpers import setup_auth_handlers
+from ...ReportIndex import ReportIndex, UNSPECIFIED_STATUS
+from ...TaskProgress import wait_for_task
 
-
-def safe_value(data_dict, key, default_value):
-  if data_dict is None:
-    return default_value
-  val = data_dict.get(key)
-  return default_value if val is None else val
+# Reports per list_reports call. Only the first page is loaded with the
+# archives; the others are loaded on demand.
+REPORTS_PAGE_SIZE = 50
 
 
 class ArchivesForm(ArchivesFormTemplate):
@@ -28,7 +29,14 @@ class ArchivesForm(ArchivesFormTemplate):
     self.is_supervisor = False
     self.has_structure = False
     self.my_reports = []
+    # list_reports cursor of the next page of my_reports, None once all loaded.
+    self.my_reports_cursor = None
+    # While my_reports is incomplete, filters and search run on the server:
+    # {"reports", "next_cursor"} of the matching reports loaded so far.
+    self.server_results = None
     self.structure_reports = []
+    # Report counts of the structure, from get_structure_report_summary.
+    self.structure_summary = None
     self.structure_name = None
     self.affiliated_vets = []
     self.status_options_keys = []
@@ -37,6 +45,7 @@ class ArchivesForm(ArchivesFormTemplate):
     self.selected_statuses = []
     self.selected_vets_emails = []
     self.selected_patient_ids = []
+    self.report_indexes = {"my_reports": ReportIndex(), "structure_reports": ReportIndex()}
     self.logger.debug("Initialization complete.")
 
   def update_ui_texts(self, **event_args):
@@ -67,6 +76,11 @@ class ArchivesForm(ArchivesFormTemplate):
       "archivesForm-button-myReportsFilter",
       t.t("archivesForm_button_filter"),
     )
+    self.call_js(
+      "setElementText",
+      "archivesForm-button-myReportsMore",
+      t.t("archivesForm_button_loadMore"),
+    )
     self.call_js(
       "setElementText",
       "archivesForm-h2-structureTitle",
@@ -133,6 +147,27 @@ class ArchivesForm(ArchivesFormTemplate):
       t.t("archivesForm_button_filterApply"),
     )
 
+    self.call_js(
+      "setElementText",
+      "archivesForm-button-bulkApply",
+      t.t("archivesForm_button_bulkApply"),
+    )
+    self.call_js(
+      "setElementText",
+      "archivesForm-button-bulkExport",
+      t.t("archivesForm_button_bulkExport"),
+    )
+    self.call_js(
+      "setElementText",
+      "archivesForm-button-bulkDelete",
+      t.t("archivesForm_button_bulkDelete"),
+    )
+    self.call_js(
+      "setElementText",
+      "archivesForm-button-bulkClear",
+      t.t("archivesForm_button_bulkClear"),
+    )
+
     # Pass dynamic and renderer texts to JavaScript
     locale_texts = {
       "monthNames": [
@@ -155,8 +190,13 @@ class ArchivesForm(ArchivesFormTemplate):
       "notSpecified": t.t("renderer_notSpecified"),
       "noMyReports": t.t("renderer_noMyReports"),
       "noStructureReports": t.t("renderer_noStructureReports"),
+      "bulkSelected": t.t("archivesForm_span_bulkSelected", count="{count}"),
     }
     self.call_js("setLocaleTexts", locale_texts)
+    for index in self.report_indexes.values():
+      index.relabel(t.t)
+    if self.structure_summary:
+      self.show_structure_summary()
 
   def form_show(self, **event_args):
     self.logger.info("Form showing...")
@@ -179,17 +219,50 @@ class ArchivesForm(ArchivesFormTemplate):
 
     self.logger.debug(f"User is supervisor: {self.is_supervisor}")
 
+    # Render from the cache (memory, else disk) at once, then revalidate.
+    reports_cache_manager.restore()
+    cached_patients = patient_cache_manager.peek()
+    if (
+      reports_cache_manager.get()[0] is not None
+      and reports_cache_manager.status_options is not None
+      and cached_patients is not None
+    ):
+      self.logger.info("Cache hit. Rendering reports from the client-side cache.")
+      self.status_options_keys = reports_cache_manager.status_options
+      self.my_patients = cached_patients
+      self.show_cached_reports()
+      self.render_archives()
+      self.revalidate_archives(user_data)
+    else:
+      self.load_filter_options()
+      if reports_cache_manager.needs_sync() and not self.sync_cached_reports():
+        reports_cache_manager.invalidate()
+      if reports_cache_manager.get()[0] is not None:
+        self.show_cached_reports()
+      else:
+        self.load_fresh_reports(user_data)
+      self.render_archives()
+    self.logger.info("Form setup complete.")
+
+  def load_filter_options(self):
+    """Fetches the status and patient filter options. Returns True if they changed."""
     try:
       self.logger.debug("Fetching filter options from server...")
-      self.status_options_keys = anvil.server.call_s("get_status_options")
-      self.my_patients = anvil.server.call_s("get_my_patients_for_filtering")
+      status_options = anvil.server.call_s("get_status_options")
+      patients = anvil.server.call_s("get_my_patients_for_filtering")
       self.logger.info("Successfully fetched filter options.")
     except Exception as e:
       self.logger.error("Could not load filter options.", e)
       alert(f"Could not load filter options: {e}")
-      self.status_options_keys = []
-      self.my_patients = []
-
+      return False
+    changed = status_options != self.status_options_keys or patients != self.my_patients
+    self.status_options_keys = status_options
+    self.my_patients = patients
+    reports_cache_manager.set_status_options(status_options)
+    patient_cache_manager.set(patients)
+    return changed
+
+  def show_cached_reports(self):
     (
       my_reports,
       structure_reports,
@@ -197,57 +270,64 @@ class ArchivesForm(ArchivesFormTemplate):
       cached_structure_name,
       cached_affiliated_vets,
     ) = reports_cache_manager.get()
+    self.my_reports = my_reports or []
+    self.my_reports_cursor = reports_cache_manager.my_reports_cursor
+    self.structure_reports = structure_reports or []
+    self.has_structure = cached_has_structure
+    self.structure_name = cached_structure_name
+    self.affiliated_vets = cached_affiliated_vets or []
+
+  def load_fresh_reports(self, user_data):
+    """Loads every list from the server and caches them."""
+    self.logger.warning("Cache is invalid or expired. Fetching fresh reports from server.")
+    self.call_js("showArchivesSpinner")
+    self.structure_summary = None
+    try:
+      # Taken before loading, so the next sync also covers concurrent writes.
+      sync_token = anvil.server.call_s("sync_reports")["sync_token"]
+      fresh_my_reports, my_reports_cursor = self.load_my_reports()
+      fresh_structure_reports = []
 
-    if my_reports is not None:
-      self.logger.info("Cache hit. Loading reports from client-side cache.")
-      self.my_reports = my_reports
-      self.structure_reports = structure_reports or []
-      self.has_structure = cached_has_structure
-      self.structure_name = cached_structure_name
-      self.affiliated_vets = cached_affiliated_vets or []
-    else:
-      self.logger.warning(
-        "Cache is invalid or expired. Fetching fresh reports from server."
-      )
-      self.call_js("showArchivesSpinner")
-      try:
-        fresh_my_reports = anvil.server.call_s("read_reports") or []
-        fresh_structure_reports = []
-
-        # This logic now uses the reliable 'is_independent' flag from our new model
-        self.has_structure = not user_data.get("is_independent", True)
+      # This logic now uses the reliable 'is_independent' flag from our new model
+      self.has_structure = not user_data.get("is_independent", True)
 
-        if self.is_supervisor and self.has_structure:
-          self.logger.info(
-            f"Supervisor has structure '{self.structure_name}': {self.has_structure}"
-          )
-          fresh_structure_reports = (
-            anvil.server.call_s("get_reports_by_structure", self.structure_name) or []
-          )
-          self.affiliated_vets = (
-            anvil.server.call_s("get_vets_in_structure", self.structure_name) or []
-          )
-        else:
-          self.affiliated_vets = []
-
-        self.my_reports = fresh_my_reports
-        self.structure_reports = fresh_structure_reports
-        reports_cache_manager.set(
-          my_reports=self.my_reports,
-          structure_reports=self.structure_reports,
-          has_structure=self.has_structure,
-          structure_name=self.structure_name,
-          affiliated_vets=self.affiliated_vets,
+      if self.is_supervisor and self.has_structure:
+        self.logger.info(
+          f"Supervisor has structure '{self.structure_name}': {self.has_structure}"
         )
-        self.logger.info("Successfully fetched and cached fresh reports.")
-      except Exception as e:
-        self.logger.error("An error occurred while loading reports from server.", e)
-        alert(f"An error occurred while loading reports: {e}")
-        self.my_reports = []
-        self.structure_reports = []
-      finally:
-        self.call_js("hideArchivesSpinner")
+        fresh_structure_reports = (
+          anvil.server.call_s("get_reports_by_structure", self.structure_name) or []
+        )
+        self.affiliated_vets = (
+          anvil.server.call_s("get_vets_in_structure", self.structure_name) or []
+        )
+      else:
+        self.affiliated_vets = []
+
+      self.my_reports = fresh_my_reports
+      self.my_reports_cursor = my_reports_cursor
+      self.structure_reports = fresh_structure_reports
+      reports_cache_manager.set(
+        my_reports=self.my_reports,
+        structure_reports=self.structure_reports,
+        has_structure=self.has_structure,
+        structure_name=self.structure_name,
+        affiliated_vets=self.affiliated_vets,
+        sync_token=sync_token,
+      )
+      reports_cache_manager.set_my_reports_cursor(my_reports_cursor)
+      self.logger.info("Successfully fetched and cached fresh reports.")
+    except Exception as e:
+      self.logger.error("An error occurred while loading reports from server.", e)
+      alert(f"An error occurred while loading reports: {e}")
+      self.my_reports = []
+      self.my_reports_cursor = None
+      self.structure_reports = []
+    finally:
+      self.call_js("hideArchivesSpinner")
 
+  def render_archives(self):
+    self.build_report_indexes()
     status_options_for_js = [
       {"key": key, "display": t.t(key)} for key in self.status_options_keys
     ]
@@ -261,18 +341,103 @@ class ArchivesForm(ArchivesFormTemplate):
       status_options_for_js,
       self.my_patients,
     )
-    self.apply_filters("my_reports")
+    self.apply_filters(anvil.js.window.archives_activeSubTab or "my_reports")
     self.call_js("reAttachArchivesEvents")
-    self.logger.info("Form setup complete.")
+
+  def revalidate_archives(self, user_data):
+    """
+    Brings a screen rendered from the cache up to date: refetches the filter
+    options, syncs the reports (or reloads them if a sync is not possible)
+    and renders again only when something changed.
+    """
+    changed = False
+    if not patient_cache_manager.is_valid():
+      changed = self.load_filter_options()
+    if reports_cache_manager.needs_sync():
+      if not self.sync_cached_reports():
+        reports_cache_manager.invalidate()
+        self.load_fresh_reports(user_data)
+      changed = True
+    if changed:
+      self.logger.info("Re-rendering archives after revalidation.")
+      self.show_cached_reports()
+      self.render_archives()
+
+  def sync_cached_reports(self):
+    """
+    Merges the reports changed or deleted since the cache's high-water mark
+    into the cached lists. Returns False when a full reload is needed instead.
+    """
+    if reports_cache_manager.sync_token is None:
+      return False
+    try:
+      delta = anvil.server.call_s(
+        "sync_reports",
+        reports_cache_manager.sync_token,
+        self.structure_name if self.is_supervisor else None,
+      )
+    except Exception as e:
+      self.logger.error("Delta sync of the reports cache failed.", e)
+      return False
+    if delta.get("full_resync"):
+      self.logger.info("Reports cache is too old for a delta sync.")
+      return False
+    reports_cache_manager.merge(delta)
+    self.logger.info(
+      f"Reports cache synced: {len(delta['changed'])} changed, "
+      f"{len(delta['deleted'])} deleted."
+    )
+    return True
+
+  def load_my_reports(self):
+    """
+    Fetches the first page of the vet's report summaries. Returns the reports
+    and the cursor of the next page, or None if there is no other page.
+    """
+    page = anvil.server.call_s("list_reports", page_size=REPORTS_PAGE_SIZE)
+    return page["reports"], page["next_cursor"]
+
+  def load_more_my_reports(self, **event_args):
+    """Loads the next page of the filtered results, or of the whole list."""
+    if self._filters_need_server():
+      if self.server_results and self.server_results["next_cursor"]:
+        self._search_my_reports_on_server(self.server_results["next_cursor"])
+      return
+    if not self.my_reports_cursor:
+      return
+    self.call_js("showArchivesSpinner")
+    try:
+      page = anvil.server.call_s(
+        "list_reports", cursor=self.my_reports_cursor, page_size=REPORTS_PAGE_SIZE
+      )
+    except Exception as e:
+      self.logger.error("Could not load the next page of reports.", e)
+      alert(f"An error occurred while loading reports: {e}")
+      return
+    finally:
+      self.call_js("hideArchivesSpinner")
+
+    # A report saved since the first page may come back on a later one.
+    known = {r.get("id") for r in self.my_reports}
+    self.my_reports = self.my_reports + [
+      r for r in page["reports"] if r.get("id") not in known
+    ]
+    self.my_reports_cursor = page["next_cursor"]
+    self._store_reports_in_cache()
+    reports_cache_manager.set_my_reports_cursor(self.my_reports_cursor)
+    self.build_report_indexes()
+    self.apply_filters("my_reports")
 
   def refresh_data_click(self, active_tab, **event_args):
     self.logger.info(
       f"Refresh button clicked on tab: '{active_tab}'. Invalidating cache."
     )
     reports_cache_manager.invalidate()
+    self.structure_summary = None
     self.call_js("showArchivesSpinner")
     try:
-      self.my_reports = anvil.server.call_s("read_reports") or []
+      sync_token = anvil.server.call_s("sync_reports")["sync_token"]
+      self.my_reports, self.my_reports_cursor = self.load_my_reports()
       if self.is_supervisor and self.has_structure:
         self.structure_reports = (
           anvil.server.call_s("get_reports_by_structure", self.structure_name) or []
@@ -285,77 +450,126 @@ class ArchivesForm(ArchivesFormTemplate):
         has_structure=self.has_structure,  # Add this
         structure_name=self.structure_name,  # Add this
         affiliated_vets=self.affiliated_vets,  # Add this
+        sync_token=sync_token,
       )
+      reports_cache_manager.set_my_reports_cursor(self.my_reports_cursor)
 
       self.logger.info("Successfully refreshed and cached report data.")
     except Exception as e:
       self.logger.error("An error occurred while refreshing reports.", e)
       alert(f"An error occurred while refreshing reports: {e}")
       self.my_reports = []
+      self.my_reports_cursor = None
       self.structure_reports = []
     finally:
       self.call_js("hideArchivesSpinner")
+    self.build_report_indexes()
     self.apply_filters(active_tab)
     alert(t.t("archivesForm_alert_refreshed"))
 
+  def build_report_indexes(self):
+    """Indexes the loaded reports once; filters then only query the indexes."""
+    self.report_indexes = {
+      "my_reports": ReportIndex(self.my_reports, status_label=t.t),
+      "structure_reports": ReportIndex(self.structure_reports, status_label=t.t),
+    }
+
+  def _filters_need_server(self):
+    """True when my_reports is incomplete and a filter or search is active."""
+    return bool(
+      self.my_reports_cursor
+      and (
+        (self.current_search_query or "").strip()
+        or self.selected_statuses
+        or self.selected_patient_ids
+      )
+    )
+
+  def _search_my_reports_on_server(self, cursor=None):
+    """
+    Shows the vet's reports matching the active filters and search, paged by
+    list_reports. Without `cursor`, starts again from the first page.
+    """
+    self.call_js("showArchivesSpinner")
+    try:
+      page = anvil.server.call_s(
+        "list_reports",
+        cursor=cursor,
+        page_size=REPORTS_PAGE_SIZE,
+        statuses=self.selected_statuses or None,
+        patient_ids=self.selected_patient_ids or None,
+        search=self.current_search_query or None,
+      )
+    except Exception as e:
+      self.logger.error("Could not search the reports on the server.", e)
+      alert(f"An error occurred while loading reports: {e}")
+      return
+    finally:
+      self.call_js("hideArchivesSpinner")
+
+    for report in page["reports"]:
+      report["statut_display"] = t.t(report.get("statut") or UNSPECIFIED_STATUS)
+    previous = self.server_results["reports"] if cursor and self.server_results else []
+    self.server_results = {
+      "reports": previous + page["reports"],
+      "next_cursor": page["next_cursor"],
+    }
+    self.logger.info(
+      f"Server filtering: {len(self.server_results['reports'])} report(s) loaded."
+    )
+    self.call_js("populateMyReports", self.server_results["reports"])
+    self.call_js("setMyReportsHasMore", bool(page["next_cursor"]))
+
   def apply_filters(self, report_type="my_reports"):
     self.logger.info(f"Applying filters for '{report_type}'.")
-    source_reports = (
-      self.my_reports if report_type == "my_reports" else self.structure_reports
-    )
-    filtered_list = list(source_reports)
-    initial_count = len(filtered_list)
-
-    if self.current_search_query:
-      search_term = self.current_search_query.lower()
-      self.logger.debug(f"Filtering by search term: '{search_term}'")
-      if report_type == "structure_reports":
-        filtered_list = [
-          r
-          for r in filtered_list
-          if (search_term in (r.get("name") or "").lower())
-          or (search_term in (r.get("file_name") or "").lower())
-          or (search_term in (r.get("vet_display_name") or "").lower())
-        ]
-      else:
-        filtered_list = [
-          r
-          for r in filtered_list
-          if (search_term in (r.get("name") or "").lower())
-          or (search_term in (r.get("file_name") or "").lower())
-        ]
-
-    if self.selected_statuses:
-      self.logger.debug(f"Filtering by statuses: {self.selected_statuses}")
-      filtered_list = [
-        r
-        for r in filtered_list
-        if safe_value(r, "statut", "not_specified") in self.selected_statuses
-      ]
-
-    if report_type == "structure_reports":
-      if self.selected_vets_emails:
-        self.logger.debug(f"Filtering by vet emails: {self.selected_vets_emails}")
-        filtered_list = [
-          r for r in filtered_list if r.get("owner_email") in self.selected_vets_emails
-        ]
-    else:
-      if self.selected_patient_ids:
-        self.logger.debug(f"Filtering by patient IDs: {self.selected_patient_ids}")
-        filtered_list = [
-          r for r in filtered_list if r.get("animal_id") in self.selected_patient_ids
-        ]
-
+    if report_type == "my_reports":
+      if self._filters_need_server():
+        self._search_my_reports_on_server()
+        return
+      self.server_results = None
+    index = self.report_indexes[report_type]
+    is_structure = report_type == "structure_reports"
+    filtered_list = index.search(
+      query=self.current_search_query,
+      statuses=self.selected_statuses,
+      patient_ids=None if is_structure else self.selected_patient_ids,
+      vet_emails=self.selected_vets_emails if is_structure else None,
+    )
     self.logger.info(
-      f"Filtering complete. {initial_count} reports -> {len(filtered_list)} reports."
+      f"Filtering complete. {len(index)} reports -> {len(filtered_list)} reports."
     )
-    for report in filtered_list:
-      report["statut_display"] = t.t(report.get("statut", "not_specified"))
 
     if report_type == "my_reports":
       self.call_js("populateMyReports", filtered_list)
+      self.call_js("setMyReportsHasMore", bool(self.my_reports_cursor))
     else:
       self.call_js("populateStructureReports", filtered_list)
+      self.show_structure_summary()
+
+  def show_structure_summary(self):
+    """Shows the structure's report counts to supervisors, loaded once per refresh."""
+    if not (self.is_supervisor and self.has_structure):
+      return
+    if self.structure_summary is None:
+      try:
+        self.structure_summary = anvil.server.call_s(
+          "get_structure_report_summary", self.structure_name
+        )
+      except Exception as e:
+        self.logger.error("Could not load the structure summary.", e)
+        return
+    if not self.structure_summary:
+      return
+    parts = [
+      t.t("archivesForm_span_structureSummary", total=self.structure_summary["total"])
+    ]
+    parts += [
+      f"{t.t(status)}: {count}"
+      for status, count in sorted(self.structure_summary["by_status"].items())
+    ]
+    self.call_js(
+      "setElementText", "archivesForm-div-structureSummary", " · ".join(parts)
+    )
 
   def apply_my_reports_filters(self, statuses, patient_ids, **event_args):
     self.logger.debug(
@@ -386,11 +600,16 @@ class ArchivesForm(ArchivesFormTemplate):
       self.logger.info(f"Attempting to delete report with ID: {report_id}")
       try:
         if anvil.server.call_s("delete_report", report_id):
-          self.logger.info(
-            f"Successfully deleted report. Invalidating cache and reloading."
-          )
-          reports_cache_manager.invalidate()
-          self.form_show()
+          self.logger.info("Successfully deleted report. Updating lists in place.")
+          self.my_reports = [r for r in self.my_reports if r.get("id") != report_id]
+          self.structure_reports = [
+            r for r in self.structure_reports if r.get("id") != report_id
+          ]
+          for index in self.report_indexes.values():
+            index.remove(report_id)
+          self._store_reports_in_cache()
+          self.structure_summary = None
+          self.apply_filters(active_tab)
         else:
           self.logger.error(
             f"Server returned failure for deleting report ID: {report_id}"
@@ -400,14 +619,159 @@ class ArchivesForm(ArchivesFormTemplate):
         self.logger.error(f"An error occurred while deleting report ID: {report_id}", e)
         alert(f"An error occurred while deleting the report: {e}")
 
+  def _store_reports_in_cache(self):
+    reports_cache_manager.set(
+      my_reports=self.my_reports,
+      structure_reports=self.structure_reports,
+      has_structure=self.has_structure,
+      structure_name=self.structure_name,
+      affiliated_vets=self.affiliated_vets,
+    )
+
+  def bulk_update_status(self, report_ids, new_status, active_tab, **event_args):
+    report_ids = list(report_ids or [])
+    if not report_ids or not new_status:
+      return
+    self.logger.info(f"Setting status '{new_status}' on {len(report_ids)} report(s).")
+    try:
+      result = anvil.server.call("bulk_update_report_status", report_ids, new_status)
+    except Exception as e:
+      self.logger.error("Bulk status update failed.", e)
+      alert(f"An error occurred while updating the reports: {e}")
+      return
+
+    changed = {
+      report_id
+      for report_id, outcome in result["results"].items()
+      if outcome == "updated"
+    }
+    # Copies, as the index reads the old status off the report it holds.
+    for key in ("my_reports", "structure_reports"):
+      reports = getattr(self, key)
+      for position, report in enumerate(reports):
+        if report.get("id") in changed:
+          reports[position] = dict(report, statut=new_status)
+          self.report_indexes[key].update(reports[position])
+    self._store_reports_in_cache()
+    self.call_js("clearArchivesSelection")
+    self.structure_summary = None
+    self.apply_filters(active_tab)
+    done = sum(
+      1
+      for outcome in result["results"].values()
+      if outcome in ("updated", "unchanged")
+    )
+    self.call_js(
+      "displayBanner",
+      t.t("archivesForm_banner_bulkUpdated", done=done, total=len(report_ids)),
+      "success" if done == len(report_ids) else "error",
+    )
+
+  def bulk_delete_selected(self, report_ids, active_tab, **event_args):
+    report_ids = list(report_ids or [])
+    if not report_ids:
+      return
+    if not confirm(t.t("archivesForm_confirm_bulkDelete", count=len(report_ids))):
+      return
+    self.logger.info(f"Deleting {len(report_ids)} report(s).")
+    try:
+      result = anvil.server.call("bulk_delete_reports", report_ids)
+    except Exception as e:
+      self.logger.error("Bulk delete failed.", e)
+      alert(f"An error occurred while deleting the reports: {e}")
+      return
+
+    deleted = {
+      report_id
+      for report_id, outcome in result["results"].items()
+      if outcome in ("deleted", "not_found")
+    }
+    self.my_reports = [r for r in self.my_reports if r.get("id") not in deleted]
+    self.structure_reports = [
+      r for r in self.structure_reports if r.get("id") not in deleted
+    ]
+    for index in self.report_indexes.values():
+      for report_id in deleted:
+        index.remove(report_id)
+    self._store_reports_in_cache()
+    self.call_js("clearArchivesSelection")
+    self.structure_summary = None
+    self.apply_filters(active_tab)
+    self.call_js(
+      "displayBanner",
+      t.t(
+        "archivesForm_banner_bulkDeleted",
+        done=result["deleted"],
+        total=len(report_ids),
+      ),
+      "success" if result["deleted"] == len(report_ids) else "error",
+    )
+
+  def bulk_export_pdf(self, report_ids, **event_args):
+    report_ids = list(report_ids or [])
+    if not report_ids:
+      return
+    output_format = alert(
+      t.t("archivesForm_alert_exportFormat", count=len(report_ids)),
+      buttons=[
+        (t.t("archivesForm_button_exportZip"), "zip"),
+        (t.t("archivesForm_button_exportMerged"), "merged"),
+        (t.t("cancel"), None),
+      ],
+    )
+    if not output_format:
+      return
+    self.logger.info(f"Exporting {len(report_ids)} report(s) as '{output_format}'.")
+
+    def on_state(state):
+      if state.get("total"):
+        self.call_js(
+          "displayBanner",
+          t.t(
+            "archivesForm_banner_exportProgress",
+            done=state.get("done", 0),
+            total=state["total"],
+          ),
+          "info",
+        )
+
+    try:
+      task = anvil.server.call(
+        "export_reports_pdf", report_ids=report_ids, output_format=output_format
+      )
+      result = wait_for_task(task, on_state)
+    except Exception as e:
+      self.logger.error("Batch PDF export failed.", e)
+      alert(f"{t.t('archivesForm_alert_exportFailed')}: {e}")
+      return
+
+    anvil.media.download(result["media"])
+    self.call_js(
+      "displayBanner",
+      t.t(
+        "archivesForm_banner_exportDone",
+        done=result["exported"],
+        total=len(report_ids),
+      ),
+      "success" if result["exported"] == len(report_ids) else "error",
+    )
+
   def open_report_editor(self, report, **event_args):
     report_id = report.get("id")
     self.logger.info(f"Opening report editor for report ID: {report_id}")
     try:
+      report_rich = report.get("report_rich")
+      if report_rich is None:
+        # Listings only carry summaries; the content is fetched on open.
+        full_report = anvil.server.call("read_report", report_id)
+        if full_report is None:
+          alert(t.t("archivesForm_alert_reportUnavailable"))
+          return
+        report_rich = full_report.get("report_rich")
       safe_report = {
         "id": report_id,
         "file_name": report.get("file_name"),
-        "report_rich": report.get("report_rich"),
+        "report_rich": report_rich,
         "statut": report.get("statut"),
         "name": report.get("name"),
       }
@@ -419,7 +783,7 @@ class ArchivesForm(ArchivesFormTemplate):
 
   def create_new_report(self, **event_args):
     self.logger.info(
-      "Create new report clicked. Invalidating cache and opening production form."
+      "Create new report clicked. Marking cache stale and opening production form."
     )
-    reports_cache_manager.invalidate()
+    reports_cache_manager.mark_stale()
     open_form("Production.AudioManagerForm")
@@ -4,11 +4,11 @@ import anvil.server
 import anvil.users
 import anvil.js
 from ...Cache import reports_cache_manager, user_settings_cache
-import time
 from ... import TranslationService as t
 from ...AppEvents import events
 from ...AuthHelpers import setup_auth_handlers
 from ...LoggingClient import ClientLogger
+from ...TaskProgress import wait_for_task
 
 
 class AudioManagerEdit(AudioManagerEditTemplate):
@@ -126,23 +126,22 @@ class AudioManagerEdit(AudioManagerEditTemplate):
         language,
         self.current_audio_mime_type,
         current_content,
+        delta=True,
       )
 
-      last_displayed_step = "feedback_transcribing"
-      while not task.is_completed():
-        time.sleep(1)
-        state = task.get_state()
-        current_step = state.get("step")
+      progress = {"step": "feedback_transcribing"}
 
-        if current_step and current_step != last_displayed_step:
+      def on_state(state):
+        current_step = state.get("step")
+        if current_step and current_step != progress["step"]:
           self.user_feedback_1.set_status(t.t(current_step))
-          last_displayed_step = current_step
+          progress["step"] = current_step
 
-      result = task.get_return_value()
+      result = wait_for_task(task, on_state)
 
       if result and result.get("success"):
         self.logger.info("Report editing pipeline completed successfully.")
-        self.text_editor_1.html_content = result.get("edited_html")
+        self.text_editor_1.apply_fragments(current_content, result.get("fragments"))
       else:
         error_msg = result.get("error", "An unknown error occurred.")
         self.logger.error(f"Report editing pipeline failed: {error_msg}")
@@ -181,7 +180,7 @@ class AudioManagerEdit(AudioManagerEditTemplate):
       )
       if success:
         self.logger.info("Report updated successfully on the server.")
-        reports_cache_manager.invalidate()
+        reports_cache_manager.mark_stale()
         alert(t.t("banner_reportUpdateSuccess"), title=t.t("title_success"))
         open_form("Archives.ArchivesForm")
       else:
@@ -1,9 +1,94 @@
+import json
 import time
+import anvil.js
+import anvil.users
+
+
+# --- Persistent storage (IndexedDB, see global-scripts.js) ---
+# Bump when the shape of a persisted payload changes: entries written under
+# another version read as a miss and are overwritten.
+PERSISTENT_SCHEMA_VERSION = 1
+# Longer report lists are persisted truncated to their newest entries.
+MAX_PERSISTED_REPORTS = 5000
+# Serialized payloads above this size are not persisted at all.
+MAX_PERSISTED_BYTES = 4 * 1024 * 1024
+
+
+def _current_owner():
+  """Persisted entries are tagged with the user id, so users never share them."""
+  user = anvil.users.get_user()
+  return user.get_id() if user else None
+
+
+def _persist(key, payload):
+  owner = _current_owner()
+  if owner is None:
+    return
+  try:
+    data = json.dumps(payload)
+    if len(data) > MAX_PERSISTED_BYTES:
+      print(f"Cache '{key}' is too large to persist ({len(data)} bytes).")
+      anvil.js.window.persistentCacheDelete(key)
+      return
+    anvil.js.window.persistentCachePut(key, owner, PERSISTENT_SCHEMA_VERSION, data)
+  except Exception as e:
+    print(f"Could not persist cache '{key}': {e}")
+
+
+def _restore(key):
+  owner = _current_owner()
+  if owner is None:
+    return None
+  try:
+    data = anvil.js.window.persistentCacheGet(key, owner, PERSISTENT_SCHEMA_VERSION)
+    return json.loads(data) if data else None
+  except Exception as e:
+    print(f"Could not restore cache '{key}': {e}")
+    return None
+
+
+def _forget(key):
+  try:
+    anvil.js.window.persistentCacheDelete(key)
+  except Exception as e:
+    print(f"Could not delete cache '{key}': {e}")
+
+
+def clear_persistent_cache():
+  """Deletes everything persisted on this device, e.g. on logout."""
+  try:
+    anvil.js.window.persistentCacheClear()
+  except Exception as e:
+    print(f"Could not clear the persistent cache: {e}")
 
 
 # --- Reports Cache ---
+def _merge_reports(reports, changed, deleted_ids):
+  """Replaces changed reports, drops deleted ones and puts the changed on top."""
+  deleted = set(deleted_ids or [])
+  fresh = [r for r in changed if r.get("id") not in deleted]
+  dropped = deleted | {r.get("id") for r in fresh}
+  kept = [r for r in reports or [] if r.get("id") not in dropped]
+  fresh.sort(key=lambda r: r.get("last_modified") or "", reverse=True)
+  return fresh + kept
+
+
 class ReportCache:
-  """A dedicated object for managing the caching of reports."""
+  """
+  A dedicated object for managing the caching of reports.
+
+  Once loaded, the lists are kept up to date with delta syncs instead of being
+  reloaded: the cache holds the server's high-water mark (`sync_token`) and
+  merges the reports changed or deleted since then. After `lifetime_seconds`,
+  or once marked stale by a save, the next visit should sync before display.
+
+  `my_reports_cursor` is the list_reports cursor of the next page of the
+  vet's own reports, or None once they are all loaded.
+
+  Every set or merge is also persisted to IndexedDB. On a cold start,
+  `restore()` loads that copy as stale, so the screen can render it at once
+  and sync right after.
+  """
 
   def __init__(self, lifetime_seconds=300):
     self.lifetime_seconds = lifetime_seconds
@@ -13,6 +98,10 @@ class ReportCache:
     self._structure_name = None
     self._affiliated_vets = None
     self._last_fetched = 0
+    self.sync_token = None
+    self.my_reports_cursor = None
+    # The report status keys, kept so a restored screen needs no server call.
+    self.status_options = None
 
   def is_valid(self):
     if self._my_reports is None:
@@ -20,8 +109,13 @@ class ReportCache:
     age = time.time() - self._last_fetched
     return age < self.lifetime_seconds
 
+  def needs_sync(self):
+    """True when cached lists exist but may be behind the server."""
+    return self._my_reports is not None and not self.is_valid()
+
   def get(self):
-    if self.is_valid():
+    """Returns the cached lists, even if they need a sync, or Nones if unloaded."""
+    if self._my_reports is not None:
       return (
         self._my_reports,
         self._structure_reports,
@@ -32,14 +126,100 @@ class ReportCache:
     return (None, None, None, None, None)
 
   def set(
-    self, my_reports, structure_reports, has_structure, structure_name, affiliated_vets
+    self,
+    my_reports,
+    structure_reports,
+    has_structure,
+    structure_name,
+    affiliated_vets,
+    sync_token=None,
   ):
     self._my_reports = my_reports
     self._structure_reports = structure_reports
     self._has_structure = has_structure
     self._structure_name = structure_name
     self._affiliated_vets = affiliated_vets
+    if sync_token is not None:
+      self.sync_token = sync_token
     self._last_fetched = time.time()
+    self._persist()
+
+  def merge(self, delta):
+    """Applies a sync_reports delta to the cached lists, in place."""
+    self._my_reports = _merge_reports(
+      self._my_reports, delta.get("changed") or [], delta.get("deleted")
+    )
+    if self._structure_reports is not None:
+      self._structure_reports = _merge_reports(
+        self._structure_reports,
+        delta.get("structure_changed") or [],
+        delta.get("structure_deleted"),
+      )
+    self.sync_token = delta.get("sync_token")
+    self._last_fetched = time.time()
+    self._persist()
+
+  def set_my_reports_cursor(self, cursor):
+    self.my_reports_cursor = cursor
+    if self._my_reports is not None:
+      self._persist()
+
+  def set_status_options(self, status_options):
+    self.status_options = status_options
+    if self._my_reports is not None:
+      self._persist()
+
+  def _persist(self):
+    my_reports = self._my_reports or []
+    structure_reports = self._structure_reports or []
+    # A truncated copy still renders, but must be reloaded rather than synced.
+    complete = (
+      len(my_reports) <= MAX_PERSISTED_REPORTS
+      and len(structure_reports) <= MAX_PERSISTED_REPORTS
+    )
+    _persist(
+      "reports",
+      {
+        "my_reports": my_reports[:MAX_PERSISTED_REPORTS],
+        "structure_reports": (
+          structure_reports[:MAX_PERSISTED_REPORTS]
+          if self._structure_reports is not None
+          else None
+        ),
+        "has_structure": self._has_structure,
+        "structure_name": self._structure_name,
+        "affiliated_vets": self._affiliated_vets,
+        "status_options": self.status_options,
+        "sync_token": self.sync_token if complete else None,
+        "my_reports_cursor": self.my_reports_cursor,
+      },
+    )
+
+  def restore(self):
+    """
+    Loads the persisted lists when nothing is in memory. They are restored
+    stale, so `needs_sync()` is True. Returns True if lists are now loaded.
+    """
+    if self._my_reports is not None:
+      return True
+    payload = _restore("reports")
+    if not payload or payload.get("my_reports") is None:
+      return False
+    self._my_reports = payload["my_reports"]
+    self._structure_reports = payload.get("structure_reports")
+    self._has_structure = payload.get("has_structure")
+    self._structure_name = payload.get("structure_name")
+    self._affiliated_vets = payload.get("affiliated_vets")
+    self.status_options = payload.get("status_options")
+    self.sync_token = payload.get("sync_token")
+    self.my_reports_cursor = payload.get("my_reports_cursor")
+    self._last_fetched = 0
+    print(f"Reports cache restored from disk: {len(self._my_reports)} report(s).")
+    return True
+
+  def mark_stale(self):
+    """Keeps the cached lists but makes the next visit sync them first."""
+    self._last_fetched = 0
 
   def invalidate(self):
     print("Reports cache invalidated.")
@@ -49,42 +229,77 @@ class ReportCache:
     self._structure_name = None
     self._affiliated_vets = None
     self._last_fetched = 0
+    self.sync_token = None
+    self.my_reports_cursor = None
+    # status_options are the same for every user and survive invalidation.
+    _forget("reports")
 
 
 reports_cache_manager = ReportCache()
 
 
-# --- Templates Cache ---
-class TemplateCache:
-  """A dedicated object for managing the caching of templates."""
+# --- Templates and Patients Caches ---
+class _PersistedCache:
+  """
+  Caches one value in memory and persists it to IndexedDB under `key`.
+  `get()` only returns a fresh value; `peek()` also returns an expired one,
+  restoring it from disk if needed, for screens that render first and
+  revalidate after.
+  """
+
+  key = None
+  label = None
 
   def __init__(self, lifetime_seconds=300):
     self.lifetime_seconds = lifetime_seconds
-    self._templates = None
+    self._value = None
     self._last_fetched = 0
 
   def is_valid(self):
-    if self._templates is None:
+    if self._value is None:
       return False
     age = time.time() - self._last_fetched
     return age < self.lifetime_seconds
 
   def get(self):
     if self.is_valid():
-      return self._templates
+      return self._value
     return None
 
-  def set(self, templates):
-    self._templates = templates
+  def peek(self):
+    if self._value is None:
+      self._value = _restore(self.key)
+      self._last_fetched = 0
+    return self._value
+
+  def set(self, value):
+    self._value = value
     self._last_fetched = time.time()
+    _persist(self.key, value)
 
   def invalidate(self):
-    print("Template cache invalidated.")
-    self._templates = None
+    print(f"{self.label} cache invalidated.")
+    self._value = None
     self._last_fetched = 0
+    _forget(self.key)
+
+
+class TemplateCache(_PersistedCache):
+  """A dedicated object for managing the caching of templates."""
+
+  key = "templates"
+  label = "Template"
+
+
+class PatientCache(_PersistedCache):
+  """Caches the vet's patients, as returned by get_my_patients_for_filtering."""
+
+  key = "patients"
+  label = "Patient"
 
 
 template_cache_manager = TemplateCache()
+patient_cache_manager = PatientCache()
 
 user_settings_cache = {
   "language": None,
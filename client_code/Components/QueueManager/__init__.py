@@ -30,6 +30,11 @@ class QueueManager(QueueManagerTemplate):
       "queueManager-header-queueTitle",
       t.t("queueManager_header_queueTitle"),
     )
+    self.call_js(
+      "setElementText",
+      "queueManager-button-processAll",
+      t.t("queueManager_button_processAll"),
+    )
     self.call_js(
       "setElementText",
       "queueManager-button-closeQueue",
@@ -77,6 +82,10 @@ class QueueManager(QueueManagerTemplate):
       "delete_button": t.t("queueManager_renderer_delete_button"),
       "delete_confirm": t.t("queueManager_renderer_delete_confirm"),
       "default_title_prefix": t.t("queueManager_renderer_default_title_prefix"),
+      "status_queued": t.t("queueManager_renderer_status_queued"),
+      "status_processing": t.t("queueManager_renderer_status_processing"),
+      "status_done": t.t("queueManager_renderer_status_done"),
+      "status_failed": t.t("queueManager_renderer_status_failed"),
     }
 
   # --- Public methods (Callable by the parent form) ---
@@ -97,6 +106,10 @@ class QueueManager(QueueManagerTemplate):
     """Public method for parent to instruct component to delete an item."""
     anvil.js.call_js("qm_deleteItem", item_id)
 
+  def set_item_status(self, item_id, status):
+    """Public method for parent to update the status shown for a queued item."""
+    anvil.js.call_js("qm_setItemStatus", item_id, status)
+
   # --- Internal Relay Methods (Called from JavaScript) ---
   def handle_import_click(self, item_id, audio_blob, **event_args):
     """Relay from JS: raises the x_import_item event for the parent."""
@@ -106,6 +119,25 @@ class QueueManager(QueueManagerTemplate):
     )
     self.delete_item_from_queue(item_id=item_id)
 
+  def handle_process_all_click(self, items, **event_args):
+    """Relay from JS: raises the x_process_all event with every queued item."""
+    if not items:
+      alert(t.t("queueManager_alert_nothingToProcess"))
+      return
+    self.call_js("closeModal", "qm-queueModal")
+    self.raise_event(
+      "x_process_all",
+      items=[
+        {
+          "item_id": item["id"],
+          "title": item["title"],
+          "audio_blob": item["blob"],
+          "mime_type": item["blob"].type,
+        }
+        for item in items
+      ],
+    )
+
   def handle_confirm_save(self, title, **event_args):
     """Relay from JS: Called when user confirms the title."""
     if hasattr(self, "_current_proxy_to_save") and self._current_proxy_to_save:
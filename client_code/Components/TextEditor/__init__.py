@@ -154,6 +154,30 @@ class TextEditor(TextEditorTemplate):
       self.call_js("setEditorContent", self._html_content)
       self._update_undo_redo_buttons()
 
+  def show_preview(self, html_content):
+    """
+    Displays in-progress content (e.g. a report still being generated)
+    without recording it in the undo/redo history.
+    """
+    if getattr(self, "parent", None):
+      self.call_js("setEditorContent", html_content or "")
+
+  def apply_fragments(self, base_html, fragments):
+    """
+    Applies the fragments returned by a delta edit to `base_html` (the content
+    that was sent to the server) and records the result as a new version.
+    Each fragment replaces base_html[start:end] with its html; fragments are
+    sorted and do not overlap.
+    """
+    parts = []
+    position = 0
+    for fragment in fragments:
+      parts.append(base_html[position : fragment["start"]])
+      parts.append(fragment["html"])
+      position = fragment["end"]
+    parts.append(base_html[position:])
+    self.html_content = "".join(parts)
+
   def export_content(self, **event_args):
     """Called from JS. Calls the server to generate a PDF and initiates download."""
     try:
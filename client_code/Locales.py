@@ -45,6 +45,12 @@ fr = {
   "queueManager_renderer_delete_button": "Supprimer",
   "queueManager_renderer_delete_confirm": "Êtes-vous sûr de vouloir supprimer cet enregistrement ?",
   "queueManager_renderer_default_title_prefix": "Enregistrement du",
+  "queueManager_button_processAll": "Tout traiter",
+  "queueManager_renderer_status_queued": "En attente",
+  "queueManager_renderer_status_processing": "En cours",
+  "queueManager_renderer_status_done": "Terminé",
+  "queueManager_renderer_status_failed": "Échec",
+  "queueManager_alert_nothingToProcess": "Tous les enregistrements sont déjà en cours de traitement.",
   # --- RecordingWidget Component ---
   "recordingWidget_button_toggle_tooltip": "Démarrer l'enregistrement",
   # --- ReportFooter Component ---
@@ -72,6 +78,7 @@ fr = {
   "archivesForm_tab_structureReports": "Ma structure",
   "archivesForm_h2_myReportsTitle": "Mes rapports",
   "archivesForm_button_filter": "Filtrer",
+  "archivesForm_button_loadMore": "Afficher plus",
   "archivesForm_h2_structureTitle": "Ma structure",
   "archivesForm_button_refresh_tooltip": "Rafraîchir",
   "archivesForm_h3_myReportsFilterTitle": "Filtrer mes rapports",
@@ -83,6 +90,22 @@ fr = {
   "archivesForm_h4_filterByVet": "Par vétérinaire",
   "archivesForm_confirm_delete": "Êtes-vous sûr de vouloir supprimer ce rapport ?",
   "archivesForm_alert_refreshed": "Les rapports ont été rafraîchis.",
+  "archivesForm_alert_reportUnavailable": "Ce rapport n'est plus disponible.",
+  "archivesForm_button_bulkApply": "Appliquer le statut",
+  "archivesForm_button_bulkDelete": "Supprimer la sélection",
+  "archivesForm_button_bulkClear": "Annuler la sélection",
+  "archivesForm_span_bulkSelected": "{count} rapport(s) sélectionné(s)",
+  "archivesForm_span_structureSummary": "{total} rapport(s) au total",
+  "archivesForm_confirm_bulkDelete": "Supprimer définitivement {count} rapport(s) ?",
+  "archivesForm_banner_bulkUpdated": "Statut mis à jour pour {done}/{total} rapport(s).",
+  "archivesForm_banner_bulkDeleted": "{done}/{total} rapport(s) supprimé(s).",
+  "archivesForm_button_bulkExport": "Exporter en PDF",
+  "archivesForm_alert_exportFormat": "Exporter {count} rapport(s) :",
+  "archivesForm_button_exportZip": "Un PDF par rapport (ZIP)",
+  "archivesForm_button_exportMerged": "Un seul PDF",
+  "archivesForm_banner_exportProgress": "Export PDF : {done}/{total} rapport(s)…",
+  "archivesForm_banner_exportDone": "{done}/{total} rapport(s) exporté(s).",
+  "archivesForm_alert_exportFailed": "L'export PDF a échoué",
   "month_jan": "janv.",
   "month_feb": "févr.",
   "month_mar": "mars",
@@ -262,6 +285,7 @@ fr = {
   "audioManager_alert_noAudioCommand": "Aucune commande audio disponible pour le traitement.",
   "audioManager_alert_invalidPatient": "Données patient non valides.",
   "audioManager_banner_saveSuccess": "Rapport sauvegardé avec succès.",
+  "audioManager_banner_batchComplete": "{saved}/{total} brouillon(s) créé(s) depuis la file d'attente.",
   "audioManager_alert_saveFailed": "Le serveur a retourné une erreur lors de la sauvegarde du rapport.",
   "feedback_generating": "Génération du rapport depuis la transcription...",
   "feedback_formatting": "Formatage du rapport final...",
@@ -343,6 +367,12 @@ en = {
   "queueManager_renderer_delete_button": "Delete",
   "queueManager_renderer_delete_confirm": "Are you sure you want to delete this recording?",
   "queueManager_renderer_default_title_prefix": "Recording from",
+  "queueManager_button_processAll": "Process all",
+  "queueManager_renderer_status_queued": "Queued",
+  "queueManager_renderer_status_processing": "Processing",
+  "queueManager_renderer_status_done": "Done",
+  "queueManager_renderer_status_failed": "Failed",
+  "queueManager_alert_nothingToProcess": "All recordings are already being processed.",
   # --- RecordingWidget Component ---
   "recordingWidget_button_toggle_tooltip": "Start recording",
   # --- ReportFooter Component ---
@@ -370,6 +400,7 @@ en = {
   "archivesForm_tab_structureReports": "My structure",
   "archivesForm_h2_myReportsTitle": "My reports",
   "archivesForm_button_filter": "Filter",
+  "archivesForm_button_loadMore": "Show more",
   "archivesForm_h2_structureTitle": "My structure",
   "archivesForm_button_refresh_tooltip": "Refresh",
   "archivesForm_h3_myReportsFilterTitle": "Filter my reports",
@@ -381,6 +412,22 @@ en = {
   "archivesForm_h4_filterByVet": "By veterinarian",
   "archivesForm_confirm_delete": "Are you sure you want to delete this report?",
   "archivesForm_alert_refreshed": "Reports have been refreshed.",
+  "archivesForm_alert_reportUnavailable": "This report is no longer available.",
+  "archivesForm_button_bulkApply": "Apply status",
+  "archivesForm_button_bulkDelete": "Delete selection",
+  "archivesForm_button_bulkClear": "Clear selection",
+  "archivesForm_span_bulkSelected": "{count} report(s) selected",
+  "archivesForm_span_structureSummary": "{total} report(s) in total",
+  "archivesForm_confirm_bulkDelete": "Permanently delete {count} report(s)?",
+  "archivesForm_banner_bulkUpdated": "Status updated for {done}/{total} report(s).",
+  "archivesForm_banner_bulkDeleted": "{done}/{total} report(s) deleted.",
+  "archivesForm_button_bulkExport": "Export PDF",
+  "archivesForm_alert_exportFormat": "Export {count} report(s) as:",
+  "archivesForm_button_exportZip": "One PDF per report (ZIP)",
+  "archivesForm_button_exportMerged": "A single PDF",
+  "archivesForm_banner_exportProgress": "PDF export: {done}/{total} report(s)…",
+  "archivesForm_banner_exportDone": "{done}/{total} report(s) exported.",
+  "archivesForm_alert_exportFailed": "The PDF export failed",
   "month_jan": "jan.",
   "month_feb": "feb.",
   "month_mar": "mar.",
@@ -549,6 +596,7 @@ en = {
   "audioManager_alert_noAudioCommand": "No audio command available to process.",
   "audioManager_alert_invalidPatient": "Invalid patient data provided.",
   "audioManager_banner_saveSuccess": "Report saved successfully.",
+  "audioManager_banner_batchComplete": "{saved}/{total} draft(s) created from the queue.",
   "audioManager_alert_saveFailed": "Server returned failure while saving report.",
   "feedback_uploading": "Uploading the audio...",
   "feedback_transcribing": "Transcribing the audio...",
@@ -636,6 +684,12 @@ es = {
   "queueManager_renderer_delete_button": "Eliminar",
   "queueManager_renderer_delete_confirm": "¿Está seguro de que desea eliminar esta grabación?",
   "queueManager_renderer_default_title_prefix": "Grabación del",
+  "queueManager_button_processAll": "Procesar todo",
+  "queueManager_renderer_status_queued": "En cola",
+  "queueManager_renderer_status_processing": "Procesando",
+  "queueManager_renderer_status_done": "Terminado",
+  "queueManager_renderer_status_failed": "Error",
+  "queueManager_alert_nothingToProcess": "Todas las grabaciones ya se están procesando.",
   # --- Componente RecordingWidget ---
   "recordingWidget_button_toggle_tooltip": "Iniciar grabación",
   # --- Componente ReportFooter ---
@@ -663,6 +717,7 @@ es = {
   "archivesForm_tab_structureReports": "Mi estructura",
   "archivesForm_h2_myReportsTitle": "Mis informes",
   "archivesForm_button_filter": "Filtrar",
+  "archivesForm_button_loadMore": "Mostrar más",
   "archivesForm_h2_structureTitle": "Mi estructura",
   "archivesForm_button_refresh_tooltip": "Actualizar",
   "archivesForm_h3_myReportsFilterTitle": "Filtrar mis informes",
@@ -674,6 +729,22 @@ es = {
   "archivesForm_h4_filterByVet": "Por veterinario",
   "archivesForm_confirm_delete": "¿Está seguro de que desea eliminar este informe?",
   "archivesForm_alert_refreshed": "Los informes han sido actualizados.",
+  "archivesForm_alert_reportUnavailable": "Este informe ya no está disponible.",
+  "archivesForm_button_bulkApply": "Aplicar estado",
+  "archivesForm_button_bulkDelete": "Eliminar selección",
+  "archivesForm_button_bulkClear": "Anular selección",
+  "archivesForm_span_bulkSelected": "{count} informe(s) seleccionado(s)",
+  "archivesForm_span_structureSummary": "{total} informe(s) en total",
+  "archivesForm_confirm_bulkDelete": "¿Eliminar definitivamente {count} informe(s)?",
+  "archivesForm_banner_bulkUpdated": "Estado actualizado para {done}/{total} informe(s).",
+  "archivesForm_banner_bulkDeleted": "{done}/{total} informe(s) eliminado(s).",
+  "archivesForm_button_bulkExport": "Exportar PDF",
+  "archivesForm_alert_exportFormat": "Exportar {count} informe(s) como:",
+  "archivesForm_button_exportZip": "Un PDF por informe (ZIP)",
+  "archivesForm_button_exportMerged": "Un único PDF",
+  "archivesForm_banner_exportProgress": "Exportación PDF: {done}/{total} informe(s)…",
+  "archivesForm_banner_exportDone": "{done}/{total} informe(s) exportado(s).",
+  "archivesForm_alert_exportFailed": "La exportación PDF ha fallado",
   "month_jan": "ene.",
   "month_feb": "feb.",
   "month_mar": "mar.",
@@ -842,6 +913,7 @@ es = {
   "audioManager_alert_noAudioCommand": "No hay comando de audio disponible para procesar.",
   "audioManager_alert_invalidPatient": "Datos del paciente no válidos.",
   "audioManager_banner_saveSuccess": "Informe guardado con éxito.",
+  "audioManager_banner_batchComplete": "{saved}/{total} borrador(es) creado(s) desde la cola.",
   "audioManager_alert_saveFailed": "El servidor devolvió un error al guardar el informe.",
   # --- Retroalimentación ---
   "feedback_uploading": "Subiendo el audio...",
@@ -936,6 +1008,12 @@ de = {
   "queueManager_renderer_delete_button": "Löschen",
   "queueManager_renderer_delete_confirm": "Sind Sie sicher, dass Sie diese Aufnahme löschen möchten?",
   "queueManager_renderer_default_title_prefix": "Aufnahme vom",
+  "queueManager_button_processAll": "Alle verarbeiten",
+  "queueManager_renderer_status_queued": "In Warteschlange",
+  "queueManager_renderer_status_processing": "In Bearbeitung",
+  "queueManager_renderer_status_done": "Fertig",
+  "queueManager_renderer_status_failed": "Fehlgeschlagen",
+  "queueManager_alert_nothingToProcess": "Alle Aufnahmen werden bereits verarbeitet.",
   # --- RecordingWidget Komponente ---
   "recordingWidget_button_toggle_tooltip": "Aufnahme starten",
   # --- ReportFooter Komponente ---
@@ -963,6 +1041,7 @@ de = {
   "archivesForm_tab_structureReports": "Meine Struktur",
   "archivesForm_h2_myReportsTitle": "Meine Berichte",
   "archivesForm_button_filter": "Filtern",
+  "archivesForm_button_loadMore": "Mehr anzeigen",
   "archivesForm_h2_structureTitle": "Meine Struktur",
   "archivesForm_button_refresh_tooltip": "Aktualisieren",
   "archivesForm_h3_myReportsFilterTitle": "Meine Berichte filtern",
@@ -974,6 +1053,22 @@ de = {
   "archivesForm_h4_filterByVet": "Nach Tierarzt",
   "archivesForm_confirm_delete": "Sind Sie sicher, dass Sie diesen Bericht löschen möchten?",
   "archivesForm_alert_refreshed": "Berichte wurden aktualisiert.",
+  "archivesForm_alert_reportUnavailable": "Dieser Bericht ist nicht mehr verfügbar.",
+  "archivesForm_button_bulkApply": "Status anwenden",
+  "archivesForm_button_bulkDelete": "Auswahl löschen",
+  "archivesForm_button_bulkClear": "Auswahl aufheben",
+  "archivesForm_span_bulkSelected": "{count} Bericht(e) ausgewählt",
+  "archivesForm_span_structureSummary": "{total} Bericht(e) insgesamt",
+  "archivesForm_confirm_bulkDelete": "{count} Bericht(e) endgültig löschen?",
+  "archivesForm_banner_bulkUpdated": "Status für {done}/{total} Bericht(e) aktualisiert.",
+  "archivesForm_banner_bulkDeleted": "{done}/{total} Bericht(e) gelöscht.",
+  "archivesForm_button_bulkExport": "Als PDF exportieren",
+  "archivesForm_alert_exportFormat": "{count} Bericht(e) exportieren als:",
+  "archivesForm_button_exportZip": "Ein PDF pro Bericht (ZIP)",
+  "archivesForm_button_exportMerged": "Ein einziges PDF",
+  "archivesForm_banner_exportProgress": "PDF-Export: {done}/{total} Bericht(e)…",
+  "archivesForm_banner_exportDone": "{done}/{total} Bericht(e) exportiert.",
+  "archivesForm_alert_exportFailed": "Der PDF-Export ist fehlgeschlagen",
   "month_jan": "Jan.",
   "month_feb": "Feb.",
   "month_mar": "März",
@@ -1142,6 +1237,7 @@ de = {
   "audioManager_alert_noAudioCommand": "Kein Audiobefehl zur Verarbeitung verfügbar.",
   "audioManager_alert_invalidPatient": "Ungültige Patientendaten angegeben.",
   "audioManager_banner_saveSuccess": "Bericht erfolgreich gespeichert.",
+  "audioManager_banner_batchComplete": "{saved}/{total} Entwurf/Entwürfe aus der Warteschlange erstellt.",
   "audioManager_alert_saveFailed": "Server hat beim Speichern des Berichts einen Fehler zurückgegeben.",
   # --- Feedback ---
   "feedback_uploading": "Das Audio wird hochgeladen...",
@@ -1236,6 +1332,12 @@ nl = {
   "queueManager_renderer_delete_button": "Verwijderen",
   "queueManager_renderer_delete_confirm": "Weet je zeker dat je deze opname wilt verwijderen?",
   "queueManager_renderer_default_title_prefix": "Opname van",
+  "queueManager_button_processAll": "Alles verwerken",
+  "queueManager_renderer_status_queued": "In wachtrij",
+  "queueManager_renderer_status_processing": "Bezig",
+  "queueManager_renderer_status_done": "Klaar",
+  "queueManager_renderer_status_failed": "Mislukt",
+  "queueManager_alert_nothingToProcess": "Alle opnames worden al verwerkt.",
   # --- RecordingWidget Component ---
   "recordingWidget_button_toggle_tooltip": "Opname starten",
   # --- ReportFooter Component ---
@@ -1263,6 +1365,7 @@ nl = {
   "archivesForm_tab_structureReports": "Mijn structuur",
   "archivesForm_h2_myReportsTitle": "Mijn rapporten",
   "archivesForm_button_filter": "Filteren",
+  "archivesForm_button_loadMore": "Meer tonen",
   "archivesForm_h2_structureTitle": "Mijn structuur",
   "archivesForm_button_refresh_tooltip": "Vernieuwen",
   "archivesForm_h3_myReportsFilterTitle": "Mijn rapporten filteren",
@@ -1274,6 +1377,22 @@ nl = {
   "archivesForm_h4_filterByVet": "Op dierenarts",
   "archivesForm_confirm_delete": "Weet je zeker dat je dit rapport wilt verwijderen?",
   "archivesForm_alert_refreshed": "Rapporten zijn vernieuwd.",
+  "archivesForm_alert_reportUnavailable": "Dit rapport is niet meer beschikbaar.",
+  "archivesForm_button_bulkApply": "Status toepassen",
+  "archivesForm_button_bulkDelete": "Selectie verwijderen",
+  "archivesForm_button_bulkClear": "Selectie wissen",
+  "archivesForm_span_bulkSelected": "{count} rapport(en) geselecteerd",
+  "archivesForm_span_structureSummary": "{total} rapport(en) in totaal",
+  "archivesForm_confirm_bulkDelete": "{count} rapport(en) definitief verwijderen?",
+  "archivesForm_banner_bulkUpdated": "Status bijgewerkt voor {done}/{total} rapport(en).",
+  "archivesForm_banner_bulkDeleted": "{done}/{total} rapport(en) verwijderd.",
+  "archivesForm_button_bulkExport": "Exporteren als PDF",
+  "archivesForm_alert_exportFormat": "{count} rapport(en) exporteren als:",
+  "archivesForm_button_exportZip": "Eén PDF per rapport (ZIP)",
+  "archivesForm_button_exportMerged": "Eén enkele PDF",
+  "archivesForm_banner_exportProgress": "PDF-export: {done}/{total} rapport(en)…",
+  "archivesForm_banner_exportDone": "{done}/{total} rapport(en) geëxporteerd.",
+  "archivesForm_alert_exportFailed": "De PDF-export is mislukt",
   "month_jan": "jan.",
   "month_feb": "feb.",
   "month_mar": "mrt.",
@@ -1442,6 +1561,7 @@ nl = {
   "audioManager_alert_noAudioCommand": "Geen audio-opdracht beschikbaar om te verwerken.",
   "audioManager_alert_invalidPatient": "Ongeldige patiëntgegevens verstrekt.",
   "audioManager_banner_saveSuccess": "Rapport succesvol opgeslagen.",
+  "audioManager_banner_batchComplete": "{saved}/{total} concept(en) aangemaakt vanuit de wachtrij.",
   "audioManager_alert_saveFailed": "Serverfout bij het opslaan van het rapport.",
   # --- Feedback ---
   "feedback_uploading": "Audio uploaden...",
@@ -2,12 +2,20 @@ from ._anvil_designer import AudioManagerFormTemplate
 from anvil import *
 import anvil.server
 import anvil.js
-import time
 from ... import TranslationService as t
-from ...Cache import template_cache_manager, reports_cache_manager
+from ...Cache import (
+  template_cache_manager,
+  patient_cache_manager,
+  reports_cache_manager,
+)
 from ...LoggingClient import ClientLogger
 from ...AppEvents import events
 from ...AuthHelpers import setup_auth_handlers
+from ...TaskProgress import wait_for_task
+
+# Recordings sent per batch job; the server's MAX_BATCH_ITEMS
+# (services/ai/batch.py) refuses larger batches.
+BATCH_CHUNK_SIZE = 30
 
 
 def safe_value(item, key, default_value):
@@ -181,23 +189,42 @@ class AudioManagerForm(AudioManagerFormTemplate):
     self.update_ui_texts()
     self.call_js("setFormMode", self.mode)
 
-    template_data = template_cache_manager.get()
+    # Render from the cache (memory, else disk) first, then revalidate.
+    template_data = template_cache_manager.peek()
+    templates_fresh = template_cache_manager.is_valid()
     if template_data is None:
       template_data = anvil.server.call_s("read_templates")
       template_cache_manager.set(template_data)
-    self.all_templates = template_data.get("templates", [])
-    default_template_id = template_data.get("default_template_id")
+      templates_fresh = True
+    self.show_templates(template_data, select_default=True)
 
-    try:
-      self.all_patients = anvil.server.call_s("get_my_patients_for_filtering")
-      self.call_js("populatePatientModal", self.all_patients)
-    except Exception as e:
-      self.logger.error("Could not load patients.", e)
+    patients = patient_cache_manager.peek()
+    if patients is not None:
+      self.show_patients(patients)
+    self.queue_manager_1.refresh_badge()
+
+    if not templates_fresh:
+      self.logger.info("Revalidating templates restored from the cache.")
+      try:
+        fresh_templates = anvil.server.call_s("read_templates")
+        template_cache_manager.set(fresh_templates)
+        if fresh_templates != template_data:
+          self.show_templates(
+            fresh_templates, select_default=self.selected_template is None
+          )
+      except Exception as e:
+        self.logger.error("Could not revalidate templates.", e)
+    if not patient_cache_manager.is_valid():
+      self.load_patients()
+    self.logger.info("Form setup complete.")
 
+  def show_templates(self, template_data, select_default=False):
+    self.all_templates = template_data.get("templates", [])
+    default_template_id = template_data.get("default_template_id")
     displayable_templates = [t for t in self.all_templates if t.get("display")]
     self.call_js("populateTemplateModal", displayable_templates)
 
-    if default_template_id:
+    if select_default and default_template_id:
       default_template = next(
         (t for t in displayable_templates if t["id"] == default_template_id), None
       )
@@ -205,8 +232,20 @@ class AudioManagerForm(AudioManagerFormTemplate):
         self.call_js("selectTemplate", default_template, False)
         self.selected_template_language = default_template.get("language", "en")
 
-    self.queue_manager_1.refresh_badge()
-    self.logger.info("Form setup complete.")
+  def show_patients(self, patients):
+    self.all_patients = patients
+    self.call_js("populatePatientModal", self.all_patients)
+
+  def load_patients(self):
+    """Fetches the patients, caches them and refreshes the modal if they changed."""
+    try:
+      patients = anvil.server.call_s("get_my_patients_for_filtering")
+    except Exception as e:
+      self.logger.error("Could not load patients.", e)
+      return
+    patient_cache_manager.set(patients)
+    if patients != self.all_patients:
+      self.show_patients(patients)
 
   def set_selected_template(self, template_data, **event_args):
     """Callback depuis JS pour stocker l'objet du modèle sélectionné."""
@@ -273,19 +312,24 @@ class AudioManagerForm(AudioManagerFormTemplate):
         lang,
         self.current_audio_mime_type,
         template_html,
+        streaming=True,
+        template_id=self.selected_template.get("id"),
       )
 
-      last_displayed_step = "feedback_uploading"
-      while not task.is_completed():
-        time.sleep(1)
-        state = task.get_state()
-        current_step = state.get("step")
+      progress = {"step": "feedback_uploading", "partial_html": None}
 
-        if current_step and current_step != last_displayed_step:
+      def on_state(state):
+        current_step = state.get("step")
+        if current_step and current_step != progress["step"]:
           self.user_feedback_1.set_status(t.t(current_step))
-          last_displayed_step = current_step
+          progress["step"] = current_step
 
-      result = task.get_return_value()
+        partial_html = state.get("partial_html")
+        if partial_html and partial_html != progress["partial_html"]:
+          self.text_editor_1.show_preview(partial_html)
+          progress["partial_html"] = partial_html
+
+      result = wait_for_task(task, on_state)
 
       if result and result.get("success"):
         self.logger.info("Report pipeline completed successfully.")
@@ -294,6 +338,8 @@ class AudioManagerForm(AudioManagerFormTemplate):
         self.mode = "modification"
         self.call_js("setFormMode", self.mode)
       else:
+        if progress["partial_html"]:
+          self.text_editor_1.show_preview(template_html)
         error_msg = result.get("error", "An unknown error occurred.")
         self.logger.error(f"Report pipeline failed: {error_msg}")
         alert(f"{t.t('error_processingFailed')}: {error_msg}")
@@ -344,23 +390,22 @@ class AudioManagerForm(AudioManagerFormTemplate):
         language,
         self.current_audio_mime_type,
         current_content,
+        delta=True,
       )
 
-      last_displayed_step = "feedback_uploading"
-      while not task.is_completed():
-        time.sleep(1)
-        state = task.get_state()
-        current_step = state.get("step")
+      progress = {"step": "feedback_uploading"}
 
-        if current_step and current_step != last_displayed_step:
+      def on_state(state):
+        current_step = state.get("step")
+        if current_step and current_step != progress["step"]:
           self.user_feedback_1.set_status(t.t(current_step))
-          last_displayed_step = current_step
+          progress["step"] = current_step
 
-      result = task.get_return_value()
+      result = wait_for_task(task, on_state)
 
       if result and result.get("success"):
         self.logger.info("Report editing pipeline completed successfully.")
-        self.text_editor_1.html_content = result.get("edited_html")
+        self.text_editor_1.apply_fragments(current_content, result.get("fragments"))
       else:
         error_msg = result.get("error", "An unknown error occurred.")
         self.logger.error(f"Report editing pipeline failed: {error_msg}")
@@ -439,6 +484,7 @@ class AudioManagerForm(AudioManagerFormTemplate):
           # 1. Mettre à jour la liste Python
           self.all_patients.append(new_patient_obj)
           self.all_patients.sort(key=lambda x: x["name"])  # Garder la liste triée
+          patient_cache_manager.set(self.all_patients)
 
           # 2. Appeler le JS pour mettre à jour sa liste
           self.call_js("addPatientToLocalList", new_patient_obj)
@@ -468,7 +514,7 @@ class AudioManagerForm(AudioManagerFormTemplate):
 
       if result:
         self.logger.info("Report saved successfully on the server.")
-        reports_cache_manager.invalidate()
+        reports_cache_manager.mark_stale()
         self.call_js("displayBanner", t.t("audioManager_banner_saveSuccess"), "success")
         return True
       else:
@@ -486,3 +532,77 @@ class AudioManagerForm(AudioManagerFormTemplate):
     self.audio_playback_1.visible = True
     self.recording_widget.visible = False
     self.call_js("setAudioWorkflowState", "decision")
+
+  def queue_manager_1_x_process_all(self, items, **event_args):
+    """
+    Sends every queued recording to the server batch job, which saves each
+    one as a draft report with the selected template. Queues longer than
+    BATCH_CHUNK_SIZE are sent as consecutive jobs. Per-item statuses are
+    mirrored in the queue; finished items are removed from it. Items are
+    marked "processing" one chunk at a time, just before the chunk is sent.
+    """
+    self.logger.info(f"Processing {len(items)} item(s) from the offline queue.")
+    if self.selected_template is None:
+      self.logger.warning("Batch processing halted: No template selected.")
+      return alert(t.t("audioManager_alert_noTemplate"))
+
+    shown_statuses = {}
+
+    def on_state(state):
+      for item_id, item_status in (state.get("items") or {}).items():
+        status = item_status.get("status")
+        if shown_statuses.get(item_id) == status:
+          continue
+        shown_statuses[item_id] = status
+        if status == "done":
+          self.queue_manager_1.delete_item_from_queue(item_id)
+        else:
+          self.queue_manager_1.set_item_status(item_id, status)
+
+    try:
+      saved = 0
+      for start in range(0, len(items), BATCH_CHUNK_SIZE):
+        chunk = items[start : start + BATCH_CHUNK_SIZE]
+        # Only the chunk in flight is marked; the queue resets it on reload.
+        for item in chunk:
+          self.queue_manager_1.set_item_status(item["item_id"], "processing")
+        batch = [
+          {
+            "item_id": item["item_id"],
+            "title": item["title"],
+            "audio_blob": anvil.js.to_media(item["audio_blob"]),
+            "mime_type": item["mime_type"],
+          }
+          for item in chunk
+        ]
+        task = anvil.server.call(
+          "process_audio_batch",
+          batch,
+          self.selected_template_language,
+          self.selected_template.get("html"),
+          template_id=self.selected_template.get("id"),
+        )
+        result = wait_for_task(task, on_state)
+        on_state(result)
+        saved += result.get("saved", 0)
+      reports_cache_manager.mark_stale()
+      self.call_js(
+        "displayBanner",
+        t.t(
+          "audioManager_banner_batchComplete",
+          saved=saved,
+          total=len(items),
+        ),
+        "success",
+      )
+    except Exception as e:
+      self.logger.error("Batch processing of the offline queue failed.", e)
+      if "done" in shown_statuses.values():
+        # Drafts saved before the failure must show up in the archives.
+        reports_cache_manager.mark_stale()
+      for item in items:
+        if shown_statuses.get(item["item_id"]) != "done":
+          self.queue_manager_1.set_item_status(item["item_id"], "queued")
+      alert(f"{t.t('error_processingFailed')}: {e}")
+    finally:
+      self.queue_manager_1.refresh_badge()
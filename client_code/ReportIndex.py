@@ -0,0 +1,197 @@
+import bisect
+import re
+
+# Reports without a status are filtered and displayed under this key.
+UNSPECIFIED_STATUS = "not_specified"
+# Split on separators rather than matching \w, which the browser's regex
+# engine limits to ASCII and would cut accented names apart.
+_SEPARATORS = re.compile(r"[\s\-_.,;:!?/\\()\[\]'\"]+")
+
+
+def _tokens(*values):
+  tokens = set()
+  for value in values:
+    if value:
+      tokens.update(t for t in _SEPARATORS.split(value.lower()) if t)
+  return tokens
+
+
+class ReportIndex:
+  """
+  In-browser index over a list of report summaries, built once when reports
+  load and kept current with add/update/remove.
+
+  Every report gets a slot; sets of reports are Python ints used as bitsets
+  (bit n set = slot n matches), so combining filters is a handful of bitwise
+  operations instead of a scan. Text search matches query words as prefixes
+  of the words of the name, file name and vet name, through a token map and
+  its sorted vocabulary.
+
+  Slots are allocated oldest first, so that reading a bitset from its highest
+  bit down yields the newest reports first, and added reports sort on top.
+  """
+
+  def __init__(self, reports=None, status_label=None):
+    self._status_label = status_label
+    self._reports = []
+    self._slot_by_id = {}
+    self._alive = 0
+    self._by_token = {}
+    self._vocabulary = []
+    self._by_status = {}
+    self._by_patient = {}
+    self._by_vet = {}
+    # Rebuilt lazily after tokens are added or removed.
+    self._vocabulary_dirty = False
+    if reports:
+      for report in reversed(reports):
+        self.add(report)
+
+  def __len__(self):
+    return len(self._slot_by_id)
+
+  @staticmethod
+  def _bit_add(mapping, key, bit):
+    mapping[key] = mapping.get(key, 0) | bit
+
+  @staticmethod
+  def _bit_remove(mapping, key, bit):
+    bits = mapping.get(key, 0) & ~bit
+    if bits:
+      mapping[key] = bits
+    else:
+      mapping.pop(key, None)
+    return bits
+
+  def _report_tokens(self, report):
+    return _tokens(
+      report.get("name"), report.get("file_name"), report.get("vet_display_name")
+    )
+
+  def _compact(self):
+    """Reallocates slots once removed reports outnumber the live ones."""
+    live = [r for r in self._reports if r is not None]
+    self.__init__(status_label=self._status_label)
+    for report in live:
+      self.add(report)
+
+  def add(self, report):
+    """Indexes a report as the newest one. Replaces any report with its id."""
+    report_id = report.get("id")
+    if report_id in self._slot_by_id:
+      self.remove(report_id)
+    if len(self._reports) > 2 * len(self._slot_by_id) + 64:
+      self._compact()
+    slot = len(self._reports)
+    self._reports.append(report)
+    self._slot_by_id[report_id] = slot
+    self._alive |= 1 << slot
+    self._index(slot, report)
+
+  def _index(self, slot, report):
+    bit = 1 << slot
+    status = report.get("statut") or UNSPECIFIED_STATUS
+    if self._status_label:
+      report["statut_display"] = self._status_label(status)
+    self._bit_add(self._by_status, status, bit)
+    self._bit_add(self._by_patient, report.get("animal_id"), bit)
+    self._bit_add(self._by_vet, report.get("owner_email"), bit)
+    for token in self._report_tokens(report):
+      if token not in self._by_token:
+        self._vocabulary_dirty = True
+      self._bit_add(self._by_token, token, bit)
+
+  def update(self, report):
+    """
+    Re-indexes a changed report in its current position, e.g. after a status
+    change that leaves its date alone. Pass a new dict: the indexed one is
+    needed to find the old values. Reports not indexed yet are added.
+    """
+    slot = self._slot_by_id.get(report.get("id"))
+    if slot is None:
+      self.add(report)
+      return
+    self._unindex(slot, self._reports[slot])
+    self._reports[slot] = report
+    self._index(slot, report)
+
+  def remove(self, report_id):
+    """Drops a report from the index. Returns False if it was not indexed."""
+    slot = self._slot_by_id.pop(report_id, None)
+    if slot is None:
+      return False
+    report = self._reports[slot]
+    self._reports[slot] = None
+    self._alive &= ~(1 << slot)
+    self._unindex(slot, report)
+    return True
+
+  def _unindex(self, slot, report):
+    bit = 1 << slot
+    self._bit_remove(
+      self._by_status, report.get("statut") or UNSPECIFIED_STATUS, bit
+    )
+    self._bit_remove(self._by_patient, report.get("animal_id"), bit)
+    self._bit_remove(self._by_vet, report.get("owner_email"), bit)
+    for token in self._report_tokens(report):
+      if not self._bit_remove(self._by_token, token, bit):
+        self._vocabulary_dirty = True
+
+  def relabel(self, status_label):
+    """Recomputes statut_display on every report, e.g. after a language change."""
+    self._status_label = status_label
+    for report in self._reports:
+      if report is not None:
+        report["statut_display"] = status_label(
+          report.get("statut") or UNSPECIFIED_STATUS
+        )
+
+  def _prefix_bits(self, prefix):
+    if self._vocabulary_dirty:
+      self._vocabulary = sorted(self._by_token)
+      self._vocabulary_dirty = False
+    bits = 0
+    start = bisect.bisect_left(self._vocabulary, prefix)
+    for token in self._vocabulary[start:]:
+      if not token.startswith(prefix):
+        break
+      bits |= self._by_token[token]
+    return bits
+
+  @staticmethod
+  def _any_of(mapping, keys):
+    bits = 0
+    for key in keys:
+      bits |= mapping.get(key, 0)
+    return bits
+
+  def search(self, query=None, statuses=None, patient_ids=None, vet_emails=None):
+    """
+    Returns the matching reports, newest first. Every word of `query` must
+    prefix a word of the report; each non-empty filter list keeps the reports
+    matching any of its values.
+    """
+    bits = self._alive
+    for word in _tokens(query):
+      bits &= self._prefix_bits(word)
+      if not bits:
+        return []
+    if statuses:
+      bits &= self._any_of(self._by_status, statuses)
+    if patient_ids:
+      bits &= self._any_of(self._by_patient, patient_ids)
+    if vet_emails:
+      bits &= self._any_of(self._by_vet, vet_emails)
+    return self._reports_in(bits)
+
+  def _reports_in(self, bits):
+    # Walking the binary string is linear, unlike clearing the lowest bit
+    # of a large int once per match.
+    digits = bin(bits)[2:] if bits else ""
+    top = len(digits) - 1
+    result = []
+    position = digits.find("1")
+    while position != -1:
+      result.append(self._reports[top - position])
+      position = digits.find("1", position + 1)
+    return result
@@ -4,7 +4,13 @@ import anvil.server
 import anvil.users
 import anvil.js
 from ... import TranslationService as t
-from ...Cache import user_settings_cache, reports_cache_manager, template_cache_manager
+from ...Cache import (
+  user_settings_cache,
+  reports_cache_manager,
+  template_cache_manager,
+  patient_cache_manager,
+  clear_persistent_cache,
+)
 from ...AppEvents import events
 from ...AuthHelpers import setup_auth_handlers
 from ...LoggingClient import ClientLogger
@@ -220,17 +226,16 @@ class Settings(SettingsTemplate):
   def _update_asset_previews(self, assets):
     """Helper to update the src of preview images and visibility of messages."""
 
-    signature_asset = (
-      assets.get("signature").get("file")
-      if assets.get("signature") is not None
-      else None
-    )
-    header_asset = (
-      assets.get("header").get("file") if assets.get("header") is not None else None
-    )
-    footer_asset = (
-      assets.get("footer").get("file") if assets.get("footer") is not None else None
-    )
+    def preview_of(asset):
+      # Thumbnails are small enough to load instantly; assets uploaded before
+      # they existed, or that are not images, show the original.
+      if asset is None:
+        return None
+      return asset.get("thumbnail") or asset.get("file")
+
+    signature_asset = preview_of(assets.get("signature"))
+    header_asset = preview_of(assets.get("header"))
+    footer_asset = preview_of(assets.get("footer"))
 
     # Pass the URL string (or None) to the JavaScript function.
     self.call_js(
@@ -352,6 +357,8 @@ class Settings(SettingsTemplate):
     """Logs the user out."""
     reports_cache_manager.invalidate()
     template_cache_manager.invalidate()
+    patient_cache_manager.invalidate()
+    clear_persistent_cache()
     for key in user_settings_cache:
       user_settings_cache[key] = None
 
@@ -0,0 +1,32 @@
+import anvil.server
+
+
+def wait_for_task(task, on_state=None):
+  """
+  Waits for a server background task by long-polling 'wait_for_task_progress'.
+  The server holds each call until the task's step changes, it completes, or
+  the poll times out, so a report costs a handful of calls instead of two per
+  second.
+
+  Args:
+      task: The Task object returned by the launching server function.
+      on_state (callable): Called with the task's state dict every time a new
+          version of it is received.
+
+  Returns:
+      The task's return value. Raises an Exception if the task itself failed.
+  """
+  task_id = task.get_id()
+  version = None
+  step = None
+  while True:
+    response = anvil.server.call_s("wait_for_task_progress", task_id, version, step)
+    state = response.get("state") or {}
+    if on_state and response.get("version") != version:
+      on_state(state)
+    version = response.get("version")
+    step = state.get("step")
+    if response.get("completed"):
+      if response.get("error"):
+        raise Exception(response["error"])
+      return response.get("result")
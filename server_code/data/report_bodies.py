@@ -0,0 +1,439 @@
+import anvil
+import anvil.server
+import anvil.tables as tables
+import anvil.tables.query as q
+from anvil.tables import app_tables
+import difflib
+import gzip
+import json
+import random
+import re
+import time
+from datetime import datetime
+from ..auth import admin_required
+from ..logging_server import get_logger
+
+logger = get_logger(__name__)
+
+# Report bodies are stored gzip-compressed in report_bodies, one row per
+# (report, version), instead of in the reports row itself. A report whose
+# body_version is empty still has its body in the legacy report_rich column
+# until migrate_report_body moves it.
+#
+# The current version is always a full "snapshot". When a new version is
+# saved, the previous one is replaced by a "diff" that rebuilds it from the
+# version above, unless it is kept as a snapshot to bound reconstruction:
+# a chain of diffs ends once its bytes would exceed one compressed body, or
+# after MAX_DIFF_CHAIN diffs. Snapshots thus cost at most as much as the
+# diffs they follow, and storage grows with the size of the edits.
+BODY_ENCODING = "gzip"
+BODY_COMPRESSION_LEVEL = 6
+BODY_CONTENT_TYPE = "application/gzip"
+SNAPSHOT = "snapshot"
+DIFF = "diff"
+MAX_DIFF_CHAIN = 50
+# The migration publishes its progress every this many reports.
+MIGRATION_PROGRESS_EVERY = 200
+
+# Diffs work on tags and words, each with its trailing whitespace, so HTML
+# without line breaks still diffs finely. Every character falls in exactly
+# one token.
+_TOKENS = re.compile(r"<[^>]*>\s*|[^<\s]+\s*|\s+|<")
+
+
+def _compress(text):
+  return gzip.compress(text.encode("utf-8"), compresslevel=BODY_COMPRESSION_LEVEL)
+
+
+def _decompress(data, encoding=BODY_ENCODING):
+  if encoding == "gzip":
+    data = gzip.decompress(data)
+  return data.decode("utf-8")
+
+
+def make_diff(source, target):
+  """
+  Returns the ops turning `source` into `target`: a positive int copies that
+  many source tokens, a negative int skips that many, a string is inserted.
+  """
+  source_tokens = _TOKENS.findall(source)
+  target_tokens = _TOKENS.findall(target)
+  # Edits are usually local: only the middle that differs goes to the matcher.
+  limit = min(len(source_tokens), len(target_tokens))
+  prefix = 0
+  while prefix < limit and source_tokens[prefix] == target_tokens[prefix]:
+    prefix += 1
+  suffix = 0
+  while (
+    suffix < limit - prefix
+    and source_tokens[-1 - suffix] == target_tokens[-1 - suffix]
+  ):
+    suffix += 1
+  source_middle = source_tokens[prefix : len(source_tokens) - suffix]
+  target_middle = target_tokens[prefix : len(target_tokens) - suffix]
+
+  ops = [prefix] if prefix else []
+  matcher = difflib.SequenceMatcher(None, source_middle, target_middle, autojunk=False)
+  for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+    if tag == "equal":
+      ops.append(i2 - i1)
+      continue
+    if i2 > i1:
+      ops.append(i1 - i2)
+    if j2 > j1:
+      ops.append("".join(target_middle[j1:j2]))
+  if suffix:
+    ops.append(suffix)
+  return ops
+
+
+def apply_diff(source, ops):
+  """Rebuilds the target of make_diff from its source."""
+  tokens = _TOKENS.findall(source)
+  parts = []
+  position = 0
+  for op in ops:
+    if isinstance(op, str):
+      parts.append(op)
+    elif op >= 0:
+      parts.extend(tokens[position : position + op])
+      position += op
+    else:
+      position -= op
+  return "".join(parts)
+
+
+# --- Version stores: report_bodies rows, or dicts for the benchmark ---
+class _TableVersions:
+  def __init__(self, report_row):
+    self.report_row = report_row
+
+  def get(self, version):
+    return app_tables.report_bodies.get(report=self.report_row, version=version)
+
+  def read(self, entry):
+    return entry["body"].get_bytes()
+
+  def _media(self, version, kind, body):
+    return anvil.BlobMedia(
+      BODY_CONTENT_TYPE, body, name=f"{self.report_row.get_id()}_v{version}.{kind}.gz"
+    )
+
+  def add(self, version, kind, body, **fields):
+    app_tables.report_bodies.add_row(
+      report=self.report_row,
+      version=version,
+      kind=kind,
+      body=self._media(version, kind, body),
+      encoding=BODY_ENCODING,
+      **fields,
+    )
+
+  def replace(self, entry, kind, body, **fields):
+    entry.update(kind=kind, body=self._media(entry["version"], kind, body), **fields)
+
+  def ascending_from(self, version):
+    return app_tables.report_bodies.search(
+      tables.order_by("version", ascending=True),
+      report=self.report_row,
+      version=q.greater_than_or_equal_to(version),
+    )
+
+
+class _MemoryVersions:
+  def __init__(self):
+    self.rows = {}
+
+  def get(self, version):
+    return self.rows.get(version)
+
+  def read(self, entry):
+    return entry["body"]
+
+  def add(self, version, kind, body, **fields):
+    self.rows[version] = dict(
+      version=version, kind=kind, body=body, encoding=BODY_ENCODING, **fields
+    )
+
+  def replace(self, entry, kind, body, **fields):
+    entry.update(kind=kind, body=body, **fields)
+
+  def ascending_from(self, version):
+    return [self.rows[v] for v in sorted(self.rows) if v >= version]
+
+  def stored_bytes(self):
+    return sum(entry["stored_size"] for entry in self.rows.values())
+
+
+def _add_version(store, previous_version, html, author=None):
+  """Saves `html` as the version after `previous_version` and returns it."""
+  version = previous_version + 1
+  snapshot = _compress(html)
+  store.add(
+    version,
+    SNAPSHOT,
+    snapshot,
+    size=len(html.encode("utf-8")),
+    stored_size=len(snapshot),
+    chain_bytes=0,
+    chain_length=0,
+    author=author,
+    created_at=datetime.now(),
+  )
+
+  previous = store.get(previous_version) if previous_version else None
+  if previous is None or previous["kind"] == DIFF:
+    return version
+  previous_html = _decompress(store.read(previous), previous["encoding"])
+  diff = _compress(json.dumps(make_diff(html, previous_html), separators=(",", ":")))
+  below = store.get(previous_version - 1)
+  chained = below is not None and below["kind"] == DIFF
+  chain_bytes = len(diff) + (below["chain_bytes"] if chained else 0)
+  chain_length = 1 + (below["chain_length"] if chained else 0)
+  if chain_bytes <= previous["stored_size"] and chain_length <= MAX_DIFF_CHAIN:
+    store.replace(
+      previous,
+      DIFF,
+      diff,
+      stored_size=len(diff),
+      chain_bytes=chain_bytes,
+      chain_length=chain_length,
+    )
+  return version
+
+
+def _rebuild_version(store, version):
+  """Rebuilds a version from the nearest snapshot above it, or returns None."""
+  diffs = []
+  html = None
+  expected = version
+  for entry in store.ascending_from(version):
+    if entry["version"] != expected:
+      return None
+    if entry["kind"] != DIFF:
+      html = _decompress(store.read(entry), entry["encoding"])
+      break
+    diffs.append(entry)
+    expected += 1
+  if html is None:
+    return None
+  for entry in reversed(diffs):
+    html = apply_diff(html, json.loads(_decompress(store.read(entry))))
+  return html
+
+
+# --- Public API ---
+def write_body(report_row, html, author=None):
+  """
+  Stores `html` as the report's new body version and returns that version.
+  An unchanged body creates no version. Must run inside the caller's
+  transaction: the head version is re-read there, so of two concurrent saves
+  the second retries on top of the first instead of writing the same version
+  number.
+  """
+  html = html or ""
+  head = app_tables.reports.get_by_id(report_row.get_id(), q.fetch_only("body_version"))
+  current = (head["body_version"] if head else report_row["body_version"]) or 0
+  if current and _read_version(report_row, current) == html:
+    return current
+  version = _add_version(_TableVersions(report_row), current, html, author=author)
+  report_row.update(body_version=version, report_rich=None)
+  return version
+
+
+def read_body(report_row):
+  """Returns the report's HTML body, decompressing it only now."""
+  version = report_row["body_version"]
+  if not version:
+    legacy = report_row["report_rich"]
+    return legacy if isinstance(legacy, str) or legacy is None else str(legacy)
+  return _read_version(report_row, version)
+
+
+def _read_version(report_row, version):
+  body_row = app_tables.report_bodies.get(report=report_row, version=version)
+  if body_row is None:
+    logger.error(f"Body version {version} of report '{report_row.get_id()}' is missing.")
+    return None
+  return _decompress(body_row["body"].get_bytes(), body_row["encoding"])
+
+
+def read_body_version(report_row, version):
+  """Returns the HTML of any saved version of a report, or None."""
+  if version == report_row["body_version"]:
+    return read_body(report_row)
+  return _rebuild_version(_TableVersions(report_row), version)
+
+
+def list_body_versions(report_row):
+  """Returns the report's saved versions, newest first."""
+  return app_tables.report_bodies.search(
+    tables.order_by("version", ascending=False),
+    q.fetch_only("version", "size", "created_at", author=q.fetch_only("name", "email")),
+    report=report_row,
+  )
+
+
+def delete_bodies(report_row):
+  """Deletes every stored body of a report about to be deleted."""
+  for body_row in app_tables.report_bodies.search(report=report_row):
+    body_row.delete()
+
+
+def migrate_report_body(report_row):
+  """
+  Moves a legacy report_rich body to report_bodies, in the caller's
+  transaction. Returns False if there is none.
+  """
+  if report_row["body_version"] or report_row["report_rich"] is None:
+    return False
+  legacy = report_row["report_rich"]
+  write_body(report_row, legacy if isinstance(legacy, str) else str(legacy))
+  return True
+
+
+@anvil.server.callable
+@admin_required
+def admin_migrate_report_bodies():
+  """
+  Admin function moving every legacy report_rich body to compressed storage.
+  Runs as a background task and can be run again safely.
+  """
+  logger.info("Launching report bodies migration background task...")
+  return anvil.server.launch_background_task("bg_migrate_report_bodies")
+
+
+@tables.in_transaction
+def _migrate_one(report_id):
+  report_row = app_tables.reports.get_by_id(report_id)
+  return report_row is not None and migrate_report_body(report_row)
+
+
+@anvil.server.background_task
+def bg_migrate_report_bodies():
+  """Background task behind admin_migrate_report_bodies."""
+  # Ids are collected first: migrated rows stop matching the query.
+  pending_ids = [
+    row.get_id()
+    for row in app_tables.reports.search(
+      q.fetch_only(), body_version=None, report_rich=q.not_(None)
+    )
+  ]
+  migrated = 0
+  failed = 0
+  for position, report_id in enumerate(pending_ids, start=1):
+    try:
+      if _migrate_one(report_id):
+        migrated += 1
+    except Exception as e:
+      failed += 1
+      logger.error(f"Could not migrate report '{report_id}': {e}")
+    if position % MIGRATION_PROGRESS_EVERY == 0:
+      anvil.server.task_state["migrated"] = migrated
+      anvil.server.task_state["failed"] = failed
+  logger.info(f"Report bodies migrated: {migrated}, failed: {failed}.")
+  return {"pending": len(pending_ids), "migrated": migrated, "failed": failed}
+
+
+# --- VERSION HISTORY BENCHMARK ---
+_BENCHMARK_WORDS = (
+  "cheval jument poulain boiterie antérieur droit fourbure radiographie sabot "
+  "traitement anti-inflammatoire repos box contrôle semaine échographie tendon"
+).split()
+
+
+def _synthetic_paragraph(rng):
+  words = [rng.choice(_BENCHMARK_WORDS) for _ in range(rng.randint(20, 60))]
+  return f"<p>{' '.join(words).capitalize()}.</p>"
+
+
+def _synthetic_edit(rng, html):
+  """Applies one small random edit; returns (html, edited characters)."""
+  paragraphs = re.findall(r"<p>.*?</p>", html)
+  index = rng.randrange(len(paragraphs))
+  words = paragraphs[index][3:-4].split(" ")
+  action = rng.choice(["replace", "insert", "delete", "append"])
+  if action == "append":
+    added = _synthetic_paragraph(rng)
+    return html + added, len(added)
+  position = rng.randrange(len(words))
+  if action == "replace":
+    removed = words[position]
+    words[position] = rng.choice(_BENCHMARK_WORDS)
+    edited = len(removed) + len(words[position])
+  elif action == "insert":
+    inserted = [rng.choice(_BENCHMARK_WORDS) for _ in range(rng.randint(3, 12))]
+    words[position:position] = inserted
+    edited = len(" ".join(inserted))
+  else:
+    removed = words[position : position + rng.randint(1, 8)]
+    del words[position : position + len(removed)]
+    edited = len(" ".join(removed))
+  paragraphs[index] = f"<p>{' '.join(words)}</p>"
+  return "".join(paragraphs), edited
+
+
+@anvil.server.callable
+@admin_required
+def admin_benchmark_report_versions(reports=5, edits=100, paragraphs=40):
+  """
+  Admin function measuring version history storage on synthetic reports:
+  `reports` reports of `paragraphs` paragraphs, each edited `edits` times.
+  Runs in memory, as a background task; its return value compares the bytes
+  stored per edit with the size of the edits and with keeping full copies.
+  """
+  logger.info("Launching report versions benchmark background task...")
+  return anvil.server.launch_background_task(
+    "bg_benchmark_report_versions", reports, edits, paragraphs
+  )
+
+
+@anvil.server.background_task
+def bg_benchmark_report_versions(reports, edits, paragraphs):
+  """Background task behind admin_benchmark_report_versions."""
+  rng = random.Random(7)
+  totals = {"report_bytes": 0, "edited_chars": 0, "stored": 0, "full_copies": 0}
+  snapshots = 0
+  write_times = []
+  rebuild_times = []
+  for _ in range(reports):
+    store = _MemoryVersions()
+    html = "".join(_synthetic_paragraph(rng) for _ in range(paragraphs))
+    history = [html]
+    version = _add_version(store, 0, html)
+    for _ in range(edits):
+      # Keeping history in full would store each superseded version as is.
+      totals["full_copies"] += len(_compress(html))
+      html, edited = _synthetic_edit(rng, html)
+      history.append(html)
+      totals["edited_chars"] += edited
+      started = time.perf_counter()
+      version = _add_version(store, version, html)
+      write_times.append(time.perf_counter() - started)
+    totals["report_bytes"] += len(html.encode("utf-8"))
+    # The current version is stored in full in both schemes; only history counts.
+    totals["stored"] += store.stored_bytes() - store.get(version)["stored_size"]
+    snapshots += sum(1 for e in store.rows.values() if e["kind"] == SNAPSHOT)
+
+    for number in range(1, version + 1):
+      started = time.perf_counter()
+      rebuilt = _rebuild_version(store, number)
+      rebuild_times.append(time.perf_counter() - started)
+      if rebuilt != history[number - 1]:
+        raise Exception(f"Version {number} was not rebuilt identically.")
+
+  total_edits = reports * edits
+  result = {
+    "reports": reports,
+    "edits_per_report": edits,
+    "avg_report_bytes": totals["report_bytes"] // reports,
+    "avg_edited_chars": round(totals["edited_chars"] / total_edits, 1),
+    "avg_history_bytes_per_edit": round(totals["stored"] / total_edits, 1),
+    "avg_full_copy_bytes_per_edit": round(totals["full_copies"] / total_edits, 1),
+    "snapshots_per_report": round(snapshots / reports, 1),
+    "write_p50_ms": round(sorted(write_times)[len(write_times) // 2] * 1000, 2),
+    "rebuild_p50_ms": round(sorted(rebuild_times)[len(rebuild_times) // 2] * 1000, 2),
+    "rebuild_max_ms": round(max(rebuild_times) * 1000, 2),
+  }
+  logger.info(f"Report versions benchmark complete: {result}")
+  return result
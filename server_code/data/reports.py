@@ -4,46 +4,243 @@ import anvil.tables as tables
 import anvil.tables.query as q
 from anvil.tables import app_tables
 import anvil.server
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from ..services.report_counters import add_report_count, move_report_count
+from ..services.report_search import index_report, unindex_report
+from .report_bodies import (
+  write_body,
+  read_body,
+  read_body_version,
+  list_body_versions,
+  delete_bodies,
+)
 from ..logging_server import get_logger
 
 logger = get_logger(__name__)
 
 
-@anvil.server.callable
-def read_reports():
+# The valid report statuses, served to clients by get_status_options.
+REPORT_STATUSES = ("pending_correction", "validated", "sent", "not_specified")
+# Reports one bulk call may change.
+BULK_MAX_REPORTS = 200
+# Columns a bulk action reads, the vet included for authorization.
+BULK_FETCH = q.fetch_only("statut", "last_modified", vet=q.fetch_only())
+
+# --- Paginated listing ---
+REPORTS_PAGE_SIZE = 50
+MAX_REPORTS_PAGE_SIZE = 500
+# Columns sent in report listings. The heavy bodies (see report_bodies) and
+# transcripts are only read by read_report, when a report is opened.
+SUMMARY_FETCH = q.fetch_only(
+  "file_name", "last_modified", "statut", "updated_at", animal=q.fetch_only("name")
+)
+# Deletions are kept this long for delta sync. Clients whose high-water mark
+# is older must reload their lists in full.
+TOMBSTONE_RETENTION = timedelta(days=30)
+
+
+def report_summary(report_row):
+  """Builds the listing entry of a report, without its content."""
+  animal_row = report_row["animal"]
+  return {
+    "id": report_row.get_id(),
+    "file_name": report_row["file_name"],
+    "name": animal_row["name"] if animal_row else None,
+    "animal_id": animal_row.get_id() if animal_row else None,
+    "last_modified": (
+      report_row["last_modified"].strftime("%Y-%m-%d %H:%M:%S")
+      if report_row["last_modified"]
+      else None
+    ),
+    "statut": report_row["statut"],
+  }
+
+
+def _tie_key(report_row):
+  """
+  Orders the reports of one day: most recently updated first, legacy rows
+  without updated_at last, then by row id so that the order is total.
+  """
+  return _tie_key_of(report_row["updated_at"], report_row.get_id())
+
+
+def _tie_key_of(updated_at, row_id):
+  return (updated_at is None, -updated_at.timestamp() if updated_at else 0, row_id)
+
+
+def _encode_cursor(report_row):
+  """Keyset cursor pointing after `report_row`: "day|updated_at|row id"."""
+  day, updated_at = report_row["last_modified"], report_row["updated_at"]
+  return "|".join([
+    day.isoformat() if day else "",
+    updated_at.isoformat() if updated_at else "",
+    report_row.get_id(),
+  ])
+
+
+def _decode_cursor(cursor):
+  """Returns (day, tie key) of the row a cursor points after."""
+  try:
+    day, updated_at, row_id = cursor.split("|", 2)
+    day = date.fromisoformat(day) if day else None
+    updated_at = datetime.fromisoformat(updated_at) if updated_at else None
+  except (AttributeError, ValueError):
+    raise ValueError(f"Invalid cursor '{cursor}'.")
+  return day, _tie_key_of(updated_at, row_id)
+
+
+@anvil.server.callable(require_user=True)
+def list_reports(
+  cursor=None,
+  page_size=REPORTS_PAGE_SIZE,
+  statuses=None,
+  patient_ids=None,
+  date_from=None,
+  date_to=None,
+  search=None,
+):
+  """
+  Returns one page of the current vet's reports, most recently modified first,
+  with summary columns only. Reports modified the same day come most recently
+  updated first; the cursor is a keyset, so pages neither skip nor repeat
+  reports when others are saved in between.
+
+  Args:
+      cursor (str | None): The `next_cursor` of the previous page, or None for
+          the first page.
+      page_size (int): Reports per page, capped at MAX_REPORTS_PAGE_SIZE.
+      statuses (list | None): Status keys to keep. "not_specified" also matches
+          reports without a status.
+      patient_ids (list | None): Row ids of the animals to keep.
+      date_from, date_to (date | None): Inclusive bounds on last_modified.
+      search (str | None): Case-insensitive text matched against the file name
+          and the patient name.
+
+  Returns:
+      dict: {"reports": [summary, ...], "next_cursor": str or None}
+  """
   current_user = anvil.users.get_user()
-  reports = app_tables.reports.search(
-    tables.order_by("last_modified", ascending=False), vet=current_user
+  page_size = max(1, min(int(page_size or REPORTS_PAGE_SIZE), MAX_REPORTS_PAGE_SIZE))
+  after = _decode_cursor(cursor) if cursor else None
+  empty_page = {"reports": [], "next_cursor": None}
+
+  conditions = []
+  filters = {"vet": current_user}
+  if statuses:
+    values = list(statuses)
+    if "not_specified" in values:
+      values.append(None)
+    filters["statut"] = q.any_of(*values)
+
+  if patient_ids:
+    animal_rows = [app_tables.animals.get_by_id(animal_id) for animal_id in patient_ids]
+    animal_rows = [a for a in animal_rows if a is not None and a["vet"] == current_user]
+    if not animal_rows:
+      return empty_page
+    filters["animal"] = q.any_of(*animal_rows)
+
+  date_bounds = []
+  if date_from is not None:
+    date_bounds.append(q.greater_than_or_equal_to(date_from))
+  if date_to is not None:
+    date_bounds.append(q.less_than_or_equal_to(date_to))
+
+  if search and search.strip():
+    pattern = f"%{search.strip()}%"
+    matching_animals = list(
+      app_tables.animals.search(q.fetch_only(), vet=current_user, name=q.ilike(pattern))
+    )
+    if matching_animals:
+      conditions.append(
+        q.any_of(file_name=q.ilike(pattern), animal=q.any_of(*matching_animals))
+      )
+    else:
+      conditions.append(q.any_of(file_name=q.ilike(pattern)))
+
+  def _rows_of_day(day):
+    """The reports of one last_modified day (None: undated), in tie order."""
+    rows = app_tables.reports.search(SUMMARY_FETCH, *conditions, **filters, last_modified=day)
+    return sorted(rows, key=_tie_key)
+
+  # Keyset pagination on (last_modified, updated_at, row id). last_modified is
+  # a date, so many reports share it; the database orders whole days and each
+  # day is ordered by _tie_key here. A page ends on a day boundary, except when
+  # a single day holds more than a page.
+  page = []
+  older_days = None
+  if after is not None:
+    after_day, after_key = after
+    page = [row for row in _rows_of_day(after_day) if _tie_key(row) > after_key]
+    if after_day is not None:
+      older_days = q.all_of(q.less_than(after_day), *date_bounds)
+  else:
+    older_days = q.all_of(q.not_(None), *date_bounds)
+
+  if older_days is not None and len(page) <= page_size:
+    rows = app_tables.reports.search(
+      SUMMARY_FETCH,
+      tables.order_by("last_modified", ascending=False),
+      *conditions,
+      **filters,
+      last_modified=older_days,
+    )
+    day_rows = []
+    for row in rows:
+      if day_rows and row["last_modified"] != day_rows[0]["last_modified"]:
+        page.extend(sorted(day_rows, key=_tie_key))
+        day_rows = []
+        if len(page) > page_size:
+          break
+      day_rows.append(row)
+    page.extend(sorted(day_rows, key=_tie_key))
+    # Undated legacy reports come last, and never match a date range.
+    if len(page) <= page_size and not date_bounds:
+      page.extend(_rows_of_day(None))
+
+  has_more = len(page) > page_size
+  page = page[:page_size]
+  logger.debug(f"list_reports returned {len(page)} report(s) after cursor {cursor!r}.")
+  return {
+    "reports": [report_summary(row) for row in page],
+    "next_cursor": _encode_cursor(page[-1]) if has_more else None,
+  }
+
+
+def _user_can_access_report(current_user, report_row):
+  """True for the report's author and for supervisors of the author's structure."""
+  report_owner = report_row["vet"]
+  if report_owner == current_user:
+    return True
+  return bool(
+    current_user["supervisor"]
+    and report_owner
+    and report_owner["structure"]
+    and current_user["structure"] == report_owner["structure"]
   )
 
-  result = []
-  for report in reports:
-    animal_row = report["animal"]
-    animal_name = animal_row["name"] if animal_row else None
-    # --- MODIFIED: Add the animal's Row ID for client-side filtering ---
-    animal_id = animal_row.get_id() if animal_row else None
 
-    dt_str = (
-      report["last_modified"].strftime("%Y-%m-%d %H:%M:%S")
-      if report["last_modified"]
-      else None
+@anvil.server.callable(require_user=True)
+def read_report(report_id):
+  """
+  Returns the full content of one report (summary columns plus report_rich,
+  transcript and language), for the listing entries opened by the user. The
+  body is only read and decompressed here.
+  """
+  current_user = anvil.users.get_user()
+  report_row = app_tables.reports.get_by_id(report_id)
+  if report_row is None or not _user_can_access_report(current_user, report_row):
+    logger.warning(
+      f"[SECURITY] Read denied for report ID '{report_id}' to user '{current_user['email']}'."
     )
+    return None
 
-    report_dict = {
-      "id": report.get_id(),
-      "file_name": report["file_name"],
-      "name": animal_name,
-      "animal_id": animal_id,  # <-- ADDED
-      "vet": report["vet"],
-      "last_modified": dt_str,
-      "report_rich": report["report_rich"],
-      "statut": report["statut"],
-      "transcript": report["transcript"],
-    }
-    result.append(report_dict)
-
-  return result
+  report = report_summary(report_row)
+  report.update({
+    "report_rich": read_body(report_row),
+    "transcript": report_row["transcript"],
+    "language": report_row["language"],
+  })
+  return report
 
 
 @anvil.server.callable
@@ -66,15 +263,32 @@ def write_report(
   current_user = anvil.users.get_user()
   print(f"[DEBUG] Current user: {current_user}")
 
+  report_row = _write_report_row(
+    current_user, file_name, animal_name, last_modified, report_rich, statut
+  )
+  index_report(
+    report_row, report_rich if report_rich is not None else read_body(report_row)
+  )
+
+  # Final state of the report_row
+  print(f"[DEBUG] Final report_row: {report_row}")
+  return True
+
+
+@tables.in_transaction
+def _write_report_row(current_user, file_name, animal_name, last_modified, report_rich, statut):
+  """The table writes of write_report, with the body and counters, in one transaction."""
   # Check if a report row already exists
   report_row = app_tables.reports.get(file_name=file_name, vet=current_user)
   print(f"[DEBUG] Existing report_row: {report_row}")
 
   # If no existing report, create a new one
-  if report_row is None:
+  created = report_row is None
+  if created:
     print("[DEBUG] No existing report found. Creating a new row...")
     report_row = app_tables.reports.add_row(file_name=file_name, vet=current_user)
     print(f"[DEBUG] New report_row created: {report_row}")
+  old_statut, old_last_modified = report_row["statut"], report_row["last_modified"]
 
   # Handle the animal field
   if animal_name is not None:
@@ -94,7 +308,7 @@ def write_report(
 
   if report_rich is not None:
     print(f"[DEBUG] Updating rapport_text to {report_rich}")
-    report_row["report_rich"] = report_rich
+    write_body(report_row, report_rich, author=current_user)
 
   if statut is not None:
     print(f"[DEBUG] Updating rapport_text to {statut}")
@@ -103,13 +317,21 @@ def write_report(
   # Always update the last_modified field to the current server time
   current_time = datetime.now().date()  # Convert datetime to date
   report_row["last_modified"] = current_time
+  report_row["updated_at"] = datetime.now()
   print(
     f"[DEBUG] Updated report_row['last_modified'] to current server time: {current_time}"
   )
-
-  # Final state of the report_row
-  print(f"[DEBUG] Final report_row: {report_row}")
-  return True
+  if created:
+    add_report_count(current_user, report_row["statut"], report_row["last_modified"], 1)
+  else:
+    move_report_count(
+      current_user,
+      old_statut,
+      old_last_modified,
+      report_row["statut"],
+      report_row["last_modified"],
+    )
+  return report_row
 
 
 @anvil.server.callable
@@ -123,6 +345,44 @@ def write_report_first_time(
   transcript=None,
   language=None,
 ):
+  # Get the current user (we use this as the vet)
+  current_user = anvil.users.get_user()
+  create_report_row(
+    current_user,
+    animal_name=animal_name,
+    last_modified=last_modified,
+    report_rich=report_rich,
+    statut=statut,
+    animal_id=animal_id,
+    transcript=transcript,
+    language=language,
+  )
+  return True
+
+
+def create_report_row(current_user, **fields):
+  """
+  Creates a new report row owned by `current_user` and returns it. Shared by
+  write_report_first_time and the background jobs that save reports for the
+  user who launched them. `fields` are the arguments of write_report_first_time.
+  """
+  report_row = _add_report_row(current_user, **fields)
+  index_report(report_row, fields.get("report_rich"))
+  return report_row
+
+
+@tables.in_transaction
+def _add_report_row(
+  current_user,
+  animal_name=None,
+  last_modified=None,
+  report_rich=None,
+  statut=None,
+  animal_id=None,
+  transcript=None,
+  language=None,
+):
+  """The table writes of create_report_row, with the body and counters, in one transaction."""
   # Get the current date string for file name generation
   current_date_str = datetime.now().strftime("%Y%m%d")
 
@@ -135,12 +395,9 @@ def write_report_first_time(
   # Log the start of the function with the generated file_name
   print(
     f"[DEBUG] Starting write_report_first_time with generated file_name={file_name}, "
-    f"animal_name={animal_name}, vet={vet}, last_modified={last_modified}, "
+    f"animal_name={animal_name}, last_modified={last_modified}, "
     f"report_rich={report_rich}, statut={statut}, animal_id={animal_id}"
   )
-
-  # Get the current user (we use this as the vet)
-  current_user = anvil.users.get_user()
   print(f"[DEBUG] Current user: {current_user}")
 
   # Always create a new report row unconditionally with the generated file_name
@@ -167,7 +424,7 @@ def write_report_first_time(
 
   if report_rich is not None:
     print(f"[DEBUG] Updating report_rich to {report_rich}")
-    report_row["report_rich"] = report_rich
+    write_body(report_row, report_rich, author=current_user)
 
   if statut is not None:
     print(f"[DEBUG] Updating statut to {statut}")
@@ -183,13 +440,16 @@ def write_report_first_time(
   # Always update the last_modified field to the current server time.
   current_time = datetime.now().date()  # Converting to date if needed.
   report_row["last_modified"] = current_time
+  report_row["updated_at"] = datetime.now()
   print(
     f"[DEBUG] Updated report_row['last_modified'] to current server time: {current_time}"
   )
 
+  add_report_count(current_user, report_row["statut"], report_row["last_modified"], 1)
+
   # Final state of the report_row for debugging.
   print(f"[DEBUG] Final report_row: {report_row}")
-  return True
+  return report_row
 
 
 @anvil.server.callable
@@ -220,6 +480,65 @@ def pick_report(file_name, header):
     return None
 
 
+@anvil.server.callable(require_user=True)
+def list_report_versions(report_id):
+  """
+  Returns the saved versions of a report, newest first, as dicts with
+  "version", "created_at", "size" and "author" (a name, or None).
+  """
+  current_user = anvil.users.get_user()
+  report_row = app_tables.reports.get_by_id(report_id)
+  if report_row is None or not _user_can_access_report(current_user, report_row):
+    logger.warning(
+      f"[SECURITY] Version list denied for report ID '{report_id}' to user '{current_user['email']}'."
+    )
+    return []
+  return [
+    {
+      "version": row["version"],
+      "created_at": (
+        row["created_at"].strftime("%Y-%m-%d %H:%M:%S") if row["created_at"] else None
+      ),
+      "size": row["size"],
+      "author": (row["author"]["name"] or row["author"]["email"]) if row["author"] else None,
+    }
+    for row in list_body_versions(report_row)
+  ]
+
+
+@anvil.server.callable(require_user=True)
+def read_report_version(report_id, version):
+  """Returns the HTML of one saved version of a report, or None."""
+  current_user = anvil.users.get_user()
+  report_row = app_tables.reports.get_by_id(report_id)
+  if report_row is None or not _user_can_access_report(current_user, report_row):
+    logger.warning(
+      f"[SECURITY] Version read denied for report ID '{report_id}' to user '{current_user['email']}'."
+    )
+    return None
+  return read_body_version(report_row, version)
+
+
+def _record_tombstone(report_id, vet, prune=True):
+  """
+  Remembers a deletion so that clients syncing from an older high-water mark
+  drop the report. Old tombstones are pruned here unless `prune` is False.
+  """
+  app_tables.report_tombstones.add_row(
+    report_id=report_id, vet=vet, deleted_at=datetime.now()
+  )
+  if prune:
+    _prune_tombstones()
+
+
+def _prune_tombstones():
+  """Deletes the tombstones older than TOMBSTONE_RETENTION."""
+  for tombstone in app_tables.report_tombstones.search(
+    deleted_at=q.less_than(datetime.now() - TOMBSTONE_RETENTION)
+  ):
+    tombstone.delete()
+
+
 @anvil.server.callable
 def delete_report(
   report_id,
@@ -238,12 +557,30 @@ def delete_report(
     return False
 
   # Delete the report
-  report_row.delete()
+  @tables.in_transaction
+  def _apply():
+    _delete_report_row(report_id, report_row, current_user, prune_tombstones=False)
+
+  _apply()
+  _prune_tombstones()
   print(f"[DEBUG] Successfully deleted report with id '{report_id}'")
 
   return True
 
 
+def _delete_report_row(report_id, report_row, vet, prune_tombstones=True):
+  """
+  Deletes a report with its bodies and search entry, keeping counters and sync
+  current. Runs in the caller's transaction.
+  """
+  statut, last_modified = report_row["statut"], report_row["last_modified"]
+  unindex_report(report_row)
+  delete_bodies(report_row)
+  report_row.delete()
+  add_report_count(vet, statut, last_modified, -1)
+  _record_tombstone(report_id, vet, prune=prune_tombstones)
+
+
 @anvil.server.callable(require_user=True)
 def update_report(report_id, new_html_content, new_status):
   """
@@ -259,27 +596,31 @@ def update_report(report_id, new_html_content, new_status):
     logger.warning(f"[SECURITY] Edit failed. Report ID '{report_id}' not found.")
     return False
 
-  report_owner = report_row["vet"]
-
-  is_author = report_owner == current_user
-
-  is_supervisor_in_structure = False
-  if current_user["supervisor"] and report_owner["structure"]:
-    if current_user["structure"] == report_owner["structure"]:
-      is_supervisor_in_structure = True
-
-  if not (is_author or is_supervisor_in_structure):
+  if not _user_can_access_report(current_user, report_row):
     logger.error(
       f"[SECURITY] User '{current_user['email']}' attempted to edit report ID '{report_id}' without permission."
     )
     return False
 
-  try:
-    report_row.update(
-      report_rich=new_html_content,
+  @tables.in_transaction
+  def _save():
+    # Re-read in the transaction: a concurrent save retries on the new head.
+    row = app_tables.reports.get_by_id(report_id)
+    old_statut, old_last_modified = row["statut"], row["last_modified"]
+    write_body(row, new_html_content, author=current_user)
+    row.update(
       statut=new_status,
       last_modified=datetime.now().date(),
+      updated_at=datetime.now(),
     )
+    move_report_count(
+      row["vet"], old_statut, old_last_modified, row["statut"], row["last_modified"]
+    )
+    return row
+
+  try:
+    report_row = _save()
+    index_report(report_row, new_html_content)
     print(f"[SUCCESS] Report ID '{report_id}' was updated successfully.")
     return True
   except Exception as e:
@@ -287,3 +628,118 @@ def update_report(report_id, new_html_content, new_status):
       f"[ERROR] An unexpected error occurred while updating report ID '{report_id}': {e}"
     )
     return False
+
+
+# --- Bulk actions ---
+def authorize_reports(current_user, report_ids, owner_only=False):
+  """
+  Loads the reports of `report_ids` and authorizes them in one pass: the
+  vets the user may act for are read once, instead of reading each report
+  owner's structure.
+
+  Returns:
+      tuple: (rows, outcomes), where rows maps the authorized ids to their
+      report rows and outcomes maps the refused ids to "not_found" or
+      "forbidden".
+  """
+  allowed_vet_ids = {current_user.get_id()}
+  if not owner_only and current_user["supervisor"] and current_user["structure"]:
+    allowed_vet_ids.update(
+      vet.get_id()
+      for vet in app_tables.users.search(
+        q.fetch_only(), structure=current_user["structure"]
+      )
+    )
+
+  rows = {}
+  outcomes = {}
+  for report_id in dict.fromkeys(report_ids):
+    try:
+      report_row = app_tables.reports.get_by_id(report_id, BULK_FETCH)
+    except Exception:
+      report_row = None
+    if report_row is None:
+      outcomes[report_id] = "not_found"
+    elif report_row["vet"] is None or report_row["vet"].get_id() not in allowed_vet_ids:
+      outcomes[report_id] = "forbidden"
+    else:
+      rows[report_id] = report_row
+  return rows, outcomes
+
+
+def _check_bulk_size(report_ids):
+  if not report_ids:
+    raise ValueError("No reports were given.")
+  if len(report_ids) > BULK_MAX_REPORTS:
+    raise ValueError(f"A bulk action cannot cover more than {BULK_MAX_REPORTS} reports.")
+
+
+@anvil.server.callable(require_user=True)
+def bulk_update_report_status(report_ids, new_status):
+  """
+  Sets the status of several reports in one transaction. Authors may change
+  their own reports, supervisors those of their structure.
+
+  Returns:
+      dict: {"results": {report_id: outcome}, "updated": n} where outcome is
+      "updated", "unchanged", "not_found" or "forbidden".
+  """
+  if new_status not in REPORT_STATUSES:
+    raise ValueError(f"Unknown status '{new_status}'.")
+  _check_bulk_size(report_ids)
+  current_user = anvil.users.get_user()
+
+  @tables.in_transaction
+  def _apply():
+    rows, outcomes = authorize_reports(current_user, report_ids)
+    now = datetime.now()
+    for report_id, report_row in rows.items():
+      old_statut = report_row["statut"]
+      if old_statut == new_status:
+        outcomes[report_id] = "unchanged"
+        continue
+      report_row.update(statut=new_status, updated_at=now)
+      move_report_count(
+        report_row["vet"],
+        old_statut,
+        report_row["last_modified"],
+        new_status,
+        report_row["last_modified"],
+      )
+      outcomes[report_id] = "updated"
+    return outcomes
+
+  outcomes = _apply()
+  updated = sum(1 for outcome in outcomes.values() if outcome == "updated")
+  logger.info(
+    f"User '{current_user['email']}' set {updated}/{len(outcomes)} report(s) to '{new_status}'."
+  )
+  return {"results": outcomes, "updated": updated}
+
+
+@anvil.server.callable(require_user=True)
+def bulk_delete_reports(report_ids):
+  """
+  Deletes several of the user's own reports in one transaction, like
+  delete_report does for one.
+
+  Returns:
+      dict: {"results": {report_id: outcome}, "deleted": n} where outcome is
+      "deleted", "not_found" or "forbidden".
+  """
+  _check_bulk_size(report_ids)
+  current_user = anvil.users.get_user()
+
+  @tables.in_transaction
+  def _apply():
+    rows, outcomes = authorize_reports(current_user, report_ids, owner_only=True)
+    for report_id, report_row in rows.items():
+      _delete_report_row(report_id, report_row, current_user, prune_tombstones=False)
+      outcomes[report_id] = "deleted"
+    return outcomes
+
+  outcomes = _apply()
+  _prune_tombstones()
+  deleted = sum(1 for outcome in outcomes.values() if outcome == "deleted")
+  logger.info(f"User '{current_user['email']}' deleted {deleted}/{len(outcomes)} report(s).")
+  return {"results": outcomes, "deleted": deleted}
@@ -112,7 +112,13 @@ def admin_get_custom_template(template_id):
 @admin_required
 @anvil.server.callable
 def admin_write_template(
-  template_id=None, name=None, html=None, display=None, language=None, owner_id=None
+  template_id=None,
+  name=None,
+  html=None,
+  display=None,
+  language=None,
+  owner_id=None,
+  fused_pipeline=None,
 ):
   """Admin function to create or update any template."""
   logger.info(f"Admin request to write template. ID: {template_id}, Name: {name}")
@@ -148,6 +154,8 @@ def admin_write_template(
       template_row["display"] = display
     if language is not None:
       template_row["language"] = language
+    if fused_pipeline is not None:
+      template_row["fused_pipeline"] = fused_pipeline
 
     logger.info(f"Successfully wrote template '{name}'.")
     return True
@@ -182,6 +190,7 @@ def read_templates():
       "html": t["html"],
       "display": t["display"],
       "language": t["language"],
+      "fused_pipeline": t["fused_pipeline"],
     }
     for t in templates
   ]
@@ -192,7 +201,14 @@ def read_templates():
 
 
 @anvil.server.callable
-def write_template(template_id=None, name=None, html=None, display=None, language=None):
+def write_template(
+  template_id=None,
+  name=None,
+  html=None,
+  display=None,
+  language=None,
+  fused_pipeline=None,
+):
   """Writes a template for the current user."""
   current_user = anvil.users.get_user()
   logger.info(
@@ -216,6 +232,8 @@ def write_template(template_id=None, name=None, html=None, display=None, languag
     template_row["display"] = display
   if language is not None:
     template_row["language"] = language
+  if fused_pipeline is not None:
+    template_row["fused_pipeline"] = fused_pipeline
   logger.info(
     f"Successfully wrote template '{name}' for user '{current_user['email']}'."
   )
@@ -91,6 +91,12 @@ def join_structure_as_vet(join_code):
       for asset in personal_assets:
         asset["is_archived"] = True
 
+      # Imported here: assets_service pulls in Pillow, which the rest of
+      # this module does not need.
+      from ..services.assets_service import invalidate_active_assets
+
+      invalidate_active_assets(owner_structure=personal_structure)
+
       # 2. Archive the personal structure itself.
       personal_structure["is_archived"] = True
       logger.info(
@@ -0,0 +1,125 @@
+import anvil.server
+import anvil.users
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .tasks import generate_report_html
+from .transcription_cache import transcribe_audio_cached
+from .metrics import PipelineRun
+from .progress import publish_owner, publish_progress
+from ...data.reports import create_report_row
+from ...logging_server import get_logger
+
+logger = get_logger(__name__)
+
+# Recordings processed at the same time by one batch job. Every recording
+# makes several OpenAI calls, which all go through the shared gateway.
+MAX_PARALLEL_ITEMS = 3
+MAX_BATCH_ITEMS = 30
+# Drafts are saved with this status so the vet reviews them before sending.
+DRAFT_STATUS = "pending_correction"
+
+
+@anvil.server.callable(require_user=True)
+def process_audio_batch(items, language, template_html, template_id=None):
+  """
+  Launches a background job that turns queued offline recordings into draft
+  reports.
+
+  Args:
+      items (list): One dict per recording with "item_id" (the client queue
+          id), "title", "audio_blob" and "mime_type".
+      language (str): The language of the recordings and of the template.
+      template_html (str): The template every draft is formatted with.
+      template_id (str | None): The template's id, for the fused pipeline.
+
+  Returns:
+      Task: The batch job. Its state holds "items", a mapping of item_id to
+      {"status", "error"}, where status is queued, processing, done or failed.
+  """
+  if not items:
+    raise ValueError("The batch is empty.")
+  if len(items) > MAX_BATCH_ITEMS:
+    raise ValueError(f"A batch cannot hold more than {MAX_BATCH_ITEMS} recordings.")
+
+  logger.info(f"Launching batch report creation for {len(items)} recording(s)...")
+  return anvil.server.launch_background_task(
+    "bg_process_audio_batch",
+    anvil.users.get_user(),
+    items,
+    language,
+    template_html,
+    template_id,
+  )
+
+
+def _process_item(item, language, template_html, template_id, user):
+  """Runs the generation pipeline for one recording and returns its result."""
+  run = PipelineRun("batch_generation", language=language, template_id=template_id)
+  try:
+    with run.stage("transcription"):
+      raw_transcription = transcribe_audio_cached(
+        item["audio_blob"], language, item.get("mime_type")
+      )
+    final_html = generate_report_html(
+      run,
+      raw_transcription,
+      template_html,
+      language,
+      template_id=template_id,
+      owner=user,
+    )
+    return raw_transcription, final_html
+  finally:
+    run.save()
+
+
+@anvil.server.background_task
+def bg_process_audio_batch(user, items, language, template_html, template_id=None):
+  """
+  Background job behind process_audio_batch. Recordings are processed at most
+  MAX_PARALLEL_ITEMS at a time; each finished one is saved as a draft through
+  create_report_row, the same path as write_report_first_time. A failed item
+  does not stop the others. Only `user` can follow the job.
+  """
+  publish_owner(user)
+  statuses = {item["item_id"]: {"status": "queued", "error": None} for item in items}
+
+  def _set_status(item_id, status, error=None):
+    statuses[item_id] = {"status": status, "error": error}
+    publish_progress(items=dict(statuses))
+
+  publish_progress(items=dict(statuses))
+  with ThreadPoolExecutor(max_workers=MAX_PARALLEL_ITEMS) as pool:
+    futures = {}
+    for item in items:
+      future = pool.submit(
+        _process_item, item, language, template_html, template_id, user
+      )
+      futures[future] = item
+    for item in items[:MAX_PARALLEL_ITEMS]:
+      _set_status(item["item_id"], "processing")
+
+    started = MAX_PARALLEL_ITEMS
+    # Task state is only written from this thread, never from the workers.
+    for future in as_completed(futures):
+      item = futures[future]
+      try:
+        raw_transcription, final_html = future.result()
+        create_report_row(
+          user,
+          animal_name=item.get("title"),
+          report_rich=final_html,
+          statut=DRAFT_STATUS,
+          transcript=raw_transcription,
+          language=language,
+        )
+        _set_status(item["item_id"], "done")
+      except Exception as e:
+        logger.error(f"Batch item '{item['item_id']}' failed: {e}", exc_info=True)
+        _set_status(item["item_id"], "failed", str(e))
+      if started < len(items):
+        _set_status(items[started]["item_id"], "processing")
+        started += 1
+
+  done = sum(1 for s in statuses.values() if s["status"] == "done")
+  logger.info(f"Batch complete: {done}/{len(items)} draft(s) saved.")
+  return {"success": True, "items": statuses, "saved": done}
@@ -4,13 +4,10 @@ import anvil.tables as tables
 import anvil.tables.query as q
 from anvil.tables import app_tables
 import anvil.server
-from . import (
-  client,
-  RETRY_LIMIT,
-  DEFAULT_MODEL,
-  DEFAULT_TEMPERATURE,
-  DEFAULT_MAX_TOKENS,
-)
+import html
+import json
+import re
+from .gateway import gateway
 from ..prompts_service import get_prompt
 from ...logging_server import get_logger
 
@@ -51,12 +48,7 @@ def edit_report(transcription, report, language):
     ]
 
     logger.debug("Making API call to edit report...")
-    response = client.chat.completions.create(
-      model=DEFAULT_MODEL,
-      messages=messages,
-      temperature=DEFAULT_TEMPERATURE,
-      max_tokens=DEFAULT_MAX_TOKENS,
-    )
+    response = gateway.chat_completion(messages)
 
     result = response.choices[0].message.content
     logger.info("Report edited successfully.")
@@ -66,3 +58,134 @@ def edit_report(transcription, report, language):
   except Exception as e:
     logger.error(f"GPT-4 API error during editing: {str(e)}", exc_info=True)
     raise Exception(f"Error editing report: {str(e)}")
+
+
+# --- DELTA EDITION ---
+
+PATCH_PROMPT_TASK = "edition_patch"
+HEADING_PATTERN = re.compile(r"<h([1-3])\b[^>]*>(.*?)</h\1\s*>", re.IGNORECASE | re.DOTALL)
+TAG_PATTERN = re.compile(r"<[^>]+>")
+
+
+def split_sections(report_html):
+  """
+  Splits report HTML into sections delimited by <h1>-<h3> headings.
+
+  Returns a list of dicts with the heading text and the character offsets of
+  the section body (`body_start`, `end`) in `report_html`. Section 0 holds any
+  content before the first heading and has an empty heading.
+  """
+  sections = []
+  previous_body_start = 0
+  previous_heading = ""
+  for match in HEADING_PATTERN.finditer(report_html):
+    sections.append({
+      "heading": previous_heading,
+      "body_start": previous_body_start,
+      "end": match.start(),
+    })
+    previous_heading = html.unescape(TAG_PATTERN.sub("", match.group(2))).strip()
+    previous_body_start = match.end()
+  sections.append({
+    "heading": previous_heading,
+    "body_start": previous_body_start,
+    "end": len(report_html),
+  })
+  return sections
+
+
+def _build_patch_user_prompt(report_html, sections, transcription):
+  parts = []
+  for index, section in enumerate(sections):
+    body = report_html[section["body_start"]:section["end"]]
+    parts.append(f"[{index}] {section['heading'] or '(preamble)'}\n{body}")
+  return "Sections:\n" + "\n\n".join(parts) + f"\n\nTranscription: {transcription}"
+
+
+def apply_patch_operations(report_html, sections, operations):
+  """
+  Turns the model's patch operations into non-overlapping splices of
+  `report_html`.
+
+  Supported operations, targeting a section by its index:
+    {"op": "replace", "section": i, "html": "..."}  replaces the section body
+    {"op": "append", "section": i, "html": "..."}   adds to the end of the body
+
+  Returns:
+      list: Fragments `{"start", "end", "html"}` sorted by offset, where
+      `report_html[start:end]` is to be replaced by `html`.
+
+  Raises:
+      ValueError: If an operation is malformed or two operations overlap.
+  """
+  fragments = []
+  for operation in operations:
+    index = operation.get("section")
+    if not isinstance(index, int) or not 0 <= index < len(sections):
+      raise ValueError(f"Unknown section in patch operation: {operation}")
+    section = sections[index]
+    new_html = operation.get("html") or ""
+    if operation.get("op") == "replace":
+      fragments.append({
+        "start": section["body_start"],
+        "end": section["end"],
+        "html": new_html,
+      })
+    elif operation.get("op") == "append":
+      fragments.append({
+        "start": section["end"],
+        "end": section["end"],
+        "html": new_html,
+      })
+    else:
+      raise ValueError(f"Unsupported patch operation: {operation}")
+
+  fragments.sort(key=lambda f: (f["start"], f["end"]))
+  for previous, current in zip(fragments, fragments[1:]):
+    if current["start"] < previous["end"]:
+      raise ValueError("Patch operations overlap.")
+  return fragments
+
+
+def edit_report_delta(transcription, report, language):
+  """
+  Edits a report by asking the model for a section-targeted patch instead of
+  the whole rewritten report, so output size follows the size of the change.
+
+  Falls back to a full edit_report when no patch prompt is configured or the
+  model's patch cannot be applied.
+
+  Returns:
+      list: Fragments `{"start", "end", "html"}` against `report`, to be
+      applied by TextEditor.apply_fragments on the client.
+  """
+  logger.info("Starting delta report editing process.")
+  patch_prompt = get_prompt(PATCH_PROMPT_TASK, language)
+  if not patch_prompt:
+    logger.warning(
+      f"No '{PATCH_PROMPT_TASK}' prompt for language '{language}'. Using a full edit."
+    )
+    edited_html = edit_report(transcription, report, language)
+    return [{"start": 0, "end": len(report), "html": edited_html}]
+
+  sections = split_sections(report)
+  user_prompt = _build_patch_user_prompt(report, sections, transcription)
+  messages = [
+    {"role": "system", "content": patch_prompt},
+    {"role": "user", "content": user_prompt},
+  ]
+
+  try:
+    response = gateway.chat_completion(
+      messages, response_format={"type": "json_object"}
+    )
+    patch = json.loads(response.choices[0].message.content)
+    fragments = apply_patch_operations(report, sections, patch.get("operations", []))
+    logger.info(f"Report patched successfully with {len(fragments)} fragment(s).")
+    return fragments
+
+  except (ValueError, AttributeError) as e:
+    # json.JSONDecodeError is a ValueError.
+    logger.warning(f"Invalid edit patch from the model ({e}). Using a full edit.")
+    edited_html = edit_report(transcription, report, language)
+    return [{"start": 0, "end": len(report), "html": edited_html}]
@@ -0,0 +1,116 @@
+import httpx
+import threading
+import time
+from openai import RateLimitError
+from types import SimpleNamespace
+
+
+class FakeOpenAIClient:
+  """
+  Stands in for the OpenAI client in the admin benchmarks, without any network
+  call. Chat completions produce their first token after `first_token_seconds`
+  and then `tokens_per_second`, streamed or not; transcriptions take
+  `transcription_seconds`. With `max_concurrent_requests`, requests above
+  that many in flight are rejected with a 429 carrying `retry_after_seconds`,
+  like the API under load. Only the parts of the client used by OpenAIGateway
+  are implemented.
+  """
+
+  def __init__(
+    self,
+    completion_tokens=500,
+    first_token_seconds=0.5,
+    tokens_per_second=50.0,
+    transcription_seconds=2.0,
+    max_concurrent_requests=None,
+    retry_after_seconds=1.0,
+  ):
+    self.completion_tokens = completion_tokens
+    self.first_token_seconds = first_token_seconds
+    self.tokens_per_second = tokens_per_second
+    self.transcription_seconds = transcription_seconds
+    self.max_concurrent_requests = max_concurrent_requests
+    self.retry_after_seconds = retry_after_seconds
+    self.stats = {"requests": 0, "rejected": 0, "max_in_flight": 0, "tokens": 0}
+    self._in_flight = 0
+    self._lock = threading.Lock()
+    self.chat = SimpleNamespace(
+      completions=SimpleNamespace(create=self._create_chat_completion)
+    )
+    self.audio = SimpleNamespace(
+      transcriptions=SimpleNamespace(create=self._create_transcription)
+    )
+
+  def _enter(self):
+    """Admits a request, or raises the 429 the API would send when overloaded."""
+    with self._lock:
+      self.stats["requests"] += 1
+      if (
+        self.max_concurrent_requests is not None
+        and self._in_flight >= self.max_concurrent_requests
+      ):
+        self.stats["rejected"] += 1
+        response = httpx.Response(
+          429,
+          headers={"retry-after": str(self.retry_after_seconds)},
+          request=httpx.Request("POST", "https://fake-openai.local/v1"),
+        )
+        raise RateLimitError("Fake rate limit reached.", response=response, body=None)
+      self._in_flight += 1
+      self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self._in_flight)
+
+  def _leave(self):
+    with self._lock:
+      self._in_flight -= 1
+
+  def _usage(self, messages):
+    prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 4 + 1
+    with self._lock:
+      self.stats["tokens"] += prompt_tokens + self.completion_tokens
+    return SimpleNamespace(
+      prompt_tokens=prompt_tokens,
+      completion_tokens=self.completion_tokens,
+      total_tokens=prompt_tokens + self.completion_tokens,
+    )
+
+  def _tokens(self):
+    return (f"word{index} " for index in range(self.completion_tokens))
+
+  def _create_chat_completion(
+    self, messages, stream=False, stream_options=None, **kwargs
+  ):
+    self._enter()
+    if stream:
+      include_usage = bool((stream_options or {}).get("include_usage"))
+      return self._stream(messages, include_usage)
+    try:
+      time.sleep(self.first_token_seconds)
+      time.sleep(self.completion_tokens / self.tokens_per_second)
+    finally:
+      self._leave()
+    message = SimpleNamespace(content="".join(self._tokens()))
+    return SimpleNamespace(
+      choices=[SimpleNamespace(message=message)], usage=self._usage(messages)
+    )
+
+  def _stream(self, messages, include_usage):
+    # The request stays in flight until the stream is read to the end.
+    try:
+      time.sleep(self.first_token_seconds)
+      for token in self._tokens():
+        yield SimpleNamespace(
+          choices=[SimpleNamespace(delta=SimpleNamespace(content=token))], usage=None
+        )
+        time.sleep(1 / self.tokens_per_second)
+      if include_usage:
+        yield SimpleNamespace(choices=[], usage=self._usage(messages))
+    finally:
+      self._leave()
+
+  def _create_transcription(self, model, file, language):
+    self._enter()
+    try:
+      time.sleep(self.transcription_seconds)
+    finally:
+      self._leave()
+    return SimpleNamespace(text=f"Fake transcript of {len(file.read())} bytes.")
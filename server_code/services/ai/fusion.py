@@ -0,0 +1,162 @@
+import anvil.server
+from anvil.tables import app_tables
+import anvil.tables as tables
+import time
+from .gateway import gateway
+from .formatting import build_formatting_messages
+from .streaming import stream_chat_completion
+from ..prompts_service import get_prompt
+from ...auth import admin_required
+from ...logging_server import get_logger
+
+logger = get_logger(__name__)
+
+# Task name of the combined generation + formatting prompt in the prompts table.
+FUSED_PROMPT_TASK = "generation_formatting"
+
+
+def is_fused_prompt_available(language):
+  """True when a combined prompt exists for the language (or its fallback)."""
+  return bool(get_prompt(FUSED_PROMPT_TASK, language))
+
+
+def build_fused_messages(transcription, template, language):
+  """Builds the chat messages for the single-call generate+format stage."""
+  fused_prompt = get_prompt(FUSED_PROMPT_TASK, language)
+  if not fused_prompt:
+    logger.error(
+      f"Could not find the '{FUSED_PROMPT_TASK}' prompt for language '{language}'."
+    )
+    raise Exception(
+      f"Could not find the '{FUSED_PROMPT_TASK}' prompt in the database."
+    )
+
+  user_prompt = f"Transcription: {transcription}\n Template: {template}"
+  return [
+    {"role": "system", "content": fused_prompt},
+    {"role": "user", "content": user_prompt},
+  ]
+
+
+def generate_formatted_report(transcription, template, language, on_progress=None):
+  """
+  Produces the template-conformant HTML report directly from the raw
+  transcription, in one model call instead of generate_report + format_report.
+  When `on_progress` is given, the completion is streamed and the callback
+  receives the HTML generated so far.
+  """
+  logger.info("Starting fused report generation and formatting.")
+  logger.debug(f"Language for fused generation: {language}")
+
+  messages = build_fused_messages(transcription, template, language)
+
+  try:
+    if on_progress:
+      result = stream_chat_completion(messages, on_progress)
+    else:
+      response = gateway.chat_completion(messages)
+      result = response.choices[0].message.content
+    logger.info("Fused report generation successful.")
+    logger.debug(f"Fused report (first 100 chars): {result[:100]}")
+    return result
+
+  except Exception as e:
+    logger.error(f"GPT-4 API error during fused generation: {str(e)}", exc_info=True)
+    raise Exception(f"Error generating report: {e}")
+
+
+# --- PIPELINE ACCOUNTING ---
+
+
+def _timed_completion(messages):
+  """Runs one non-streamed completion and returns its text, usage and latency."""
+  start = time.monotonic()
+  response = gateway.chat_completion(messages)
+  usage = response.usage
+  return response.choices[0].message.content, {
+    "prompt_tokens": usage.prompt_tokens if usage else 0,
+    "completion_tokens": usage.completion_tokens if usage else 0,
+    "seconds": round(time.monotonic() - start, 3),
+  }
+
+
+def _sum_metrics(*metrics):
+  return {
+    key: round(sum(m[key] for m in metrics), 3)
+    for key in ("prompt_tokens", "completion_tokens", "seconds")
+  }
+
+
+@anvil.server.callable
+@admin_required
+def admin_compare_pipeline_modes(template_id, sample_size=5):
+  """
+  Admin function that replays recorded transcripts through both the two-stage
+  (generation then formatting) and the fused pipelines for one template, and
+  reports the tokens and latency paid by each path.
+
+  The fixtures are the most recent reports in the template's language that
+  have a stored transcript. Runs as a background task; the task's return value
+  holds the per-fixture and summed metrics.
+  """
+  logger.info("Launching pipeline comparison background task...")
+  return anvil.server.launch_background_task(
+    "bg_compare_pipeline_modes", template_id, sample_size
+  )
+
+
+@anvil.server.background_task
+def bg_compare_pipeline_modes(template_id, sample_size):
+  """Background task behind admin_compare_pipeline_modes."""
+  template_row = app_tables.custom_templates.get_by_id(template_id)
+  if not template_row:
+    raise ValueError(f"Template with ID '{template_id}' not found.")
+  language = template_row["language"] or "en"
+  template_html = template_row["html"] or ""
+
+  logger.info(
+    f"Admin request to compare pipeline modes on template '{template_row['name']}' "
+    f"with up to {sample_size} fixture(s)."
+  )
+  generation_prompt = get_prompt("generation", language)
+  if not generation_prompt:
+    raise Exception("Could not find the 'generation' prompt in the database.")
+
+  fixtures = []
+  for report in app_tables.reports.search(
+    tables.order_by("last_modified", ascending=False), language=language
+  ):
+    if report["transcript"]:
+      fixtures.append(report)
+    if len(fixtures) >= sample_size:
+      break
+
+  results = []
+  for index, report in enumerate(fixtures):
+    anvil.server.task_state["progress"] = f"{index}/{len(fixtures)}"
+    transcript = report["transcript"]
+    generated, generation_metrics = _timed_completion([
+      {"role": "system", "content": generation_prompt},
+      {"role": "user", "content": transcript},
+    ])
+    _, formatting_metrics = _timed_completion(
+      build_formatting_messages(generated, template_html, language)
+    )
+    _, fused_metrics = _timed_completion(
+      build_fused_messages(transcript, template_html, language)
+    )
+    results.append({
+      "report_id": report.get_id(),
+      "transcript_chars": len(transcript),
+      "two_stage": _sum_metrics(generation_metrics, formatting_metrics),
+      "fused": fused_metrics,
+    })
+
+  summary = None
+  if results:
+    summary = {
+      "two_stage": _sum_metrics(*[r["two_stage"] for r in results]),
+      "fused": _sum_metrics(*[r["fused"] for r in results]),
+    }
+  logger.info(f"Pipeline comparison complete over {len(results)} fixture(s).")
+  return {"fixtures": results, "summary": summary}
@@ -0,0 +1,386 @@
+import anvil.server
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from openai import (
+  APIConnectionError,
+  APITimeoutError,
+  InternalServerError,
+  RateLimitError,
+)
+from . import (
+  client,
+  RETRY_LIMIT,
+  DEFAULT_MODEL,
+  DEFAULT_TEMPERATURE,
+  DEFAULT_MAX_TOKENS,
+)
+from .fake_client import FakeOpenAIClient
+from .metrics import record_usage
+from ...auth import admin_required
+from ...logging_server import get_logger
+
+logger = get_logger(__name__)
+
+# --- Gateway limits (per server process) ---
+CHAT_REQUESTS_PER_MINUTE = 500
+CHAT_TOKENS_PER_MINUTE = 300000
+AUDIO_REQUESTS_PER_MINUTE = 50
+MAX_CONCURRENT_REQUESTS = 8
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_COOLDOWN_SECONDS = 30.0
+
+RETRYABLE_ERRORS = (
+  RateLimitError,
+  APIConnectionError,
+  APITimeoutError,
+  InternalServerError,
+)
+
+
+class GatewayUnavailableError(Exception):
+  """Raised without calling the API while the circuit breaker is open."""
+
+
+class TokenBucket:
+  """
+  Classic token bucket refilled continuously at `per_minute / 60` per second.
+  The balance may go negative when actual usage exceeds what was reserved, in
+  which case later callers wait for the debt to be repaid.
+  """
+
+  def __init__(self, per_minute):
+    self.capacity = float(per_minute)
+    self.rate = per_minute / 60.0
+    self._tokens = self.capacity
+    self._updated = time.monotonic()
+    self._lock = threading.Lock()
+    # Net tokens taken so far, reservations and corrections included.
+    self.charged = 0.0
+
+  def _refill(self):
+    now = time.monotonic()
+    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+    self._updated = now
+
+  def acquire(self, amount=1):
+    """Blocks until `amount` tokens are available, then takes them."""
+    amount = min(float(amount), self.capacity)
+    while True:
+      with self._lock:
+        self._refill()
+        if self._tokens >= amount:
+          self._tokens -= amount
+          self.charged += amount
+          return
+        wait = (amount - self._tokens) / self.rate
+      time.sleep(wait)
+
+  def adjust(self, delta):
+    """Charges (positive) or refunds (negative) tokens after the fact."""
+    with self._lock:
+      self._refill()
+      self._tokens = min(self.capacity, self._tokens - delta)
+      self.charged += delta
+
+
+class CircuitBreaker:
+  """
+  Opens after CIRCUIT_FAILURE_THRESHOLD consecutive failures and rejects calls
+  for CIRCUIT_COOLDOWN_SECONDS. After the cooldown, one trial call is let
+  through; its outcome closes or re-opens the circuit.
+  """
+
+  def __init__(self, threshold, cooldown_seconds):
+    self.threshold = threshold
+    self.cooldown_seconds = cooldown_seconds
+    self._failures = 0
+    self._opened_at = None
+    self._trial_in_flight = False
+    self._lock = threading.Lock()
+
+  def before_call(self):
+    with self._lock:
+      if self._opened_at is None:
+        return
+      if time.monotonic() - self._opened_at < self.cooldown_seconds:
+        raise GatewayUnavailableError(
+          "The AI service is temporarily unavailable. Please retry shortly."
+        )
+      if self._trial_in_flight:
+        raise GatewayUnavailableError(
+          "The AI service is recovering. Please retry shortly."
+        )
+      self._trial_in_flight = True
+
+  def record_success(self):
+    with self._lock:
+      self._failures = 0
+      self._opened_at = None
+      self._trial_in_flight = False
+
+  def record_neutral(self):
+    with self._lock:
+      self._trial_in_flight = False
+
+  def record_failure(self):
+    with self._lock:
+      self._failures += 1
+      self._trial_in_flight = False
+      if self._opened_at is not None or self._failures >= self.threshold:
+        if self._opened_at is None:
+          logger.error(
+            f"OpenAI circuit breaker opened after {self._failures} consecutive failures."
+          )
+        self._opened_at = time.monotonic()
+
+
+def _retry_after_seconds(error):
+  """Reads the Retry-After header of an API error, if the server sent one."""
+  response = getattr(error, "response", None)
+  headers = getattr(response, "headers", None) or {}
+  value = headers.get("retry-after")
+  try:
+    return float(value) if value is not None else None
+  except ValueError:
+    return None
+
+
+def _estimate_tokens(messages):
+  """Rough prompt size (about 4 characters per token) used for reservations."""
+  return sum(len(m.get("content") or "") for m in messages) // 4 + 1
+
+
+class OpenAIGateway:
+  """
+  Single entry point for every OpenAI call made by the AI services. It rate
+  limits requests and tokens, caps concurrency, retries transient failures with
+  jittered backoff (honouring Retry-After) and trips a circuit breaker when the
+  API keeps failing.
+  """
+
+  def __init__(
+    self,
+    api_client,
+    chat_requests_per_minute=CHAT_REQUESTS_PER_MINUTE,
+    chat_tokens_per_minute=CHAT_TOKENS_PER_MINUTE,
+    audio_requests_per_minute=AUDIO_REQUESTS_PER_MINUTE,
+    max_concurrent_requests=MAX_CONCURRENT_REQUESTS,
+    retry_limit=RETRY_LIMIT,
+  ):
+    self.client = api_client
+    self.retry_limit = retry_limit
+    self._chat_requests = TokenBucket(chat_requests_per_minute)
+    self._chat_tokens = TokenBucket(chat_tokens_per_minute)
+    self._audio_requests = TokenBucket(audio_requests_per_minute)
+    self._slots = threading.BoundedSemaphore(max_concurrent_requests)
+    self._breaker = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_COOLDOWN_SECONDS)
+
+  def _call_with_retries(self, label, call):
+    for attempt in range(self.retry_limit):
+      self._breaker.before_call()
+      try:
+        with self._slots:
+          result = call()
+        self._breaker.record_success()
+        return result
+      except RETRYABLE_ERRORS as e:
+        if isinstance(e, RateLimitError):
+          # A 429 asks us to slow down; it says nothing about API health.
+          self._breaker.record_neutral()
+        else:
+          self._breaker.record_failure()
+        if attempt >= self.retry_limit - 1:
+          logger.error(f"{label} failed after {self.retry_limit} attempts: {e}")
+          raise
+        # Jitter is added to Retry-After too, so that the callers rejected
+        # together do not all come back at the same instant.
+        backoff = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2**attempt)
+        wait = (_retry_after_seconds(e) or 0) + random.uniform(0, backoff)
+        logger.warning(
+          f"{label} attempt {attempt + 1}/{self.retry_limit} failed: {e}. "
+          f"Retrying in {wait:.1f}s..."
+        )
+        time.sleep(wait)
+      except Exception:
+        # Request errors (bad input, auth...) say nothing about API health.
+        self._breaker.record_neutral()
+        raise
+
+  def chat_completion(self, messages, stream=False, **kwargs):
+    """
+    Same contract as client.chat.completions.create, with the repo defaults
+    for model, temperature and max_tokens. For streamed calls, the concurrency
+    slot and retries cover opening the stream, not reading it; the stream
+    always ends with a usage chunk, which settles the token reservation.
+    """
+    params = {
+      "model": DEFAULT_MODEL,
+      "temperature": DEFAULT_TEMPERATURE,
+      "max_tokens": DEFAULT_MAX_TOKENS,
+    }
+    params.update(kwargs)
+    if stream:
+      params["stream_options"] = {
+        **(params.get("stream_options") or {}),
+        "include_usage": True,
+      }
+    reserved = _estimate_tokens(messages)
+    self._chat_requests.acquire()
+    self._chat_tokens.acquire(reserved)
+
+    try:
+      response = self._call_with_retries(
+        "Chat completion",
+        lambda: self.client.chat.completions.create(
+          messages=messages, stream=stream, **params
+        ),
+      )
+    except Exception:
+      # Nothing was consumed; give the reservation back.
+      self._chat_tokens.adjust(-reserved)
+      raise
+    if stream:
+      return self._settled_stream(response, reserved)
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+      self._chat_tokens.adjust(usage.total_tokens - reserved)
+      record_usage(usage)
+    return response
+
+  def _settled_stream(self, stream, reserved):
+    """
+    Yields the chunks of a streamed completion, then charges its actual token
+    usage against the reservation made for it. A stream abandoned before its
+    usage chunk is charged an estimate of the text it produced.
+    """
+    usage = None
+    completion_chars = 0
+    try:
+      for chunk in stream:
+        if getattr(chunk, "usage", None):
+          usage = chunk.usage
+        if chunk.choices:
+          completion_chars += len(chunk.choices[0].delta.content or "")
+        yield chunk
+    finally:
+      if usage is not None:
+        self._chat_tokens.adjust(usage.total_tokens - reserved)
+        record_usage(usage)
+      else:
+        self._chat_tokens.adjust(completion_chars // 4)
+
+  def transcription(self, file, language, model="whisper-1"):
+    """Same contract as client.audio.transcriptions.create."""
+    self._audio_requests.acquire()
+
+    def _call():
+      # The file object is consumed by each attempt.
+      file.seek(0)
+      return self.client.audio.transcriptions.create(
+        model=model, file=file, language=language
+      )
+
+    return self._call_with_retries("Transcription", _call)
+
+
+gateway = OpenAIGateway(client)
+
+
+# --- SIMULATED LOAD TEST ---
+
+
+def _percentile_ms(durations, percent):
+  ordered = sorted(durations)
+  if not ordered:
+    return None
+  index = min(len(ordered) - 1, int(len(ordered) * percent / 100))
+  return round(ordered[index] * 1000)
+
+
+@anvil.server.callable
+@admin_required
+def admin_load_test_gateway(
+  concurrent_calls=40, api_concurrency=4, streamed=True, completion_tokens=200
+):
+  """
+  Admin function firing `concurrent_calls` chat completions at once at a fake
+  OpenAI client that accepts `api_concurrency` requests in flight and answers
+  the others with a 429, as the API does during a morning clinic rush. The
+  same burst is sent straight to the client and through an OpenAIGateway.
+  Runs as a background task; its return value holds, per path, the calls that
+  succeeded, the errors, the 429s received and the latency percentiles, and
+  for the gateway the tokens its bucket charged against those actually used.
+  """
+  logger.info("Launching gateway load test background task...")
+  return anvil.server.launch_background_task(
+    "bg_load_test_gateway",
+    concurrent_calls,
+    api_concurrency,
+    streamed,
+    completion_tokens,
+  )
+
+
+@anvil.server.background_task
+def bg_load_test_gateway(concurrent_calls, api_concurrency, streamed, completion_tokens):
+  """Background task behind admin_load_test_gateway."""
+  messages = [
+    {"role": "system", "content": "Fake prompt. " * 50},
+    {"role": "user", "content": "Fake transcript. " * 200},
+  ]
+  result = {"concurrent_calls": concurrent_calls, "streamed": streamed}
+
+  for path in ("direct", "gateway"):
+    fake_client = FakeOpenAIClient(
+      completion_tokens=completion_tokens,
+      first_token_seconds=0.5,
+      tokens_per_second=100.0,
+      max_concurrent_requests=api_concurrency,
+    )
+    api_gateway = OpenAIGateway(fake_client) if path == "gateway" else None
+    lock = threading.Lock()
+    durations = []
+    errors = {}
+
+    def _call(_):
+      started = time.monotonic()
+      try:
+        if api_gateway:
+          response = api_gateway.chat_completion(messages, stream=streamed)
+        else:
+          response = fake_client.chat.completions.create(
+            messages=messages,
+            stream=streamed,
+            stream_options={"include_usage": True} if streamed else None,
+          )
+        if streamed:
+          for _chunk in response:
+            pass
+        with lock:
+          durations.append(time.monotonic() - started)
+      except Exception as e:
+        with lock:
+          errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+
+    with ThreadPoolExecutor(max_workers=concurrent_calls) as pool:
+      list(pool.map(_call, range(concurrent_calls)))
+
+    outcome = {
+      "succeeded": len(durations),
+      "errors": errors,
+      "api_requests": fake_client.stats["requests"],
+      "rate_limited": fake_client.stats["rejected"],
+      "p50_ms": _percentile_ms(durations, 50),
+      "p95_ms": _percentile_ms(durations, 95),
+      "tokens_used": fake_client.stats["tokens"],
+    }
+    if api_gateway:
+      outcome["tokens_charged"] = round(api_gateway._chat_tokens.charged)
+    result[path] = outcome
+
+  logger.info(f"Gateway load test complete: {result}")
+  return result
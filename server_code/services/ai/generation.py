@@ -4,14 +4,8 @@ import anvil.tables as tables
 import anvil.tables.query as q
 from anvil.tables import app_tables
 import anvil.server
-import time
-from . import (
-  client,
-  RETRY_LIMIT,
-  DEFAULT_MODEL,
-  DEFAULT_TEMPERATURE,
-  DEFAULT_MAX_TOKENS,
-)
+from .gateway import gateway
+from .streaming import stream_chat_completion
 from ..prompts_service import get_prompt
 from ...logging_server import get_logger
 
@@ -19,47 +13,32 @@ logger = get_logger(__name__)
 
 
 @anvil.server.callable
-def generate_report(transcription, language):
+def generate_report(transcription, language, on_progress=None):
   """
   Generate report using GPT-4.
-  Includes retry mechanism with exponential backoff for API failures.
+  API failures are retried with jittered backoff by the OpenAI gateway.
+  When `on_progress` is given, the completion is streamed and the callback
+  receives the text generated so far.
   """
   logger.info("Starting report generation from transcription.")
   logger.debug(f"Language for generation: {language}")
   logger.debug(f"Incoming transcription (first 100 chars): {transcription[:100]}")
 
   def _gpt4_generate(prompt_text, transcription_text):
-    """Call GPT-4 API with retries and back-off."""
-    for attempt in range(RETRY_LIMIT):
-      try:
-        logger.debug(f"GPT-4 generation attempt {attempt + 1}/{RETRY_LIMIT}.")
-        messages = [
-          {"role": "system", "content": prompt_text},
-          {"role": "user", "content": transcription_text},
-        ]
-
-        response = client.chat.completions.create(
-          model=DEFAULT_MODEL,
-          messages=messages,
-          temperature=DEFAULT_TEMPERATURE,
-          max_tokens=DEFAULT_MAX_TOKENS,
-        )
-        logger.debug("GPT-4 API call successful.")
-        return response.choices[0].message.content
-
-      except Exception as e:
-        wait = 2**attempt
-        logger.warning(
-          f"GPT-4 generation attempt {attempt + 1}/{RETRY_LIMIT} failed: {e}. "
-          f"Retrying in {wait}s..."
-        )
-        if attempt < RETRY_LIMIT - 1:
-          time.sleep(wait)
-
-    logger.error(
-      "GPT-4 report generation failed after multiple attempts.", exc_info=True
-    )
-    raise Exception("GPT-4 report generation failed after multiple attempts")
+    """Call GPT-4 API. Retries and back-off are handled by the gateway."""
+    messages = [
+      {"role": "system", "content": prompt_text},
+      {"role": "user", "content": transcription_text},
+    ]
+
+    if on_progress:
+      result = stream_chat_completion(messages, on_progress)
+      logger.debug("GPT-4 streaming API call successful.")
+      return result
+
+    response = gateway.chat_completion(messages)
+    logger.debug("GPT-4 API call successful.")
+    return response.choices[0].message.content
 
   try:
     generation_prompt = get_prompt("generation", language)
@@ -0,0 +1,128 @@
+import anvil.server
+import anvil.tables.query as q
+from anvil.tables import app_tables
+import math
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from ...auth import admin_required
+from ...logging_server import get_logger
+
+logger = get_logger(__name__)
+
+# The stage currently being timed on this thread, so that the OpenAI gateway
+# can attribute token usage to it without threading a handle through each call.
+_current = threading.local()
+
+
+def record_usage(usage):
+  """Adds a response's token usage to the stage running on this thread, if any."""
+  record = getattr(_current, "record", None)
+  if record is None or usage is None:
+    return
+  record["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+  record["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+
+
+class PipelineRun:
+  """
+  Collects per-stage timings and token usage for one pipeline execution and
+  persists them to the pipeline_metrics table, one row per stage.
+  """
+
+  def __init__(self, pipeline, language=None, template_id=None):
+    self.run_id = uuid.uuid4().hex
+    self.pipeline = pipeline
+    self.language = language
+    self.template_id = template_id
+    self.records = []
+
+  @contextmanager
+  def stage(self, stage):
+    """Times the enclosed block and captures the tokens it consumes."""
+    record = {
+      "stage": stage,
+      "started": datetime.now(),
+      "prompt_tokens": 0,
+      "completion_tokens": 0,
+      "success": False,
+    }
+    _current.record = record
+    start = time.monotonic()
+    try:
+      yield record
+      record["success"] = True
+    finally:
+      record["duration_ms"] = round((time.monotonic() - start) * 1000)
+      _current.record = None
+      self.records.append(record)
+
+  def save(self):
+    """Writes the collected stages. Never raises: metrics must not fail a task."""
+    try:
+      for record in self.records:
+        app_tables.pipeline_metrics.add_row(
+          run_id=self.run_id,
+          pipeline=self.pipeline,
+          language=self.language,
+          template_id=self.template_id,
+          **record,
+        )
+    except Exception as e:
+      logger.warning(f"Could not persist pipeline metrics for run {self.run_id}: {e}")
+
+
+def _percentile(sorted_values, percent):
+  """Nearest-rank percentile of an already sorted list."""
+  if not sorted_values:
+    return None
+  rank = max(1, math.ceil(percent / 100 * len(sorted_values)))
+  return sorted_values[rank - 1]
+
+
+@anvil.server.callable
+@admin_required
+def admin_get_pipeline_latency_stats(hours=24, pipeline=None):
+  """
+  Admin function returning latency percentiles and average token usage per
+  (pipeline, stage, language, template) over the last `hours` hours.
+  """
+  since = datetime.now() - timedelta(hours=hours)
+  filters = {"started": q.greater_than_or_equal_to(since)}
+  if pipeline:
+    filters["pipeline"] = pipeline
+
+  groups = {}
+  for row in app_tables.pipeline_metrics.search(**filters):
+    key = (row["pipeline"], row["stage"], row["language"], row["template_id"])
+    group = groups.setdefault(
+      key, {"durations": [], "prompt_tokens": 0, "completion_tokens": 0, "failures": 0}
+    )
+    group["durations"].append(row["duration_ms"] or 0)
+    group["prompt_tokens"] += row["prompt_tokens"] or 0
+    group["completion_tokens"] += row["completion_tokens"] or 0
+    if not row["success"]:
+      group["failures"] += 1
+
+  result = []
+  for (pipeline_name, stage, language, template_id), group in groups.items():
+    durations = sorted(group["durations"])
+    count = len(durations)
+    result.append({
+      "pipeline": pipeline_name,
+      "stage": stage,
+      "language": language,
+      "template_id": template_id,
+      "count": count,
+      "failures": group["failures"],
+      "p50_ms": _percentile(durations, 50),
+      "p95_ms": _percentile(durations, 95),
+      "p99_ms": _percentile(durations, 99),
+      "avg_prompt_tokens": round(group["prompt_tokens"] / count),
+      "avg_completion_tokens": round(group["completion_tokens"] / count),
+    })
+  result.sort(key=lambda r: (r["pipeline"] or "", r["stage"] or "", -r["count"]))
+  logger.info(f"Returning latency stats for {len(result)} group(s) since {since}.")
+  return result
@@ -0,0 +1,266 @@
+import anvil.server
+import anvil.users
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from ...auth import admin_required
+from ...logging_server import get_logger
+
+logger = get_logger(__name__)
+
+# --- Long-poll settings ---
+# Kept well below the 30s server call timeout.
+LONG_POLL_TIMEOUT_SECONDS = 20
+# How often a waiting call re-reads the task state on the server side.
+SERVER_CHECK_INTERVAL_SECONDS = 0.25
+# Updates that do not change the step (streamed previews) are batched and
+# returned at most this often, so streaming does not turn into a call per chunk.
+PARTIAL_UPDATE_INTERVAL_SECONDS = 2.0
+
+# The previous client loop: one is_completed() and one get_state() per second.
+POLLING_INTERVAL_SECONDS = 1.0
+POLLING_CALLS_PER_CHECK = 2
+
+
+def publish_progress(**fields):
+  """
+  Writes progress fields to the running background task's state and bumps its
+  version, so that waiting clients can tell a new state from one they have
+  already seen. Must be called from inside a background task.
+  """
+  state = anvil.server.task_state
+  for key, value in fields.items():
+    state[key] = value
+  if "step" in fields:
+    state["step_published_at"] = time.time()
+  state["version"] = (state.get("version") or 0) + 1
+
+
+def publish_owner(user):
+  """
+  Records the user a background task runs for. Only that user can follow the
+  task through wait_for_task_progress, so tasks launched for a client publish
+  it before anything else.
+  """
+  publish_progress(owner_id=user.get_id() if user else None)
+
+
+def _task_state(task):
+  try:
+    return task.get_state() or {}
+  except Exception:
+    return {}
+
+
+def _read_task(task):
+  """Returns (completed, state, result, error) for a task, without raising."""
+  try:
+    if task.is_completed():
+      return True, _task_state(task), task.get_return_value(), None
+  except Exception as e:
+    # is_completed() and get_return_value() re-raise the task's own failure.
+    return True, _task_state(task), None, str(e)
+  return False, _task_state(task), None, None
+
+
+def _wait_for_progress(
+  task,
+  last_version=None,
+  last_step=None,
+  timeout=LONG_POLL_TIMEOUT_SECONDS,
+  owner_id=None,
+):
+  """
+  Blocks until the task completes, its step differs from `last_step`, or its
+  state version moved past `last_version` and PARTIAL_UPDATE_INTERVAL_SECONDS
+  have passed. Returns the latest state after at most `timeout` seconds.
+  With `owner_id`, raises PermissionDenied unless the task published that
+  owner through publish_owner.
+  """
+  timeout = max(0, min(timeout, LONG_POLL_TIMEOUT_SECONDS))
+  started = time.monotonic()
+  while True:
+    completed, state, result, error = _read_task(task)
+    elapsed = time.monotonic() - started
+    if owner_id is not None and state.get("owner_id") != owner_id:
+      if "owner_id" in state or completed:
+        raise anvil.server.PermissionDenied("You cannot follow this task.")
+      # The task has not started yet; nothing of its state is shown until it
+      # publishes its owner.
+      if elapsed >= timeout:
+        return {"completed": False, "version": None, "state": {}}
+      time.sleep(SERVER_CHECK_INTERVAL_SECONDS)
+      continue
+    version = state.get("version") or 0
+    changed = version != last_version
+    if (
+      completed
+      or (changed and state.get("step") != last_step)
+      or (changed and elapsed >= PARTIAL_UPDATE_INTERVAL_SECONDS)
+      or elapsed >= timeout
+    ):
+      response = {"completed": completed, "version": version, "state": state}
+      if completed:
+        response["result"] = result
+        response["error"] = error
+      return response
+    time.sleep(SERVER_CHECK_INTERVAL_SECONDS)
+
+
+@anvil.server.callable(require_user=True)
+def wait_for_task_progress(
+  task_id, last_version=None, last_step=None, timeout=LONG_POLL_TIMEOUT_SECONDS
+):
+  """
+  Long-polls a background task launched for the current user by one of the
+  AI pipelines or the batch PDF export.
+
+  Args:
+      task_id (str): The id of the task, as returned by task.get_id().
+      last_version (int | None): The state version the client last received.
+      last_step (str | None): The step the client is currently displaying.
+      timeout (float): Maximum wait in seconds, capped at
+          LONG_POLL_TIMEOUT_SECONDS.
+
+  Returns:
+      dict: {"completed", "version", "state"}, plus "result" and "error" once
+      the task has completed.
+  """
+  user = anvil.users.get_user()
+  task = anvil.server.get_background_task(task_id)
+  return _wait_for_progress(task, last_version, last_step, timeout, user.get_id())
+
+
+# --- SIMULATED LOAD BENCHMARK ---
+
+SIMULATED_STEPS = ["feedback_transcribing", "feedback_generating", "feedback_formatting"]
+
+
+@anvil.server.background_task
+def bg_simulated_pipeline(step_seconds, streamed_steps, chunk_interval):
+  """Publishes progress like the report pipeline does, without calling any API."""
+  for step in SIMULATED_STEPS:
+    publish_progress(step=step)
+    if step not in streamed_steps:
+      time.sleep(step_seconds)
+      continue
+    elapsed = 0.0
+    while elapsed < step_seconds:
+      time.sleep(chunk_interval)
+      elapsed += chunk_interval
+      publish_progress(partial_html=f"<p>{step} {elapsed:.1f}s</p>")
+  return {"success": True}
+
+
+def _watch_with_polling(task):
+  """Replays the former client loop and counts the calls it makes."""
+  calls = 0
+  lags = []
+  last_step = None
+  while True:
+    calls += POLLING_CALLS_PER_CHECK
+    completed, state, _, _ = _read_task(task)
+    if completed:
+      break
+    if state.get("step") != last_step and state.get("step_published_at"):
+      lags.append(time.time() - state["step_published_at"])
+      last_step = state.get("step")
+    time.sleep(POLLING_INTERVAL_SECONDS)
+  return calls, lags
+
+
+def _watch_with_long_poll(task):
+  """Replays the long-polling client loop and counts the calls it makes."""
+  calls = 0
+  lags = []
+  version = None
+  last_step = None
+  while True:
+    calls += 1
+    response = _wait_for_progress(task, version, last_step)
+    if response["completed"]:
+      break
+    state = response["state"]
+    version = response["version"]
+    if state.get("step") != last_step and state.get("step_published_at"):
+      lags.append(time.time() - state["step_published_at"])
+      last_step = state.get("step")
+  return calls, lags
+
+
+def _summarize_watchers(outcomes):
+  calls = [c for c, _ in outcomes]
+  lags = [lag for _, task_lags in outcomes for lag in task_lags]
+  return {
+    "total_calls": sum(calls),
+    "avg_calls_per_task": round(sum(calls) / len(calls), 1) if calls else 0,
+    "avg_step_lag_ms": round(sum(lags) / len(lags) * 1000) if lags else None,
+    "max_step_lag_ms": round(max(lags) * 1000) if lags else None,
+  }
+
+
+@anvil.server.callable
+@admin_required
+def admin_benchmark_task_progress(
+  concurrent_tasks=10, step_seconds=10, streaming=True, chunk_interval=0.5
+):
+  """
+  Admin function comparing the former 1-second polling loop with long-polling
+  under simulated load. Launches `concurrent_tasks` fake pipelines that publish
+  steps (and streamed previews when `streaming` is set) and watches each one
+  with both strategies at once. Runs as a background task; its return value
+  holds the calls made and the step display lag of each strategy.
+  """
+  logger.info("Launching task progress benchmark background task...")
+  return anvil.server.launch_background_task(
+    "bg_benchmark_task_progress",
+    concurrent_tasks,
+    step_seconds,
+    streaming,
+    chunk_interval,
+  )
+
+
+@anvil.server.background_task
+def bg_benchmark_task_progress(concurrent_tasks, step_seconds, streaming, chunk_interval):
+  """Background task behind admin_benchmark_task_progress."""
+  streamed_steps = SIMULATED_STEPS[1:] if streaming else []
+  tasks = [
+    anvil.server.launch_background_task(
+      "bg_simulated_pipeline", step_seconds, streamed_steps, chunk_interval
+    )
+    for _ in range(concurrent_tasks)
+  ]
+  logger.info(
+    f"Benchmarking task progress over {concurrent_tasks} simulated pipeline(s)."
+  )
+
+  lock = threading.Lock()
+  outcomes = {"polling": [], "long_poll": []}
+
+  def _watch(strategy_and_task):
+    strategy, task = strategy_and_task
+    watcher = _watch_with_polling if strategy == "polling" else _watch_with_long_poll
+    outcome = watcher(task)
+    with lock:
+      outcomes[strategy].append(outcome)
+
+  jobs = [(strategy, task) for task in tasks for strategy in outcomes]
+  with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+    list(pool.map(_watch, jobs))
+
+  polling = _summarize_watchers(outcomes["polling"])
+  long_poll = _summarize_watchers(outcomes["long_poll"])
+  reduction = (
+    round(polling["total_calls"] / long_poll["total_calls"], 1)
+    if long_poll["total_calls"]
+    else None
+  )
+  logger.info(f"Task progress benchmark complete: {reduction}x fewer calls.")
+  return {
+    "concurrent_tasks": concurrent_tasks,
+    "streaming": streaming,
+    "polling": polling,
+    "long_poll": long_poll,
+    "call_reduction": reduction,
+  }
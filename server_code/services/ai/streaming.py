@@ -0,0 +1,130 @@
+import anvil.server
+import html
+import time
+from .fake_client import FakeOpenAIClient
+from .gateway import gateway, OpenAIGateway
+from ...auth import admin_required
+from ...logging_server import get_logger
+
+logger = get_logger(__name__)
+
+# Minimum delay between two progress callbacks, so that token streaming does
+# not turn into one task_state write per token.
+PROGRESS_MIN_INTERVAL_SECONDS = 0.5
+
+
+def stream_chat_completion(
+  messages, on_progress, min_interval=PROGRESS_MIN_INTERVAL_SECONDS, api_gateway=None
+):
+  """
+  Runs a chat completion in streaming mode.
+
+  Args:
+      messages (list): The chat messages, as for client.chat.completions.create.
+      on_progress (callable): Called with the text accumulated so far, at most
+          once every `min_interval` seconds and once more at the end.
+      api_gateway: An OpenAIGateway. Defaults to the shared gateway.
+
+  Returns:
+      str: The full completion text.
+  """
+  api_gateway = api_gateway or gateway
+  # The gateway records the token usage carried by the stream's last chunk.
+  stream = api_gateway.chat_completion(messages, stream=True)
+
+  parts = []
+  last_progress = 0.0
+  for chunk in stream:
+    if not chunk.choices:
+      continue
+    delta = chunk.choices[0].delta.content
+    if not delta:
+      continue
+    parts.append(delta)
+    now = time.monotonic()
+    if now - last_progress >= min_interval:
+      on_progress("".join(parts))
+      last_progress = now
+
+  result = "".join(parts)
+  on_progress(result)
+  return result
+
+
+def text_to_preview_html(text):
+  """Renders plain model output as minimal HTML for an in-progress preview."""
+  paragraphs = [p for p in (text or "").split("\n") if p.strip()]
+  return "".join(f"<p>{html.escape(p)}</p>" for p in paragraphs)
+
+
+# --- TIME-TO-FIRST-CONTENT BENCHMARK ---
+
+
+@anvil.server.callable
+@admin_required
+def admin_benchmark_streaming_pipeline(
+  runs=3, first_token_seconds=1.0, tokens_per_second=40.0, completion_tokens=400
+):
+  """
+  Admin function replaying the generation and formatting stages against a fake
+  OpenAI client, once with blocking completions and once streamed, and
+  reporting when the client could first show content and when the report was
+  complete. Transcription is left out: both modes wait for the full transcript.
+  Runs as a background task.
+  """
+  logger.info("Launching streaming pipeline benchmark background task...")
+  return anvil.server.launch_background_task(
+    "bg_benchmark_streaming_pipeline",
+    runs,
+    first_token_seconds,
+    tokens_per_second,
+    completion_tokens,
+  )
+
+
+def _replay_stages(api_gateway, streaming):
+  """Runs two chained completions; returns (first content s, complete s)."""
+  started = time.monotonic()
+  first_content = []
+
+  def on_progress(text):
+    if text and not first_content:
+      first_content.append(time.monotonic() - started)
+
+  text = "Fake transcript."
+  for stage in ("generation", "formatting"):
+    messages = [
+      {"role": "system", "content": f"Fake {stage} prompt."},
+      {"role": "user", "content": text},
+    ]
+    if streaming:
+      text = stream_chat_completion(
+        messages, on_progress, min_interval=0, api_gateway=api_gateway
+      )
+    else:
+      text = api_gateway.chat_completion(messages).choices[0].message.content
+  complete = time.monotonic() - started
+  return (first_content[0] if first_content else complete), complete
+
+
+@anvil.server.background_task
+def bg_benchmark_streaming_pipeline(
+  runs, first_token_seconds, tokens_per_second, completion_tokens
+):
+  """Background task behind admin_benchmark_streaming_pipeline."""
+  api_gateway = OpenAIGateway(
+    FakeOpenAIClient(
+      completion_tokens=completion_tokens,
+      first_token_seconds=first_token_seconds,
+      tokens_per_second=tokens_per_second,
+    )
+  )
+  result = {"runs": runs}
+  for mode, streaming in (("blocking", False), ("streaming", True)):
+    timings = [_replay_stages(api_gateway, streaming) for _ in range(runs)]
+    result[mode] = {
+      "first_content_s": round(sum(t[0] for t in timings) / runs, 2),
+      "complete_s": round(sum(t[1] for t in timings) / runs, 2),
+    }
+  logger.info(f"Streaming pipeline benchmark complete: {result}")
+  return result
@@ -1,5 +1,11 @@
 import anvil.server
-from . import transcription, generation, formatting, edition
+import anvil.users
+from anvil.tables import app_tables
+from . import generation, formatting, edition, fusion
+from .transcription_cache import transcribe_audio_cached
+from .metrics import PipelineRun
+from .progress import publish_owner, publish_progress
+from .streaming import text_to_preview_html
 from ...logging_server import get_logger
 
 logger = get_logger(__name__)
@@ -7,46 +13,169 @@ logger = get_logger(__name__)
 # --- REPORT GENERATION PIPELINE ---
 
 
+def _publish_partial_html(partial_html):
+  """Exposes in-progress report HTML to the client waiting on the task."""
+  publish_progress(partial_html=partial_html)
+
+
+def _use_fused_pipeline(template_id, language, owner):
+  """
+  Decides whether a template is rendered through the single-call fused stage.
+  The template must belong to `owner` and opt in, and a combined prompt must
+  exist for the language.
+  """
+  if not template_id:
+    return False
+  template_row = app_tables.custom_templates.get_by_id(template_id)
+  if not template_row:
+    return False
+  if template_row["owner"] != owner:
+    logger.warning(
+      f"[SECURITY] Template '{template_id}' does not belong to the task's user. "
+      f"Using the two-stage pipeline."
+    )
+    return False
+  if not template_row["fused_pipeline"]:
+    return False
+  if not fusion.is_fused_prompt_available(language):
+    logger.warning(
+      f"Template '{template_id}' requests the fused pipeline but no fused prompt "
+      f"exists for '{language}'. Falling back to the two-stage pipeline."
+    )
+    return False
+  return True
+
+
 @anvil.server.callable
-def process_audio_for_report(audio_blob, language, mime_type, template_html):
+def process_audio_for_report(
+  audio_blob, language, mime_type, template_html, streaming=False, template_id=None
+):
   """
   Launches the full audio-to-report pipeline as a background task.
   This is the primary entry point for the client for new reports.
   """
   logger.info("Launching report creation background task...")
   task = anvil.server.launch_background_task(
-    "bg_create_report_from_audio", audio_blob, language, mime_type, template_html
+    "bg_create_report_from_audio",
+    audio_blob,
+    language,
+    mime_type,
+    template_html,
+    streaming,
+    template_id,
+    anvil.users.get_user(),
   )
   return task
 
 
+def generate_report_html(
+  run,
+  raw_transcription,
+  template_html,
+  language,
+  template_id=None,
+  streaming=False,
+  on_step=None,
+  owner=None,
+):
+  """
+  Turns a transcription into the final report HTML, through the fused stage
+  when `owner`'s template opts in, or generation then formatting otherwise.
+  Stages are timed on `run`. `on_step` is called with each step's feedback key; in
+  streaming mode the partial HTML is published to the running task's state.
+  """
+  on_generation_progress = None
+  on_formatting_progress = None
+  if streaming:
+
+    def on_generation_progress(text):
+      _publish_partial_html(text_to_preview_html(text))
+
+    on_formatting_progress = _publish_partial_html
+
+  if _use_fused_pipeline(template_id, language, owner):
+    # Steps 2+3: Generate and format the report in a single call
+    if on_step:
+      on_step("feedback_generating")
+    logger.info("GENERATION PIPELINE [2/2]: Generating formatted report (fused)...")
+    with run.stage("fused_generation"):
+      final_html = fusion.generate_formatted_report(
+        raw_transcription,
+        template_html,
+        language,
+        on_progress=on_formatting_progress,
+      )
+    logger.info("GENERATION PIPELINE [2/2] SUCCESS. Pipeline complete.")
+    return final_html
+
+  # Step 2: Generate Report from the transcription
+  if on_step:
+    on_step("feedback_generating")
+  logger.info("GENERATION PIPELINE [2/3]: Generating structured report...")
+  with run.stage("generation"):
+    report_content = generation.generate_report(
+      raw_transcription, language, on_progress=on_generation_progress
+    )
+  logger.info("GENERATION PIPELINE [2/3] SUCCESS.")
+
+  # Step 3: Format the report into the final HTML
+  if on_step:
+    on_step("feedback_formatting")
+  logger.info("GENERATION PIPELINE [3/3]: Formatting final report...")
+  with run.stage("formatting"):
+    final_html = formatting.format_report(
+      report_content, template_html, language, on_progress=on_formatting_progress
+    )
+  logger.info("GENERATION PIPELINE [3/3] SUCCESS. Pipeline complete.")
+  return final_html
+
+
+def _publish_step(step):
+  publish_progress(step=step)
+
+
 @anvil.server.background_task
-def bg_create_report_from_audio(audio_blob, language, mime_type, template_html):
+def bg_create_report_from_audio(
+  audio_blob,
+  language,
+  mime_type,
+  template_html,
+  streaming=False,
+  template_id=None,
+  owner=None,
+):
   """
   Full pipeline background task for generation:
   1. Transcribes audio.
   2. Generates a structured report from the transcription.
   3. Formats the report into the final HTML.
-  This includes progress updates for the client.
+  Templates flagged with `fused_pipeline` replace steps 2 and 3 with a single
+  generate+format call.
+  This includes progress updates for the client. In streaming mode, the
+  generation and formatting completions are streamed and the text produced so
+  far is published in task_state["partial_html"]. Only `owner`, the launching
+  user, can follow the task.
   """
+  publish_owner(owner)
+  run = PipelineRun("generation", language=language, template_id=template_id)
   try:
     # Step 1: Transcribe Audio
-    anvil.server.task_state["step"] = "feedback_transcribing"
+    publish_progress(step="feedback_transcribing")
     logger.info("GENERATION PIPELINE [1/3]: Transcribing audio...")
-    raw_transcription = transcription.transcribe_audio(audio_blob, language, mime_type)
+    with run.stage("transcription"):
+      raw_transcription = transcribe_audio_cached(audio_blob, language, mime_type)
     logger.info("GENERATION PIPELINE [1/3] SUCCESS.")
 
-    # Step 2: Generate Report from the transcription
-    anvil.server.task_state["step"] = "feedback_generating"
-    logger.info("GENERATION PIPELINE [2/3]: Generating structured report...")
-    report_content = generation.generate_report(raw_transcription, language)
-    logger.info("GENERATION PIPELINE [2/3] SUCCESS.")
-
-    # Step 3: Format the report into the final HTML
-    anvil.server.task_state["step"] = "feedback_formatting"
-    logger.info("GENERATION PIPELINE [3/3]: Formatting final report...")
-    final_html = formatting.format_report(report_content, template_html, language)
-    logger.info("GENERATION PIPELINE [3/3] SUCCESS. Pipeline complete.")
+    final_html = generate_report_html(
+      run,
+      raw_transcription,
+      template_html,
+      language,
+      template_id=template_id,
+      streaming=streaming,
+      on_step=_publish_step,
+      owner=owner,
+    )
 
     return {
       "success": True,
@@ -57,47 +186,75 @@ def bg_create_report_from_audio(audio_blob, language, mime_type, template_html):
   except Exception as e:
     logger.error(f"The report generation pipeline failed: {e}", exc_info=True)
     return {"success": False, "error": str(e)}
+  finally:
+    run.save()
 
 
 # --- REPORT EDITION PIPELINE ---
 
 
 @anvil.server.callable
-def process_audio_for_edit(audio_blob, language, mime_type, current_report_content):
+def process_audio_for_edit(
+  audio_blob, language, mime_type, current_report_content, delta=False
+):
   """
   Launches the audio-to-edit pipeline as a background task.
   This is the primary entry point for the client for editing reports.
   """
   logger.info("Launching report edition background task...")
   task = anvil.server.launch_background_task(
-    "bg_edit_report_from_audio", audio_blob, language, mime_type, current_report_content
+    "bg_edit_report_from_audio",
+    audio_blob,
+    language,
+    mime_type,
+    current_report_content,
+    delta,
+    anvil.users.get_user(),
   )
   return task
 
 
 @anvil.server.background_task
-def bg_edit_report_from_audio(audio_blob, language, mime_type, current_report_content):
+def bg_edit_report_from_audio(
+  audio_blob, language, mime_type, current_report_content, delta=False, owner=None
+):
   """
   Full pipeline background task for editing:
   1. Transcribes the audio command.
   2. Applies the command to the report content.
-  This includes progress updates for the client.
+  This includes progress updates for the client. In delta mode, the result
+  holds only the changed `fragments` of `current_report_content` instead of
+  the whole `edited_html`. Only `owner`, the launching user, can follow the
+  task.
   """
+  publish_owner(owner)
+  run = PipelineRun("edition", language=language)
   try:
     # Step 1: Transcribe Audio Command
-    anvil.server.task_state["step"] = "feedback_transcribing"
+    publish_progress(step="feedback_transcribing")
     logger.info("EDITION PIPELINE [1/2]: Transcribing audio command...")
-    transcription_command = transcription.transcribe_audio(
-      audio_blob, language, mime_type
-    )
+    with run.stage("transcription"):
+      transcription_command = transcribe_audio_cached(audio_blob, language, mime_type)
     logger.info("EDITION PIPELINE [1/2] SUCCESS.")
 
     # Step 2: Apply the modification to the report
-    anvil.server.task_state["step"] = "feedback_applyingModification"
+    publish_progress(step="feedback_applyingModification")
     logger.info("EDITION PIPELINE [2/2]: Applying modification to report...")
-    edited_html = edition.edit_report(
-      transcription_command, current_report_content, language
-    )
+    if delta:
+      with run.stage("edition_delta"):
+        fragments = edition.edit_report_delta(
+          transcription_command, current_report_content, language
+        )
+      logger.info("EDITION PIPELINE [2/2] SUCCESS. Pipeline complete.")
+      return {
+        "success": True,
+        "fragments": fragments,
+      }
+
+    with run.stage("edition"):
+      edited_html = edition.edit_report(
+        transcription_command, current_report_content, language
+      )
     logger.info("EDITION PIPELINE [2/2] SUCCESS. Pipeline complete.")
 
     return {
@@ -108,3 +265,5 @@ def bg_edit_report_from_audio(audio_blob, language, mime_type, current_report_co
   except Exception as e:
     logger.error(f"The report edition pipeline failed: {e}", exc_info=True)
     return {"success": False, "error": str(e)}
+  finally:
+    run.save()
@@ -1,80 +1,311 @@
 import anvil.server
-from . import client
+from anvil.tables import app_tables
+from .gateway import gateway, OpenAIGateway
+from ...auth import admin_required
+import difflib
 import io
+import re
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pydub import AudioSegment
+from pydub.silence import detect_silence
 
 
 CONTEXT = "[SERVER:transcription]"
 # Set a safe limit just below OpenAI's 25MB limit to be safe.
 MAX_FILE_SIZE_BYTES = 24 * 1024 * 1024
 
+# --- Chunked transcription settings ---
+# Recordings larger than this are split and transcribed in parallel when the
+# caller does not explicitly choose a mode.
+CHUNKED_MIN_FILE_SIZE_BYTES = 4 * 1024 * 1024
+# Recordings shorter than this are never split, whatever their size.
+CHUNKED_MIN_DURATION_MS = 3 * 60 * 1000
+CHUNK_TARGET_MS = 2 * 60 * 1000
+# Cut points are searched in silences within this window around the target.
+CHUNK_SEARCH_WINDOW_MS = 30 * 1000
+CHUNK_OVERLAP_MS = 2 * 1000
+MIN_SILENCE_LEN_MS = 400
+SILENCE_THRESH_OFFSET_DB = 16
+MAX_TRANSCRIPTION_WORKERS = 4
+# Maximum number of words compared when removing duplicates at chunk overlaps.
+MAX_OVERLAP_WORDS = 20
 
-def transcribe_audio(audio_blob, language, mime_type):
+
+def _log(level, message):
+  print(
+    f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] [{level}] {CONTEXT} {message}"
+  )
+
+
+def _filename_for_mime_type(mime_type):
+  """Builds the file name Whisper uses to detect the container format."""
+  extension = "mp4"
+  if mime_type and "/" in mime_type:
+    # First, strip any parameters like ';codecs=opus'
+    main_mime_type = mime_type.split(";")[0]
+    extension = main_mime_type.split("/")[-1]
+
+    # Handle non-standard prefixes like 'x-m4a' -> 'm4a'
+    if "x-" in extension:
+      extension = extension.split("x-")[-1]
+    else:
+      extension = "mp4"  # Fallback
+  return f"audio.{extension}"
+
+
+def _whisper_call(audio_bytes, filename, language, api_gateway):
+  """Sends a single in-memory file to Whisper and returns the text."""
+  in_memory_file = io.BytesIO(audio_bytes)
+  in_memory_file.name = filename
+  transcript = api_gateway.transcription(in_memory_file, language)
+  return transcript.text
+
+
+def transcribe_audio(audio_blob, language, mime_type, chunked=None):
   """
-  Transcribes an audio blob by sending it directly to the Whisper API.
-  This is the primary, reliable method for audio transcription.
+  Transcribes an audio blob by sending it to the Whisper API.
+
+  Args:
+      chunked (bool | None): True forces the chunked, parallel mode, False
+          forces a single Whisper call. None picks the chunked mode for large
+          recordings only.
 
   Returns the transcription text on success, or raises an Exception on failure.
   """
-  print(
-    f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] [INFO] {CONTEXT} Starting audio transcription..."
-  )
+  _log("INFO", "Starting audio transcription...")
   try:
     audio_bytes = audio_blob.get_bytes()
+    if chunked is None:
+      chunked = len(audio_bytes) > CHUNKED_MIN_FILE_SIZE_BYTES
+
+    if chunked:
+      return transcribe_audio_chunked(audio_bytes, language)
+
     if len(audio_bytes) > MAX_FILE_SIZE_BYTES:
-      print(
-        f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] [WARNING] {CONTEXT} Audio file exceeds size limit. Compressing..."
-      )
+      _log("WARNING", "Audio file exceeds size limit. Compressing...")
       try:
         audio_segment = AudioSegment.from_file(io.BytesIO(audio_bytes))
         compressed_audio_io = io.BytesIO()
         audio_segment.export(compressed_audio_io, format="mp3", bitrate="64k")
         audio_bytes = compressed_audio_io.getvalue()
         new_size_mb = len(audio_bytes) / (1024 * 1024)
-        print(
-          f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] [INFO] {CONTEXT} Compression successful. New size: {new_size_mb:.2f} MB."
-        )
+        _log("INFO", f"Compression successful. New size: {new_size_mb:.2f} MB.")
       except Exception as e:
-        print(
-          f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] [ERROR] {CONTEXT} Failed to compress audio file: {e}"
-        )
+        _log("ERROR", f"Failed to compress audio file: {e}")
         raise Exception(f"Failed to compress oversized audio file: {e}")
 
-    in_memory_file = io.BytesIO(audio_bytes)
-    if mime_type and "/" in mime_type:
-      # First, strip any parameters like ';codecs=opus'
-      main_mime_type = mime_type.split(";")[0]
-      extension = main_mime_type.split("/")[-1]
-
-      # Handle non-standard prefixes like 'x-m4a' -> 'm4a'
-      if "x-" in extension:
-        extension = extension.split("x-")[-1]
-      else:
-        extension = "mp4"  # Fallback
-    filename = f"audio.{extension}"
-    in_memory_file.name = filename
-
-    print(
-      f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] [INFO] {CONTEXT} Sending {len(audio_bytes)} bytes to Whisper as '{filename}'..."
-    )
-
-    # Step 3: Make the direct API call.
-    transcript = client.audio.transcriptions.create(
-      model="whisper-1", file=in_memory_file, language=language
-    )
+    filename = _filename_for_mime_type(mime_type)
+    _log("INFO", f"Sending {len(audio_bytes)} bytes to Whisper as '{filename}'...")
 
-    result_text = transcript.text
-    print(
-      f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] [INFO] {CONTEXT} Transcription successful. Result length: {len(result_text)} chars."
-    )
+    result_text = _whisper_call(audio_bytes, filename, language, gateway)
+    _log("INFO", f"Transcription successful. Result length: {len(result_text)} chars.")
     return result_text
 
   except Exception as e:
-    print(
-      f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] [ERROR] {CONTEXT} Transcription failed. Error: {str(e)}"
-    )
+    _log("ERROR", f"Transcription failed. Error: {str(e)}")
     print(traceback.format_exc())
     # Re-raise the exception to be caught by the calling background task.
     raise e
+
+
+def transcribe_audio_chunked(
+  audio_bytes, language, api_client=None, max_workers=MAX_TRANSCRIPTION_WORKERS
+):
+  """
+  Splits a long recording on silences into overlapping segments, transcribes
+  them concurrently and stitches the texts back together in order.
+
+  Args:
+      audio_bytes (bytes): The raw audio, in any format FFmpeg can decode.
+      api_client: An OpenAI-compatible client, e.g. a local stub. Defaults to
+          the shared gateway around the real client.
+      max_workers (int): Upper bound on concurrent Whisper requests.
+
+  Returns:
+      str: The full transcription.
+  """
+  api_gateway = OpenAIGateway(api_client) if api_client else gateway
+  audio_segment = AudioSegment.from_file(io.BytesIO(audio_bytes))
+  bounds = split_on_silence_bounds(audio_segment)
+  _log(
+    "INFO",
+    f"Chunked mode: {len(audio_segment) / 1000:.0f}s of audio split into "
+    f"{len(bounds)} segment(s), {max_workers} worker(s).",
+  )
+
+  def _transcribe_chunk(index_and_bounds):
+    index, (start_ms, end_ms) = index_and_bounds
+    chunk_io = io.BytesIO()
+    audio_segment[start_ms:end_ms].export(chunk_io, format="mp3", bitrate="64k")
+    text = _whisper_call(
+      chunk_io.getvalue(), f"chunk_{index}.mp3", language, api_gateway
+    )
+    _log("INFO", f"Segment {index + 1}/{len(bounds)} transcribed ({len(text)} chars).")
+    return text
+
+  # executor.map preserves input order, so the texts come back in sequence.
+  with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(bounds)))) as pool:
+    texts = list(pool.map(_transcribe_chunk, enumerate(bounds)))
+
+  result_text = stitch_transcripts(texts)
+  _log(
+    "INFO", f"Chunked transcription successful. Result length: {len(result_text)} chars."
+  )
+  return result_text
+
+
+def split_on_silence_bounds(
+  audio_segment,
+  target_ms=CHUNK_TARGET_MS,
+  window_ms=CHUNK_SEARCH_WINDOW_MS,
+  overlap_ms=CHUNK_OVERLAP_MS,
+):
+  """
+  Computes (start_ms, end_ms) bounds for overlapping segments of a recording.
+
+  Each cut is placed in the middle of the silence closest to `target_ms` after
+  the previous cut, or exactly at the target when no silence is found in the
+  search window. Every segment but the first starts `overlap_ms` before its cut
+  so that words spoken across a boundary are not lost.
+  """
+  duration_ms = len(audio_segment)
+  if duration_ms <= max(CHUNKED_MIN_DURATION_MS, target_ms + window_ms):
+    return [(0, duration_ms)]
+
+  silences = detect_silence(
+    audio_segment,
+    min_silence_len=MIN_SILENCE_LEN_MS,
+    silence_thresh=audio_segment.dBFS - SILENCE_THRESH_OFFSET_DB,
+  )
+  silence_midpoints = [(start + end) // 2 for start, end in silences]
+
+  cuts = []
+  position = 0
+  while duration_ms - position > target_ms + window_ms:
+    target = position + target_ms
+    candidates = [m for m in silence_midpoints if abs(m - target) <= window_ms]
+    cut = min(candidates, key=lambda m: abs(m - target)) if candidates else target
+    cuts.append(cut)
+    position = cut
+
+  starts = [0] + cuts
+  ends = cuts + [duration_ms]
+  return [
+    (max(0, start - overlap_ms) if start else 0, end)
+    for start, end in zip(starts, ends)
+  ]
+
+
+def _normalize_word(word):
+  return re.sub(r"[^\w]", "", word.lower())
+
+
+def stitch_transcripts(texts, max_overlap_words=MAX_OVERLAP_WORDS):
+  """
+  Joins ordered segment transcripts, dropping the words repeated at each
+  overlap. The longest run of words ending one segment that also starts the
+  next one (ignoring case and punctuation) is kept only once.
+  """
+  merged_words = []
+  for text in texts:
+    words = (text or "").split()
+    if not words:
+      continue
+    if merged_words:
+      tail = [_normalize_word(w) for w in merged_words[-max_overlap_words:]]
+      head = [_normalize_word(w) for w in words[:max_overlap_words]]
+      overlap = 0
+      for size in range(min(len(tail), len(head)), 0, -1):
+        if tail[-size:] == head[:size] and any(tail[-size:]):
+          overlap = size
+          break
+      words = words[overlap:]
+    merged_words.extend(words)
+  return " ".join(merged_words)
+
+
+@anvil.server.callable
+@admin_required
+def admin_benchmark_chunked_transcription(
+  sample_size=5, max_workers=MAX_TRANSCRIPTION_WORKERS
+):
+  """
+  Admin function transcribing up to `sample_size` stored recordings both with a
+  single Whisper call and in chunked mode, bypassing the transcription cache.
+  Reports the latency of each mode and how closely the chunked transcript
+  matches the single-call one. Runs as a background task.
+  """
+  _log("INFO", "Launching chunked transcription benchmark background task...")
+  return anvil.server.launch_background_task(
+    "bg_benchmark_chunked_transcription", sample_size, max_workers
+  )
+
+
+def _word_similarity(reference, candidate):
+  """Ratio of matching words between two transcripts, ignoring case and punctuation."""
+  return difflib.SequenceMatcher(
+    None,
+    [_normalize_word(w) for w in (reference or "").split()],
+    [_normalize_word(w) for w in (candidate or "").split()],
+    autojunk=False,
+  ).ratio()
+
+
+@anvil.server.background_task
+def bg_benchmark_chunked_transcription(sample_size, max_workers):
+  """Background task behind admin_benchmark_chunked_transcription."""
+  results = []
+  for audio_row in app_tables.audio.search():
+    if len(results) >= sample_size:
+      break
+    audio_blob = audio_row["audio"]
+    if audio_blob is None:
+      continue
+    anvil.server.task_state["progress"] = f"{len(results)}/{sample_size}"
+    report = audio_row["report_id"]
+    owner = audio_row["owner"]
+    language = (
+      (report and report["language"])
+      or (owner and owner["favorite_language"])
+      or "en"
+    )
+    audio_bytes = audio_blob.get_bytes()
+
+    started = time.perf_counter()
+    single_text = transcribe_audio(
+      audio_blob, language, audio_blob.content_type, chunked=False
+    )
+    single_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    chunked_text = transcribe_audio_chunked(
+      audio_bytes, language, max_workers=max_workers
+    )
+    chunked_seconds = time.perf_counter() - started
+
+    audio_segment = AudioSegment.from_file(io.BytesIO(audio_bytes))
+    results.append({
+      "audio_id": audio_row.get_id(),
+      "bytes": len(audio_bytes),
+      "duration_s": round(len(audio_segment) / 1000, 1),
+      "segments": len(split_on_silence_bounds(audio_segment)),
+      "single_s": round(single_seconds, 2),
+      "chunked_s": round(chunked_seconds, 2),
+      "single_words": len(single_text.split()),
+      "chunked_words": len(chunked_text.split()),
+      "word_similarity": round(_word_similarity(single_text, chunked_text), 3),
+    })
+
+  summary = None
+  if results:
+    summary = {
+      "recordings": len(results),
+      "single_s": round(sum(r["single_s"] for r in results), 2),
+      "chunked_s": round(sum(r["chunked_s"] for r in results), 2),
+      "min_word_similarity": min(r["word_similarity"] for r in results),
+    }
+  _log("INFO", f"Chunked transcription benchmark complete: {summary}")
+  return {"recordings": results, "summary": summary}
@@ -0,0 +1,119 @@
+import anvil.server
+import anvil.tables as tables
+import anvil.tables.query as q
+from anvil.tables import app_tables
+import hashlib
+from datetime import datetime, timedelta
+from . import transcription
+from ..cache_stats import record_cache_event, get_cache_counters
+from ...auth import admin_required
+from ...logging_server import get_logger
+
+logger = get_logger(__name__)
+
+CACHE_NAME = "transcription"
+# Entries unused for longer than this are evicted.
+MAX_ENTRY_AGE = timedelta(days=30)
+# Once the table grows past this many rows, the least recently used are evicted.
+MAX_ENTRIES = 5000
+
+
+def audio_cache_key(audio_bytes, language):
+  """Content address of a recording: SHA-256 of its bytes, plus the language."""
+  return f"{hashlib.sha256(audio_bytes).hexdigest()}:{language or ''}"
+
+
+def _record(hit):
+  try:
+    record_cache_event(CACHE_NAME, hit)
+  except Exception as e:
+    logger.warning(f"Could not update transcription cache counters: {e}")
+
+
+def _cached_row(cache_key):
+  """The cache row of a key, or None. Tolerates duplicate rows for the key."""
+  return next(iter(app_tables.transcription_cache.search(cache_key=cache_key)), None)
+
+
+@tables.in_transaction
+def _store_transcript(cache_key, transcript):
+  """Adds a cache entry, unless a concurrent miss on the same audio already did."""
+  if _cached_row(cache_key) is not None:
+    return
+  now = datetime.now()
+  app_tables.transcription_cache.add_row(
+    cache_key=cache_key,
+    transcript=transcript,
+    created=now,
+    last_used=now,
+  )
+
+
+def transcribe_audio_cached(audio_blob, language, mime_type):
+  """
+  Returns the transcript of an audio blob, calling Whisper only when the same
+  bytes have not already been transcribed in the same language. Cache errors
+  are treated as a miss.
+  """
+  cache_key = audio_cache_key(audio_blob.get_bytes(), language)
+
+  transcript = None
+  try:
+    row = _cached_row(cache_key)
+    if row is not None:
+      transcript = row["transcript"]
+      row["last_used"] = datetime.now()
+  except Exception as e:
+    logger.warning(f"Could not read the transcription cache: {e}")
+  if transcript is not None:
+    logger.info("Transcription cache hit. Skipping Whisper.")
+    _record(True)
+    return transcript
+
+  logger.info("Transcription cache miss.")
+  _record(False)
+  transcript = transcription.transcribe_audio(audio_blob, language, mime_type)
+
+  try:
+    _store_transcript(cache_key, transcript)
+    evict_transcription_cache()
+  except Exception as e:
+    # A cache write failure must never fail the pipeline.
+    logger.warning(f"Could not store transcript in cache: {e}")
+  return transcript
+
+
+def evict_transcription_cache():
+  """Removes expired entries, then the least recently used ones above MAX_ENTRIES."""
+  cutoff = datetime.now() - MAX_ENTRY_AGE
+  expired = app_tables.transcription_cache.search(
+    last_used=q.less_than(cutoff)
+  )
+  removed = 0
+  for row in expired:
+    row.delete()
+    removed += 1
+
+  overflow = len(app_tables.transcription_cache.search()) - MAX_ENTRIES
+  if overflow > 0:
+    oldest = app_tables.transcription_cache.search(
+      tables.order_by("last_used", ascending=True)
+    )
+    for row in list(oldest[:overflow]):
+      row.delete()
+      removed += 1
+
+  if removed:
+    logger.info(f"Evicted {removed} transcription cache entries.")
+  return removed
+
+
+@anvil.server.callable
+@admin_required
+def admin_get_transcription_cache_stats():
+  """Admin function returning the transcription cache counters and size."""
+  stats = get_cache_counters(CACHE_NAME)
+  stats["entries"] = len(app_tables.transcription_cache.search())
+  stats["max_entries"] = MAX_ENTRIES
+  stats["max_age_days"] = MAX_ENTRY_AGE.days
+  return stats
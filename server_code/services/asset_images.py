@@ -0,0 +1,98 @@
+import anvil
+import io
+from ..logging_server import get_logger
+
+try:
+  from PIL import Image, ImageOps
+except ImportError:
+  raise ImportError("The 'Pillow' library is not installed in the server environment.")
+
+logger = get_logger(__name__)
+
+# Branding images are stored three ways: the original as uploaded, a "print"
+# variant no larger than the asset is ever printed, and a "thumbnail" for the
+# Settings preview. Variants only ever shrink an image.
+PRINT_DPI = 300
+JPEG_QUALITY = 85
+
+
+def _cm_to_px(cm):
+  return round(cm / 2.54 * PRINT_DPI)
+
+
+# Headers and footers fill a 2.5cm strip between the 2cm page margins of an
+# A4 page; signatures are shown at most 200 CSS px (96 per inch) wide.
+PRINT_BOXES = {
+  "header": (_cm_to_px(17), _cm_to_px(2.5)),
+  "footer": (_cm_to_px(17), _cm_to_px(2.5)),
+  "signature": (round(200 / 96 * PRINT_DPI), round(200 / 96 * PRINT_DPI)),
+}
+# The Settings preview box is 200x100 CSS px; thumbnails cover it at 2x.
+THUMBNAIL_BOX = (400, 200)
+
+
+def _open_image(media):
+  """Decodes an uploaded image upright, or returns None if it is not one."""
+  try:
+    image = Image.open(io.BytesIO(media.get_bytes()))
+    image.load()
+  except Exception as e:
+    logger.warning(f"Asset '{media.name}' is not an image Pillow can read: {e}")
+    return None
+  # Phone photos are stored sideways with an EXIF rotation.
+  return ImageOps.exif_transpose(image)
+
+
+def _has_alpha(image):
+  return image.mode in ("RGBA", "LA") or (
+    image.mode == "P" and "transparency" in image.info
+  )
+
+
+def _encode(image, name):
+  """PNG keeps the transparency of signatures and logos; JPEG covers the rest."""
+  buffer = io.BytesIO()
+  if _has_alpha(image):
+    image.convert("RGBA").save(buffer, "PNG", optimize=True)
+    return anvil.BlobMedia("image/png", buffer.getvalue(), name=f"{name}.png")
+  image.convert("RGB").save(
+    buffer, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True
+  )
+  return anvil.BlobMedia("image/jpeg", buffer.getvalue(), name=f"{name}.jpg")
+
+
+def _fitted(image, box):
+  fitted = image.copy()
+  fitted.thumbnail(box, Image.LANCZOS)
+  return fitted
+
+
+def make_asset_variants(media, asset_type):
+  """
+  Builds the print and thumbnail variants of an uploaded branding image.
+
+  Returns:
+      tuple: (print_media, thumbnail_media). Either is None where the original
+      should be used instead: when the upload is not an image Pillow can
+      read, or when the print variant would not be smaller than the original.
+  """
+  image = _open_image(media)
+  if image is None:
+    return None, None
+  base_name = (media.name or asset_type).rsplit(".", 1)[0]
+
+  print_media = _encode(
+    _fitted(image, PRINT_BOXES.get(asset_type, PRINT_BOXES["header"])),
+    f"{base_name}-print",
+  )
+  original_size = len(media.get_bytes())
+  if len(print_media.get_bytes()) >= original_size:
+    print_media = None
+  thumbnail = _encode(_fitted(image, THUMBNAIL_BOX), f"{base_name}-thumbnail")
+
+  logger.info(
+    f"Asset variants of '{base_name}' ({asset_type}, {image.width}x{image.height}): "
+    f"{original_size} bytes, print "
+    f"{len(print_media.get_bytes()) if print_media else original_size} bytes."
+  )
+  return print_media, thumbnail
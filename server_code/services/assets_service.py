@@ -1,11 +1,31 @@
 import anvil.server
 import anvil.users
+import anvil.tables as tables
+import anvil.tables.query as q
 from anvil.tables import app_tables
+from .asset_images import make_asset_variants
+from ..auth import admin_required
 from ..logging_server import get_logger
+from collections import OrderedDict
 from datetime import datetime
+import threading
+import time
 
 logger = get_logger(__name__)
 
+# --- Active asset resolver ---
+# The default assets of each owner are cached in this server process: the
+# signature per user, the header and footer per structure. Structure changes
+# need no invalidation, since a user is resolved through their current
+# structure. upload_asset, delete_asset and join_structure_as_vet drop the
+# entries they change in the process they run in; other processes see the
+# change once their entry is ACTIVE_ASSETS_TTL_SECONDS old.
+ACTIVE_ASSETS_TTL_SECONDS = 60
+MAX_CACHED_OWNERS = 1000
+_active_assets_lock = threading.Lock()
+# (owner kind, owner row id) -> (expiry, {asset type: asset data or None})
+_active_assets = OrderedDict()
+
 
 @anvil.server.callable(require_user=True)
 def upload_asset(file, type, name):
@@ -34,63 +54,124 @@ def upload_asset(file, type, name):
   else:
     raise ValueError(f"Invalid asset type '{type}'.")
 
-    # Domain Logic: When a new asset is uploaded, it becomes the new default.
-    # We must find any existing default for this owner and type and unset it.
-  existing_defaults = app_tables.assets.search(
-    type=type, owner_user=owner_user, owner_structure=owner_structure, is_default=True
-  )
-  for row in existing_defaults:
-    row["is_default"] = False
-
-    # Create the new asset row
-  app_tables.assets.add_row(
-    name=name,
-    type=type,
-    file=file,
-    owner_user=owner_user,
-    owner_structure=owner_structure,
-    is_default=True,
-    is_archived=False,
-    created_date=datetime.now(),
-  )
-  logger.info(
-    f"User '{user['email']}' successfully uploaded asset '{name}' of type '{type}'."
-  )
-  return True
-
-@anvil.server.callable(require_user=True)
-def get_active_assets_for_user_with_ids():
-  """
-  Fetches the active header, footer, and signature for the user,
-  including the asset's row ID and media file for the client.
-  """
-  user = anvil.users.get_user(allow_remembered=True)
+  # The variants PDFs and previews use are built first: if that fails, the
+  # current default is left untouched.
+  print_file, thumbnail = make_asset_variants(file, type)
 
-  def get_asset_data(owner_user=None, owner_structure=None, type=None):
-    row = app_tables.assets.get(
+  # Domain Logic: When a new asset is uploaded, it becomes the new default.
+  # The existing default for this owner and type is unset in the same
+  # transaction, so the owner is never left without one.
+  @tables.in_transaction
+  def _switch_default():
+    existing_defaults = app_tables.assets.search(
+      type=type, owner_user=owner_user, owner_structure=owner_structure, is_default=True
+    )
+    for row in existing_defaults:
+      row["is_default"] = False
+    app_tables.assets.add_row(
+      name=name,
+      type=type,
+      file=file,
+      print_file=print_file,
+      thumbnail=thumbnail,
       owner_user=owner_user,
       owner_structure=owner_structure,
-      type=type,
       is_default=True,
       is_archived=False,
+      created_date=datetime.now(),
     )
-    if row:
-      return {"id": row.get_id(), "file": row["file"]}
+
+  _switch_default()
+  invalidate_active_assets(owner_user=owner_user, owner_structure=owner_structure)
+  logger.info(
+    f"User '{user['email']}' successfully uploaded asset '{name}' of type '{type}'."
+  )
+  return True
+
+
+def _asset_data(row):
+  if row is None:
     return None
+  return {
+    "id": row.get_id(),
+    "file": row["file"],
+    "print_file": row["print_file"],
+    "thumbnail": row["thumbnail"],
+  }
 
-  structure = user["structure"]
 
+def _owner_key(owner_user=None, owner_structure=None):
+  if owner_user is not None:
+    return ("user", owner_user.get_id())
+  return ("structure", owner_structure.get_id())
+
+
+def _owner_assets(types, owner_user=None, owner_structure=None):
+  """Returns {type: asset data or None} for one owner, from the cache if fresh."""
+  key = _owner_key(owner_user, owner_structure)
+  now = time.monotonic()
+  with _active_assets_lock:
+    entry = _active_assets.get(key)
+    if entry is not None and entry[0] > now:
+      _active_assets.move_to_end(key)
+      return entry[1]
+
+  assets = {
+    type: _asset_data(
+      app_tables.assets.get(
+        owner_user=owner_user,
+        owner_structure=owner_structure,
+        type=type,
+        is_default=True,
+        is_archived=False,
+      )
+    )
+    for type in types
+  }
+  with _active_assets_lock:
+    _active_assets[key] = (now + ACTIVE_ASSETS_TTL_SECONDS, assets)
+    _active_assets.move_to_end(key)
+    while len(_active_assets) > MAX_CACHED_OWNERS:
+      _active_assets.popitem(last=False)
+  return assets
+
+
+def invalidate_active_assets(owner_user=None, owner_structure=None):
+  """Drops the cached default assets of a user and/or a structure."""
+  with _active_assets_lock:
+    if owner_user is not None:
+      _active_assets.pop(_owner_key(owner_user=owner_user), None)
+    if owner_structure is not None:
+      _active_assets.pop(_owner_key(owner_structure=owner_structure), None)
+
+
+def active_assets_for(user):
+  """
+  Returns the default header, footer and signature of `user` as
+  {"signature", "header", "footer"}, each None or {"id", "file",
+  "print_file", "thumbnail"}, where a missing variant is None. Resolved in
+  process through the active asset cache.
+  """
+  structure = user["structure"]
+  branding = (
+    _owner_assets(("header", "footer"), owner_structure=structure) if structure else {}
+  )
   return {
-    "signature": get_asset_data(owner_user=user, type="signature"),
-    "header": get_asset_data(owner_structure=structure, type="header")
-    if structure
-    else None,
-    "footer": get_asset_data(owner_structure=structure, type="footer")
-    if structure
-    else None,
+    "signature": _owner_assets(("signature",), owner_user=user)["signature"],
+    "header": branding.get("header"),
+    "footer": branding.get("footer"),
   }
 
 
+@anvil.server.callable(require_user=True)
+def get_active_assets_for_user_with_ids():
+  """
+  Fetches the active header, footer, and signature for the user,
+  including the asset's row ID and media file for the client.
+  """
+  return active_assets_for(anvil.users.get_user(allow_remembered=True))
+
+
 @anvil.server.callable(require_user=True)
 def delete_asset(asset_id):
   """
@@ -115,7 +196,9 @@ def delete_asset(asset_id):
 
   if is_owner or is_supervisor:
     asset_name = asset_row["name"]
+    owner_user, owner_structure = asset_row["owner_user"], asset_row["owner_structure"]
     asset_row.delete()
+    invalidate_active_assets(owner_user=owner_user, owner_structure=owner_structure)
     logger.info(
       f"User '{user['email']}' successfully deleted asset '{asset_name}' (ID: {asset_id})."
     )
@@ -125,3 +208,50 @@ def delete_asset(asset_id):
       f"SECURITY: User '{user['email']}' permission denied to delete asset ID '{asset_id}'."
     )
     return False
+
+
+@anvil.server.callable
+@admin_required
+def admin_generate_asset_variants():
+  """
+  Admin function building the print and thumbnail variants of the assets
+  uploaded before they existed. Runs as a background task and can be run
+  again safely.
+  """
+  logger.info("Launching asset variants background task...")
+  return anvil.server.launch_background_task("bg_generate_asset_variants")
+
+
+@anvil.server.background_task
+def bg_generate_asset_variants():
+  """Background task behind admin_generate_asset_variants."""
+  processed = 0
+  skipped = 0
+  failed = 0
+  original_bytes = 0
+  print_bytes = 0
+  for row in app_tables.assets.search(thumbnail=None, file=q.not_(None)):
+    try:
+      print_file, thumbnail = make_asset_variants(row["file"], row["type"])
+      if thumbnail is None:
+        # Not an image Pillow can read: the original is used as is.
+        skipped += 1
+        continue
+      row.update(print_file=print_file, thumbnail=thumbnail)
+      processed += 1
+      original_size = len(row["file"].get_bytes())
+      original_bytes += original_size
+      print_bytes += len(print_file.get_bytes()) if print_file else original_size
+    except Exception as e:
+      failed += 1
+      logger.error(f"Could not build the variants of asset '{row.get_id()}': {e}")
+
+  result = {
+    "processed": processed,
+    "skipped": skipped,
+    "failed": failed,
+    "original_bytes": original_bytes,
+    "print_bytes": print_bytes,
+  }
+  logger.info(f"Asset variants generated: {result}")
+  return result
@@ -0,0 +1,31 @@
+import anvil.server
+import anvil.tables as tables
+from anvil.tables import app_tables
+from ..logging_server import get_logger
+
+logger = get_logger(__name__)
+
+
+@tables.in_transaction
+def record_cache_event(cache_name, hit):
+  """Increments the hit or miss counter of a named server-side cache."""
+  row = app_tables.cache_stats.get(name=cache_name)
+  if row is None:
+    row = app_tables.cache_stats.add_row(name=cache_name, hits=0, misses=0)
+  if hit:
+    row["hits"] = (row["hits"] or 0) + 1
+  else:
+    row["misses"] = (row["misses"] or 0) + 1
+
+
+def get_cache_counters(cache_name):
+  """Returns the hit/miss counters and hit rate of a named cache."""
+  row = app_tables.cache_stats.get(name=cache_name)
+  hits = (row["hits"] or 0) if row else 0
+  misses = (row["misses"] or 0) if row else 0
+  total = hits + misses
+  return {
+    "hits": hits,
+    "misses": misses,
+    "hit_rate": round(hits / total, 4) if total else None,
+  }
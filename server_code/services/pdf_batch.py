@@ -0,0 +1,247 @@
+import anvil.server
+import anvil.users
+import anvil.tables as tables
+import anvil.tables.query as q
+from anvil.tables import app_tables
+import io
+import re
+import zipfile
+from concurrent.futures import as_completed
+from datetime import datetime
+from PyPDF2 import PdfMerger
+from .ai.progress import publish_owner, publish_progress
+from .assets_service import active_assets_for
+from .pdf_service import (
+  as_pdf_media,
+  build_document,
+  cached_pdf,
+  pdf_cache_key,
+  store_pdf,
+  write_document,
+)
+from .pdf_workers import render_pool_for, RenderPoolUnavailableError
+from ..data.reports import authorize_reports
+from ..data.report_bodies import read_body
+from ..logging_server import get_logger
+
+logger = get_logger(__name__)
+
+MAX_EXPORT_REPORTS = 500
+EXPORT_FORMATS = ("zip", "merged")
+_UNSAFE_FILE_CHARS = re.compile(r"[^\w\-. ]+")
+
+def _filtered_reports(current_user, filters):
+  """The current vet's own reports matching `filters`, oldest first."""
+  conditions = {"vet": current_user}
+  if filters.get("statuses"):
+    values = list(filters["statuses"])
+    if "not_specified" in values:
+      values.append(None)
+    conditions["statut"] = q.any_of(*values)
+  date_bounds = []
+  if filters.get("date_from") is not None:
+    date_bounds.append(q.greater_than_or_equal_to(filters["date_from"]))
+  if filters.get("date_to") is not None:
+    date_bounds.append(q.less_than_or_equal_to(filters["date_to"]))
+  if date_bounds:
+    conditions["last_modified"] = q.all_of(*date_bounds)
+  rows = app_tables.reports.search(
+    q.fetch_only(), tables.order_by("last_modified", ascending=True), **conditions
+  )
+  return [row.get_id() for row in rows[: MAX_EXPORT_REPORTS + 1]]
+
+
+@anvil.server.callable(require_user=True)
+def export_reports_pdf(report_ids=None, filters=None, output_format="zip"):
+  """
+  Launches a background job rendering many reports to PDF, with each author's
+  header, footer and signature.
+
+  Args:
+      report_ids (list | None): The reports to export, in order. Authors may
+          export their own reports, supervisors those of their structure.
+      filters (dict | None): Used when report_ids is None. Selects the current
+          vet's own reports by "statuses", "date_from" and "date_to".
+      output_format (str): "zip" for one PDF per report in a ZIP archive,
+          "merged" for a single PDF.
+
+  Returns:
+      Task: The export job. Its state holds "step" ("rendering" or
+      "packaging"), "done", "total" and "failed"; its return value holds the
+      "media" and the "exported", "failed" and "refused" reports.
+  """
+  if output_format not in EXPORT_FORMATS:
+    raise ValueError(f"Unknown export format '{output_format}'.")
+  current_user = anvil.users.get_user()
+  if report_ids is None:
+    report_ids = _filtered_reports(current_user, filters or {})
+  if not report_ids:
+    raise ValueError("There are no reports to export.")
+  if len(report_ids) > MAX_EXPORT_REPORTS:
+    raise ValueError(f"An export cannot hold more than {MAX_EXPORT_REPORTS} reports.")
+
+  rows, refused = authorize_reports(current_user, report_ids)
+  if not rows:
+    raise ValueError("None of these reports can be exported.")
+  logger.info(f"Launching PDF export of {len(rows)} report(s) as '{output_format}'...")
+  return anvil.server.launch_background_task(
+    "bg_export_reports_pdf",
+    [rows[report_id] for report_id in dict.fromkeys(report_ids) if report_id in rows],
+    output_format,
+    refused,
+    current_user,
+  )
+
+
+def _file_name(report_row, used_names):
+  """A unique, file system safe PDF name for a report inside the archive."""
+  day = (
+    report_row["last_modified"].strftime("%Y-%m-%d")
+    if report_row["last_modified"]
+    else "undated"
+  )
+  title = _UNSAFE_FILE_CHARS.sub("_", report_row["file_name"] or "").strip() or "report"
+  name = f"{day} {title}"[:120]
+  candidate = f"{name}.pdf"
+  suffix = 2
+  while candidate in used_names:
+    candidate = f"{name} ({suffix}).pdf"
+    suffix += 1
+  used_names.add(candidate)
+  return candidate
+
+
+def _render_pending(pending, on_rendered):
+  """
+  Renders the documents of `pending`, a list of (index, document), in the
+  process's render pool, calling on_rendered(index, pdf_bytes, error) from
+  this thread as each completes. Small batches, for which starting the pool
+  does not pay (see render_pool_for), and documents the pool could not take
+  are rendered in this process instead.
+  """
+  remaining = dict(pending)
+  pool = render_pool_for(len(pending))
+  if pool is not None:
+    futures = {}
+    try:
+      for index, document in pending:
+        futures[pool.submit(document)] = index
+    except RenderPoolUnavailableError as e:
+      logger.warning(f"Rendering in process: {e}")
+    for future in as_completed(futures):
+      index = futures[future]
+      try:
+        pdf_bytes = future.result()
+      except RenderPoolUnavailableError:
+        continue
+      except Exception as e:
+        remaining.pop(index)
+        on_rendered(index, None, e)
+        continue
+      remaining.pop(index)
+      on_rendered(index, pdf_bytes, None)
+
+  image_cache = {}
+  for index, document in remaining.items():
+    try:
+      on_rendered(index, write_document(document, image_cache), None)
+    except Exception as e:
+      on_rendered(index, None, e)
+
+
+def _package(report_rows, pdfs, output_format):
+  """Builds the ZIP archive or the merged PDF from the rendered reports."""
+  stamp = datetime.now().strftime("%Y%m%d-%H%M")
+  buffer = io.BytesIO()
+  if output_format == "zip":
+    used_names = set()
+    # PDFs are already compressed; storing them keeps packaging instant.
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+      for report_row, pdf_bytes in zip(report_rows, pdfs):
+        if pdf_bytes is not None:
+          archive.writestr(_file_name(report_row, used_names), pdf_bytes)
+    return anvil.BlobMedia(
+      content_type="application/zip",
+      content=buffer.getvalue(),
+      name=f"reports-{stamp}.zip",
+    )
+
+  merger = PdfMerger()
+  for pdf_bytes in pdfs:
+    if pdf_bytes is not None:
+      merger.append(io.BytesIO(pdf_bytes))
+  merger.write(buffer)
+  merger.close()
+  return as_pdf_media(buffer.getvalue(), name=f"reports-{stamp}.pdf")
+
+
+@anvil.server.background_task
+def bg_export_reports_pdf(report_rows, output_format, refused, owner=None):
+  """
+  Background job behind export_reports_pdf. Reports already in the PDF cache
+  are taken from it; the others are rendered by the pdf_workers pool when
+  there are enough of them, whose warm workers keep the fonts, the stylesheet
+  and the decoded asset images across documents. A failed report does not stop the others. Only `owner`
+  can follow the job.
+  """
+  publish_owner(owner)
+  total = len(report_rows)
+  pdfs = [None] * total
+  cache_keys = [None] * total
+  failed = []
+  progress = {"done": 0}
+
+  def _finish(index, pdf_bytes, error=None):
+    if error is not None:
+      report_id = report_rows[index].get_id()
+      logger.error(f"PDF export of report '{report_id}' failed: {error}")
+      failed.append({"id": report_id, "error": str(error)})
+    else:
+      pdfs[index] = pdf_bytes
+    progress["done"] += 1
+    publish_progress(done=progress["done"], failed=list(failed))
+
+  publish_progress(step="rendering", done=0, total=total, failed=[])
+  assets_by_vet = {}
+  pending = []
+  from_cache = 0
+  for index, report_row in enumerate(report_rows):
+    try:
+      vet = report_row["vet"]
+      if vet.get_id() not in assets_by_vet:
+        assets_by_vet[vet.get_id()] = active_assets_for(vet)
+      active_assets = assets_by_vet[vet.get_id()]
+      html_content = read_body(report_row) or ""
+      cache_keys[index] = pdf_cache_key(html_content, active_assets)
+      cached = cached_pdf(cache_keys[index])
+      if cached is not None:
+        from_cache += 1
+        _finish(index, cached.get_bytes())
+      else:
+        pending.append((index, build_document(html_content, active_assets)))
+    except Exception as e:
+      _finish(index, None, e)
+
+  def _rendered(index, pdf_bytes, error):
+    _finish(index, pdf_bytes, error)
+    if pdf_bytes is not None:
+      store_pdf(cache_keys[index], as_pdf_media(pdf_bytes))
+
+  if pending:
+    _render_pending(pending, _rendered)
+
+  exported = sum(1 for pdf_bytes in pdfs if pdf_bytes is not None)
+  if not exported:
+    raise Exception("None of the reports could be rendered.")
+  publish_progress(step="packaging")
+  media = _package(report_rows, pdfs, output_format)
+  logger.info(
+    f"PDF export complete: {exported}/{total} report(s), "
+    f"{from_cache} from cache, {len(failed)} failed."
+  )
+  return {
+    "media": media,
+    "exported": exported,
+    "failed": failed,
+    "refused": refused,
+  }
@@ -1,19 +1,66 @@
 import anvil.server
+import anvil.users
+import anvil.tables as tables
+import anvil.tables.query as q
 from anvil.tables import app_tables
+from ..auth import admin_required
+from ..data.report_bodies import read_body
+from .assets_service import active_assets_for
+from .cache_stats import record_cache_event, get_cache_counters
+from .pdf_workers import running_render_pool, RenderPoolUnavailableError
 from ..logging_server import get_logger
 import io
 import base64
-from datetime import datetime
-
-try:
-  from weasyprint import HTML, CSS
-except ImportError:
-  raise ImportError(
-    "The 'weasyprint' library is not installed in the server environment."
-  )
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
 
 logger = get_logger(__name__)
 
+CACHE_NAME = "pdf"
+# Part of every PDF cache key: bump it whenever the layout or the stylesheet
+# changes, so that PDFs rendered the old way are no longer served.
+RENDER_VERSION = 2
+# Entries unused for longer than this are evicted.
+MAX_ENTRY_AGE = timedelta(days=30)
+# Once the table grows past this many rows, the least recently used are evicted.
+MAX_ENTRIES = 500
+# Encoded assets kept in memory by this server process.
+MAX_MEMOIZED_ASSETS = 64
+
+STYLESHEET = """
+            @page {
+                size: A4; margin: 3.5cm 2cm 3.5cm 2cm;
+                @top-center { content: element(header); }
+                @bottom-center { content: element(footer); }
+            }
+            #header, #footer {
+                position: running(header); height: 2.5cm; width: 100%; text-align: center;
+            }
+            #footer { position: running(footer); }
+            #header img, #footer img {
+                max-height: 100%; max-width: 100%; object-fit: contain;
+            }
+            body { font-family: 'Helvetica', 'Arial', sans-serif; font-size: 11pt; line-height: 1.4; color: #333333; }
+            h1, h2, h3, p, ul, li { margin: 0; padding: 0; font-weight: normal; }
+            h1 { font-size: 1.6em; text-align: center; margin-bottom: 25px; color: #111111; font-weight: bold; }
+            h2 { font-size: 1.3em; margin-top: 25px; padding-bottom: 6px; border-bottom: 1px solid #cccccc; color: #111111; font-weight: bold; }
+            h3 { font-size: 1.1em; margin-top: 20px; margin-left: 5px; color: #222222; font-weight: bold; }
+            p { margin-top: 8px; margin-left: 10px; }
+            .signature-section { margin-top: 50px; padding-top: 15px; page-break-inside: avoid; text-align: left; }
+            .signature-section img { max-width: 200px; height: auto; }
+        """
+
+# Process-local memos. An asset row's file never changes (a new upload adds
+# a new row), so its encoded form can be kept for as long as its id is used;
+# only its print variant may appear later, when it is backfilled.
+_memo_lock = threading.Lock()
+_asset_data_uris = OrderedDict()
+_stylesheet = None
+_font_config = None
+
 
 def _convert_media_to_data_uri(media_object):
   """
@@ -27,49 +74,111 @@ def _convert_media_to_data_uri(media_object):
   return None
 
 
-@anvil.server.callable(require_user=True)
-def generate_pdf_from_html(html_content):
+def _print_variant(asset):
+  """The print-sized variant of an asset, or its original if it has none."""
+  return asset.get("print_file") or asset.get("file")
+
+
+def _asset_memo_key(asset):
+  variant = "print" if asset.get("print_file") else "original"
+  return f"{asset.get('id') or ''}:{variant}"
+
+
+def _asset_data_uri(asset):
+  """Returns the data URI of an active asset, encoding it once per asset variant."""
+  if not asset:
+    return None
+  memo_key = _asset_memo_key(asset)
+  with _memo_lock:
+    data_uri = _asset_data_uris.get(memo_key)
+    if data_uri is not None:
+      _asset_data_uris.move_to_end(memo_key)
+      return data_uri
+
+  data_uri = _convert_media_to_data_uri(_print_variant(asset))
+  if data_uri and asset.get("id"):
+    with _memo_lock:
+      _asset_data_uris[memo_key] = data_uri
+      while len(_asset_data_uris) > MAX_MEMOIZED_ASSETS:
+        _asset_data_uris.popitem(last=False)
+  return data_uri
+
+
+def _weasyprint():
   """
-  Generates a PDF from HTML, dynamically fetching the correct header, footer,
-  and signature for the user from the new asset_service.
+  Imports WeasyPrint on first use. Rendering normally happens in the
+  pdf_workers processes, so server calls that only look PDFs up in the cache
+  never load it.
   """
-  logger.info("Starting PDF generation using the new asset service.")
-
   try:
-    # --- Step 1: Fetch all required assets via the new service ---
-    active_assets = anvil.server.call("get_active_assets_for_user_with_ids")
-
-    header_data_uri = _convert_media_to_data_uri(
-      active_assets.get("header").get("file")
-      if active_assets.get("header") is not None
-      else None
-    )
-    footer_data_uri = _convert_media_to_data_uri(
-      active_assets.get("footer").get("file")
-      if active_assets.get("footer") is not None
-      else None
-    )
-    signature_data_uri = _convert_media_to_data_uri(
-      active_assets.get("signature").get("file")
-      if active_assets.get("signature") is not None
-      else None
+    import weasyprint
+    from weasyprint.text.fonts import FontConfiguration
+  except ImportError:
+    raise ImportError(
+      "The 'weasyprint' library is not installed in the server environment."
     )
+  return weasyprint, FontConfiguration
 
-    # --- Step 2: Build HTML blocks ---
-    header_html = (
-      f'<div id="header"><img src="{header_data_uri}"></div>' if header_data_uri else ""
-    )
-    footer_html = (
-      f'<div id="footer"><img src="{footer_data_uri}"></div>' if footer_data_uri else ""
-    )
-    signature_html = (
-      f'<div class="signature-section"><img src="{signature_data_uri}" alt="Signature"></div>'
-      if signature_data_uri
-      else ""
-    )
 
-    # --- Step 3: Combine everything into a single, structured HTML document ---
-    full_html_document = f"""
+def parsed_stylesheet():
+  """
+  The report stylesheet, parsed once per process, and the font configuration
+  it was parsed with, which every render must then share.
+  """
+  global _stylesheet, _font_config
+  if _stylesheet is None:
+    weasyprint, FontConfiguration = _weasyprint()
+    _font_config = FontConfiguration()
+    _stylesheet = weasyprint.CSS(string=STYLESHEET, font_config=_font_config)
+  return _stylesheet, _font_config
+
+
+def clear_render_memos():
+  """Drops the encoded assets and the parsed stylesheet of this process."""
+  global _stylesheet, _font_config
+  with _memo_lock:
+    _asset_data_uris.clear()
+  _stylesheet = None
+  _font_config = None
+
+
+def _asset_ids(active_assets):
+  return [
+    _asset_memo_key(active_assets.get(kind) or {})
+    for kind in ("header", "footer", "signature")
+  ]
+
+
+def pdf_cache_key(html_content, active_assets):
+  """
+  Content address of a PDF: SHA-256 of the report HTML and the ids of the
+  asset variants it embeds.
+  """
+  digest = hashlib.sha256()
+  digest.update(f"{RENDER_VERSION}|{'|'.join(_asset_ids(active_assets))}|".encode())
+  digest.update((html_content or "").encode("utf-8"))
+  return digest.hexdigest()
+
+
+def build_document(html_content, active_assets):
+  """Wraps the report HTML with its header, footer and signature images."""
+  header_data_uri = _asset_data_uri(active_assets.get("header"))
+  footer_data_uri = _asset_data_uri(active_assets.get("footer"))
+  signature_data_uri = _asset_data_uri(active_assets.get("signature"))
+
+  header_html = (
+    f'<div id="header"><img src="{header_data_uri}"></div>' if header_data_uri else ""
+  )
+  footer_html = (
+    f'<div id="footer"><img src="{footer_data_uri}"></div>' if footer_data_uri else ""
+  )
+  signature_html = (
+    f'<div class="signature-section"><img src="{signature_data_uri}" alt="Signature"></div>'
+    if signature_data_uri
+    else ""
+  )
+
+  return f"""
             <!DOCTYPE html>
             <html>
             <head><meta charset="UTF-8"></head>
@@ -84,44 +193,233 @@ def generate_pdf_from_html(html_content):
             </html>
             """
 
-    # --- Step 4: Define the stylesheet ---
-    css = CSS(
-      string="""
-            @page {
-                size: A4; margin: 3.5cm 2cm 3.5cm 2cm;
-                @top-center { content: element(header); }
-                @bottom-center { content: element(footer); }
-            }
-            #header, #footer {
-                position: running(header); height: 2.5cm; width: 100%; text-align: center;
-            }
-            #footer { position: running(footer); }
-            #header img, #footer img {
-                max-height: 100%; max-width: 100%; object-fit: contain;
-            }
-            body { font-family: 'Helvetica', 'Arial', sans-serif; font-size: 11pt; line-height: 1.4; color: #333333; }
-            h1, h2, h3, p, ul, li { margin: 0; padding: 0; font-weight: normal; }
-            h1 { font-size: 1.6em; text-align: center; margin-bottom: 25px; color: #111111; font-weight: bold; }
-            h2 { font-size: 1.3em; margin-top: 25px; padding-bottom: 6px; border-bottom: 1px solid #cccccc; color: #111111; font-weight: bold; }
-            h3 { font-size: 1.1em; margin-top: 20px; margin-left: 5px; color: #222222; font-weight: bold; }
-            p { margin-top: 8px; margin-left: 10px; }
-            .signature-section { margin-top: 50px; padding-top: 15px; page-break-inside: avoid; text-align: left; }
-            .signature-section img { max-width: 200px; height: auto; }
-        """
-    )
 
-    # --- Step 5: Render and Return ---
-    pdf_buffer = io.BytesIO()
-    html = HTML(string=full_html_document)
-    html.write_pdf(pdf_buffer, stylesheets=[css])
-    pdf_bytes = pdf_buffer.getvalue()
-    pdf_media = anvil.BlobMedia(
-      content_type="application/pdf", content=pdf_bytes, name="report.pdf"
-    )
+def write_document(full_html_document, image_cache=None):
+  """
+  Renders a document from build_document to PDF bytes. Images are decoded
+  once per `image_cache`, which a batch shares across its documents.
+  """
+  weasyprint, _ = _weasyprint()
+  stylesheet, font_config = parsed_stylesheet()
+  options = {} if image_cache is None else {"cache": image_cache}
+  pdf_buffer = io.BytesIO()
+  weasyprint.HTML(string=full_html_document).write_pdf(
+    pdf_buffer, stylesheets=[stylesheet], font_config=font_config, **options
+  )
+  return pdf_buffer.getvalue()
+
+
+def render_document(full_html_document):
+  """
+  Renders a document in the process's render pool when one is already
+  running, else in this process: starting a pool for a single document would
+  cost more than rendering it.
+  """
+  pool = running_render_pool()
+  if pool is not None:
+    try:
+      return pool.render(full_html_document)
+    except RenderPoolUnavailableError as e:
+      logger.warning(f"Rendering in process: {e}")
+  return write_document(full_html_document)
+
+
+def render_pdf_bytes(html_content, active_assets):
+  """Renders the report HTML with its header, footer and signature to PDF bytes."""
+  return render_document(build_document(html_content, active_assets))
+
+
+def _record(hit):
+  try:
+    record_cache_event(CACHE_NAME, hit)
+  except Exception as e:
+    logger.warning(f"Could not update PDF cache counters: {e}")
+
+
+def _cached_row(cache_key):
+  """The cache row of a key, or None. Tolerates duplicate rows for the key."""
+  return next(iter(app_tables.pdf_cache.search(cache_key=cache_key)), None)
+
+
+def cached_pdf(cache_key):
+  """
+  Returns the cached PDF Media of `cache_key`, or None on a miss. Cache
+  errors are treated as a miss.
+  """
+  pdf = None
+  try:
+    row = _cached_row(cache_key)
+    if row is not None:
+      pdf = row["pdf"]
+      row["last_used"] = datetime.now()
+  except Exception as e:
+    logger.warning(f"Could not read the PDF cache: {e}")
+  _record(pdf is not None)
+  return pdf
+
+
+@tables.in_transaction
+def _store_row(cache_key, pdf_media):
+  """Adds a cache entry, unless a concurrent miss on the same PDF already did."""
+  if _cached_row(cache_key) is not None:
+    return
+  now = datetime.now()
+  app_tables.pdf_cache.add_row(
+    cache_key=cache_key, pdf=pdf_media, created=now, last_used=now
+  )
+
+
+def store_pdf(cache_key, pdf_media):
+  """Caches a rendered PDF. Never raises: a cache write must not fail an export."""
+  try:
+    _store_row(cache_key, pdf_media)
+    evict_pdf_cache()
+  except Exception as e:
+    logger.warning(f"Could not store PDF in cache: {e}")
 
+
+def as_pdf_media(pdf_bytes, name="report.pdf"):
+  """Wraps PDF bytes as downloadable Media."""
+  return anvil.BlobMedia(content_type="application/pdf", content=pdf_bytes, name=name)
+
+
+def render_pdf(html_content, active_assets):
+  """
+  Returns the PDF of a report as Media, rendering it only when the same HTML
+  has not already been rendered with the same assets.
+  """
+  cache_key = pdf_cache_key(html_content, active_assets)
+  cached = cached_pdf(cache_key)
+  if cached is not None:
+    logger.info("PDF cache hit. Skipping rendering.")
+    return cached
+
+  logger.info("PDF cache miss.")
+  media = as_pdf_media(render_pdf_bytes(html_content, active_assets))
+  store_pdf(cache_key, media)
+  return media
+
+
+def evict_pdf_cache():
+  """Removes expired entries, then the least recently used ones above MAX_ENTRIES."""
+  cutoff = datetime.now() - MAX_ENTRY_AGE
+  removed = 0
+  for row in app_tables.pdf_cache.search(last_used=q.less_than(cutoff)):
+    row.delete()
+    removed += 1
+
+  overflow = len(app_tables.pdf_cache.search()) - MAX_ENTRIES
+  if overflow > 0:
+    oldest = app_tables.pdf_cache.search(tables.order_by("last_used", ascending=True))
+    for row in list(oldest[:overflow]):
+      row.delete()
+      removed += 1
+
+  if removed:
+    logger.info(f"Evicted {removed} PDF cache entries.")
+  return removed
+
+
+@anvil.server.callable(require_user=True)
+def generate_pdf_from_html(html_content):
+  """
+  Generates a PDF from HTML with the user's header, footer and signature,
+  resolved in process by assets_service.active_assets_for.
+  """
+  logger.info("Starting PDF generation using the new asset service.")
+
+  try:
+    active_assets = active_assets_for(anvil.users.get_user(allow_remembered=True))
+    pdf_media = render_pdf(html_content, active_assets)
     logger.info("PDF generation with dynamic assets successful.")
     return pdf_media
 
   except Exception as e:
     logger.error(f"Failed to generate PDF with WeasyPrint: {e}", exc_info=True)
     raise Exception(f"PDF generation failed on the server: {e}")
+
+
+@anvil.server.callable
+@admin_required
+def admin_get_pdf_cache_stats():
+  """Admin function returning the PDF cache counters and size."""
+  stats = get_cache_counters(CACHE_NAME)
+  stats["entries"] = len(app_tables.pdf_cache.search())
+  stats["max_entries"] = MAX_ENTRIES
+  stats["max_age_days"] = MAX_ENTRY_AGE.days
+  stats["memoized_assets"] = len(_asset_data_uris)
+  return stats
+
+
+def _median_ms(durations):
+  ordered = sorted(durations)
+  return round(ordered[len(ordered) // 2] * 1000, 1)
+
+
+@anvil.server.callable
+@admin_required
+def admin_benchmark_pdf_rendering(email, runs=10):
+  """
+  Admin function timing the export of the latest report of the user with
+  `email`: a cold in-process render, the same render with memoized assets and
+  stylesheet, a render by a warm pool worker, and a PDF cache hit. Runs as a
+  background task.
+  """
+  logger.info("Launching PDF rendering benchmark background task...")
+  return anvil.server.launch_background_task(
+    "bg_benchmark_pdf_rendering", email, runs
+  )
+
+
+@anvil.server.background_task
+def bg_benchmark_pdf_rendering(email, runs):
+  """Background task behind admin_benchmark_pdf_rendering."""
+  user_row = app_tables.users.get(email=email)
+  if not user_row:
+    raise ValueError(f"User '{email}' not found.")
+  latest = app_tables.reports.search(
+    tables.order_by("last_modified", ascending=False), vet=user_row
+  )
+  if not len(latest):
+    raise ValueError(f"User '{email}' has no report.")
+  html_content = read_body(latest[0]) or ""
+  active_assets = active_assets_for(user_row)
+
+  cold = []
+  for _ in range(runs):
+    clear_render_memos()
+    started = time.perf_counter()
+    write_document(build_document(html_content, active_assets))
+    cold.append(time.perf_counter() - started)
+
+  memoized = []
+  for _ in range(runs):
+    started = time.perf_counter()
+    write_document(build_document(html_content, active_assets))
+    memoized.append(time.perf_counter() - started)
+
+  # The first pooled render waits for the workers' warm-up.
+  render_pdf_bytes(html_content, active_assets)
+  pooled = []
+  for _ in range(runs):
+    started = time.perf_counter()
+    render_pdf_bytes(html_content, active_assets)
+    pooled.append(time.perf_counter() - started)
+
+  render_pdf(html_content, active_assets)
+  cached = []
+  for _ in range(runs):
+    started = time.perf_counter()
+    render_pdf(html_content, active_assets).get_bytes()
+    cached.append(time.perf_counter() - started)
+
+  result = {
+    "runs": runs,
+    "html_bytes": len(html_content.encode("utf-8")),
+    "cold_p50_ms": _median_ms(cold),
+    "memoized_p50_ms": _median_ms(memoized),
+    "pooled_p50_ms": _median_ms(pooled),
+    "cached_p50_ms": _median_ms(cached),
+  }
+  logger.info(f"PDF rendering benchmark for '{email}': {result}")
+  return result
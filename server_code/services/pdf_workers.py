@@ -0,0 +1,466 @@
+import anvil.server
+import itertools
+import math
+import multiprocessing
+import os
+import queue
+import resource
+import threading
+import time
+from concurrent.futures import Future
+from ..auth import admin_required
+from ..logging_server import get_logger
+
+logger = get_logger(__name__)
+
+# --- Render pool limits (per server process) ---
+POOL_SIZE = max(1, min(4, (os.cpu_count() or 2) - 1))
+JOB_TIMEOUT_SECONDS = 60
+# Jobs still waiting for a worker after this long are failed.
+QUEUE_TIMEOUT_SECONDS = 300
+# Address space a worker may add to its warmed-up footprint while rendering.
+MEMORY_CAP_MB = 1024
+# Workers are replaced after this many jobs, which bounds any slow leak.
+MAX_JOBS_PER_WORKER = 200
+WATCHDOG_INTERVAL_SECONDS = 0.5
+# Workers that die before finishing their warm-up this many times mark the
+# pool unavailable, instead of being restarted forever.
+MAX_STARTUP_FAILURES = 3
+# Anvil may run each server call and background task in a fresh process, where
+# the pool starts cold: its workers must start and warm up before the first
+# render. Batches smaller than this are rendered in process unless the pool is
+# already running. admin_benchmark_pdf_render_pool measures the break-even.
+MIN_POOL_DOCUMENTS = 8
+# The forkserver starts workers from a clean single-threaded process, so they
+# inherit neither the Anvil connection nor locks held by server threads.
+START_METHOD = "forkserver"
+
+_WARM_UP_DOCUMENT = "<h1>Warm-up</h1><h2>Warm-up</h2><p>Warm-up</p>"
+
+
+class RenderTimeoutError(Exception):
+  """Raised for a job whose render exceeded the pool's job timeout."""
+
+
+class RenderWorkerError(Exception):
+  """Raised for a job whose worker failed or stopped while rendering it."""
+
+
+class RenderPoolUnavailableError(Exception):
+  """Raised for jobs the pool cannot take; callers render in process instead."""
+
+
+def _address_space_bytes():
+  try:
+    with open("/proc/self/statm") as statm:
+      return int(statm.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+  except (OSError, ValueError):
+    return None
+
+
+def _worker_main(worker_id, jobs, results, current_job, memory_cap_mb, max_jobs):
+  """
+  Entry point of a render worker process. Renders one warm-up document, so
+  that font discovery and the stylesheet are done before the first job, then
+  renders jobs from `jobs` until it has done `max_jobs` or gets None. The id
+  of the job being rendered is kept in the shared `current_job`, which,
+  unlike a queued message, survives the worker being killed.
+  """
+  from .pdf_service import write_document
+
+  image_cache = {}
+  write_document(_WARM_UP_DOCUMENT, image_cache)
+  footprint = _address_space_bytes()
+  if memory_cap_mb and footprint:
+    cap = footprint + memory_cap_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (cap, cap))
+  results.put(("ready", worker_id, None, None))
+
+  for _ in range(max_jobs):
+    job = jobs.get()
+    if job is None:
+      return
+    job_id, document = job
+    current_job.value = job_id
+    try:
+      results.put(("done", worker_id, job_id, write_document(document, image_cache)))
+    except MemoryError:
+      results.put(
+        ("failed", worker_id, job_id, f"The render exceeded {memory_cap_mb} MB.")
+      )
+      # The heap may be fragmented past the cap; a fresh worker replaces it.
+      return
+    except Exception as e:
+      results.put(("failed", worker_id, job_id, str(e)))
+    finally:
+      # The result is queued, and is flushed even if this worker then exits.
+      current_job.value = -1
+
+
+class RenderPool:
+  """
+  Long-lived worker processes rendering documents from build_document to PDF
+  bytes. Jobs go through one local queue; a watchdog thread in this process
+  collects the results, fails jobs that run past `job_timeout` by killing
+  their worker, and replaces workers that stop.
+  """
+
+  def __init__(
+    self,
+    size=POOL_SIZE,
+    job_timeout=JOB_TIMEOUT_SECONDS,
+    memory_cap_mb=MEMORY_CAP_MB,
+    max_jobs_per_worker=MAX_JOBS_PER_WORKER,
+  ):
+    self.size = size
+    self.job_timeout = job_timeout
+    self.memory_cap_mb = memory_cap_mb
+    self.max_jobs_per_worker = max_jobs_per_worker
+    self._context = multiprocessing.get_context(START_METHOD)
+    self._jobs = self._context.Queue()
+    self._results = self._context.Queue()
+    self._lock = threading.Lock()
+    self._job_ids = itertools.count()
+    self._worker_ids = itertools.count()
+    self._workers = {}
+    # worker id -> shared id of the job it renders, -1 when idle
+    self._current_jobs = {}
+    self._ready = set()
+    self._startup_failures = 0
+    # worker id -> (job id, started at)
+    self._running = {}
+    # job id -> (future, submitted at)
+    self._pending = {}
+    self._closed = False
+    self.stats = {"completed": 0, "failed": 0, "timeouts": 0, "restarts": 0}
+
+    for _ in range(size):
+      self._spawn()
+    self._watchdog = threading.Thread(
+      target=self._watch, name="pdf-render-watchdog", daemon=True
+    )
+    self._watchdog.start()
+
+  def _spawn(self):
+    worker_id = next(self._worker_ids)
+    current_job = self._context.Value("q", -1, lock=False)
+    process = self._context.Process(
+      target=_worker_main,
+      args=(
+        worker_id,
+        self._jobs,
+        self._results,
+        current_job,
+        self.memory_cap_mb,
+        self.max_jobs_per_worker,
+      ),
+      name=f"pdf-render-{worker_id}",
+      daemon=True,
+    )
+    process.start()
+    self._workers[worker_id] = process
+    self._current_jobs[worker_id] = current_job
+
+  def submit(self, document):
+    """Queues a document for rendering. Returns a Future of its PDF bytes."""
+    future = Future()
+    with self._lock:
+      if self._closed:
+        raise RenderPoolUnavailableError("The PDF render pool is closed.")
+      job_id = next(self._job_ids)
+      self._pending[job_id] = (future, time.monotonic())
+    self._jobs.put((job_id, document))
+    return future
+
+  def render(self, document):
+    """Renders a document in the pool and returns its PDF bytes."""
+    return self.submit(document).result()
+
+  def _resolve(self, job_id, result=None, error=None):
+    with self._lock:
+      entry = self._pending.pop(job_id, None)
+    if entry is None:
+      # Already failed by the watchdog.
+      return
+    future = entry[0]
+    if error is None:
+      self.stats["completed"] += 1
+      future.set_result(result)
+    else:
+      self.stats["failed"] += 1
+      future.set_exception(error)
+
+  def _handle(self, kind, worker_id, job_id, payload):
+    if kind == "ready":
+      self._ready.add(worker_id)
+      return
+    if kind == "done":
+      self._resolve(job_id, result=payload)
+    else:
+      self._resolve(job_id, error=RenderWorkerError(payload))
+
+  def _track_running(self, worker_id, now):
+    """Notes when each worker started its current job, as seen from here."""
+    job_id = self._current_jobs[worker_id].value
+    running = self._running.get(worker_id)
+    if job_id < 0:
+      self._running.pop(worker_id, None)
+      return None
+    if running is None or running[0] != job_id:
+      running = self._running[worker_id] = (job_id, now)
+    return running
+
+  def _check_workers(self):
+    now = time.monotonic()
+    for worker_id, process in list(self._workers.items()):
+      running = self._track_running(worker_id, now)
+      if running and now - running[1] > self.job_timeout and process.is_alive():
+        logger.warning(
+          f"PDF render job {running[0]} exceeded {self.job_timeout}s; "
+          f"killing worker {worker_id}."
+        )
+        process.kill()
+        process.join(1)
+        self._running.pop(worker_id)
+        self.stats["timeouts"] += 1
+        self._resolve(
+          running[0],
+          error=RenderTimeoutError(
+            f"The PDF took more than {self.job_timeout}s to render."
+          ),
+        )
+      if process.is_alive():
+        continue
+      del self._workers[worker_id]
+      del self._current_jobs[worker_id]
+      running = self._running.pop(worker_id, None)
+      if running:
+        self._resolve(
+          running[0],
+          error=RenderWorkerError(
+            f"The render worker stopped with exit code {process.exitcode}."
+          ),
+        )
+      if worker_id not in self._ready:
+        self._startup_failures += 1
+        if self._startup_failures >= MAX_STARTUP_FAILURES:
+          logger.error(
+            f"PDF render workers failed to start {self._startup_failures} times "
+            f"(last exit code {process.exitcode}); closing the pool."
+          )
+          self.close(RenderPoolUnavailableError("The PDF render workers cannot start."))
+          return
+      self._ready.discard(worker_id)
+      if not self._closed:
+        self.stats["restarts"] += 1
+        self._spawn()
+
+  def _expire_queued(self):
+    now = time.monotonic()
+    started = {job_id for job_id, _ in self._running.values()}
+    with self._lock:
+      expired = [
+        job_id
+        for job_id, (_, submitted_at) in self._pending.items()
+        if job_id not in started and now - submitted_at > QUEUE_TIMEOUT_SECONDS
+      ]
+    for job_id in expired:
+      self._resolve(
+        job_id,
+        error=RenderTimeoutError(
+          f"No render worker was free within {QUEUE_TIMEOUT_SECONDS}s."
+        ),
+      )
+
+  def _watch(self):
+    # Results are only read here, so _running needs no lock.
+    while not self._closed:
+      try:
+        self._handle(*self._results.get(timeout=WATCHDOG_INTERVAL_SECONDS))
+        # Drain what else arrived before looking at the workers.
+        while True:
+          self._handle(*self._results.get_nowait())
+      except queue.Empty:
+        pass
+      self._check_workers()
+      self._expire_queued()
+
+  def describe(self):
+    """Returns the settings, workers and counters of the pool."""
+    return {
+      "size": self.size,
+      "job_timeout_seconds": self.job_timeout,
+      "memory_cap_mb": self.memory_cap_mb,
+      "alive_workers": sum(1 for p in self._workers.values() if p.is_alive()),
+      "running_jobs": len(self._running),
+      "queued_jobs": max(0, len(self._pending) - len(self._running)),
+      **self.stats,
+    }
+
+  @property
+  def closed(self):
+    return self._closed
+
+  def close(self, error=None):
+    """Stops the workers. Jobs not finished yet fail with `error`."""
+    with self._lock:
+      self._closed = True
+      pending = list(self._pending)
+    for _ in self._workers:
+      self._jobs.put(None)
+    for process in list(self._workers.values()):
+      process.join(2)
+      if process.is_alive():
+        process.kill()
+    error = error or RenderPoolUnavailableError("The PDF render pool was closed.")
+    for job_id in pending:
+      self._resolve(job_id, error=error)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+# Set once the pool could not start, e.g. where the host forbids extra
+# processes, so that callers render in process instead of retrying each time.
+_pool_unavailable = False
+
+
+def get_render_pool():
+  """The render pool of this server process, started on first use, or None."""
+  global _pool, _pool_unavailable
+  if _pool is not None and _pool.closed:
+    return None
+  if _pool is not None or _pool_unavailable:
+    return _pool
+  with _pool_lock:
+    if _pool is None and not _pool_unavailable:
+      try:
+        _pool = RenderPool()
+        logger.info(f"Started the PDF render pool with {_pool.size} worker(s).")
+      except Exception as e:
+        _pool_unavailable = True
+        logger.warning(f"PDF render pool unavailable, rendering in process: {e}")
+  return _pool
+
+
+def running_render_pool():
+  """The render pool of this server process if it is already running, or None."""
+  pool = _pool
+  return pool if pool is not None and not pool.closed else None
+
+
+def render_pool_for(documents):
+  """
+  The render pool to use for `documents` renders, or None to render them in
+  process. A running pool is always used; one is only started for batches of
+  at least MIN_POOL_DOCUMENTS, which repay its cold start.
+  """
+  pool = running_render_pool()
+  if pool is not None or documents < MIN_POOL_DOCUMENTS:
+    return pool
+  return get_render_pool()
+
+
+def configure_render_pool(
+  size=POOL_SIZE,
+  job_timeout=JOB_TIMEOUT_SECONDS,
+  memory_cap_mb=MEMORY_CAP_MB,
+):
+  """Replaces the render pool of this server process with one using these limits."""
+  global _pool, _pool_unavailable
+  with _pool_lock:
+    previous = _pool
+    _pool = RenderPool(size, job_timeout, memory_cap_mb)
+    _pool_unavailable = False
+  if previous is not None:
+    previous.close()
+  return _pool.describe()
+
+
+@anvil.server.callable
+@admin_required
+def admin_get_pdf_render_pool_stats():
+  """
+  Admin function returning the render pool of the process that serves it,
+  without starting one there.
+  """
+  pool = running_render_pool()
+  return pool.describe() if pool else {"running": False}
+
+
+@anvil.server.callable
+@admin_required
+def admin_benchmark_pdf_render_pool(documents=40, paragraphs=60):
+  """
+  Admin function comparing the throughput of rendering `documents` synthetic
+  reports one after the other in process with rendering them in the pool.
+  The pool is a fresh one, so the time it takes to start and render its first
+  document is measured too, as in a process where no pool was running yet.
+  Runs as a background task; its return value includes the smallest batch
+  for which a cold pool beats rendering in process.
+  """
+  logger.info("Launching PDF render pool benchmark background task...")
+  return anvil.server.launch_background_task(
+    "bg_benchmark_pdf_render_pool", documents, paragraphs
+  )
+
+
+@anvil.server.background_task
+def bg_benchmark_pdf_render_pool(documents, paragraphs):
+  """Background task behind admin_benchmark_pdf_render_pool."""
+  from .pdf_service import build_document, write_document
+
+  body = "".join(
+    f"<h2>Section {n}</h2><p>{'Examen clinique sans particularité. ' * 12}</p>"
+    for n in range(paragraphs)
+  )
+  document = build_document(body, {})
+
+  # The first render of a process also loads the fonts and the stylesheet.
+  started = time.perf_counter()
+  write_document(document)
+  in_process_first_seconds = time.perf_counter() - started
+  started = time.perf_counter()
+  for _ in range(documents):
+    write_document(document)
+  in_process_seconds = time.perf_counter() - started
+
+  started = time.perf_counter()
+  try:
+    pool = RenderPool()
+  except Exception as e:
+    raise Exception(f"The PDF render pool could not start on this server: {e}")
+  try:
+    # Time to the first PDF of a cold pool: workers start and warm up first.
+    pool.render(document)
+    cold_start_seconds = time.perf_counter() - started
+    # Lets every worker finish its warm-up, as it would have in service.
+    for future in [pool.submit(document) for _ in range(pool.size)]:
+      future.result()
+    started = time.perf_counter()
+    for future in [pool.submit(document) for _ in range(documents)]:
+      future.result()
+    pool_seconds = time.perf_counter() - started
+  finally:
+    pool.close()
+
+  in_process_each = in_process_seconds / documents
+  pool_each = pool_seconds / documents
+  # A cold pool costs its start-up once, then saves the difference per document.
+  break_even = (
+    math.ceil((cold_start_seconds - pool_each) / (in_process_each - pool_each))
+    if in_process_each > pool_each
+    else None
+  )
+  result = {
+    "documents": documents,
+    "workers": pool.size,
+    "in_process_first_ms": round(in_process_first_seconds * 1000),
+    "pool_cold_start_ms": round(cold_start_seconds * 1000),
+    "in_process_per_second": round(documents / in_process_seconds, 2),
+    "pool_per_second": round(documents / pool_seconds, 2),
+    "speedup": round(in_process_seconds / pool_seconds, 2),
+    "cold_pool_break_even_documents": break_even,
+    "min_pool_documents": MIN_POOL_DOCUMENTS,
+  }
+  logger.info(f"PDF render pool benchmark complete: {result}")
+  return result
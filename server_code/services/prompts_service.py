@@ -1,18 +1,47 @@
 # In server_code/services/ai/prompts_service.py
 import anvil.server
 from anvil.tables import app_tables
+import threading
+import time
 from ..logging_server import get_logger
 logger = get_logger(__name__)
 
+# How long the in-process copy of the prompts table is trusted before reload.
+# The app never writes prompts; edits made to the table directly show up in
+# each server process once its copy expires, i.e. up to this long after.
+PROMPT_CACHE_TTL_SECONDS = 300
+
+_prompt_registry = None
+_prompt_registry_loaded_at = 0.0
+_prompt_registry_lock = threading.Lock()
+
+
+def _load_prompt_registry():
+  """Reads the whole prompts table into a {(task, language): text} mapping."""
+  registry = {}
+  for row in app_tables.prompts.search():
+    registry[(row["task"], row["language"])] = row["text"]
+  logger.debug(f"Prompt registry loaded with {len(registry)} prompt(s).")
+  return registry
+
+
+def _get_prompt_registry():
+  global _prompt_registry, _prompt_registry_loaded_at
+  with _prompt_registry_lock:
+    age = time.monotonic() - _prompt_registry_loaded_at
+    if _prompt_registry is None or age >= PROMPT_CACHE_TTL_SECONDS:
+      _prompt_registry = _load_prompt_registry()
+      _prompt_registry_loaded_at = time.monotonic()
+    return _prompt_registry
+
+
 @anvil.server.callable
 def get_prompt(task, language):
-  """Fetches a specific prompt from the database."""
-  row = app_tables.prompts.get(task=task, language=language)
-  if row:
-    return row["text"]
-    # Fallback to English if the specified language is not found
-  if language != "en":
-    row = app_tables.prompts.get(task=task, language="en")
-    if row:
-      return row["text"]
+  """Fetches a specific prompt from the in-process copy of the prompts table."""
+  registry = _get_prompt_registry()
+  if (task, language) in registry:
+    return registry[(task, language)]
+  # Fallback to English if the specified language is not found
+  if language != "en" and (task, "en") in registry:
+    return registry[(task, "en")]
   return None  # Or raise an error
@@ -0,0 +1,162 @@
+import anvil.server
+import anvil.users
+import anvil.tables as tables
+import anvil.tables.query as q
+from anvil.tables import app_tables
+from datetime import date, timedelta
+from ..auth import admin_required
+from ..logging_server import get_logger
+
+logger = get_logger(__name__)
+
+# Reports without a status are counted under this key, as the client shows them.
+UNSPECIFIED_STATUS = "not_specified"
+SUMMARY_DEFAULT_DAYS = 30
+
+
+def _day_of(last_modified):
+  """Counters are kept per day; last_modified may be a date or a datetime."""
+  if last_modified is None:
+    return None
+  return last_modified.date() if hasattr(last_modified, "date") else last_modified
+
+
+def _bump(vet, statut, day, delta):
+  """Adds `delta` to one status and one day counter, in the caller's transaction."""
+  status_row = app_tables.report_status_counters.get(vet=vet, statut=statut)
+  if status_row is None:
+    status_row = app_tables.report_status_counters.add_row(
+      vet=vet, statut=statut, count=0
+    )
+  status_row["count"] = (status_row["count"] or 0) + delta
+
+  if day is None:
+    return
+  day_row = app_tables.report_day_counters.get(vet=vet, day=day)
+  if day_row is None:
+    day_row = app_tables.report_day_counters.add_row(vet=vet, day=day, count=0)
+  day_row["count"] = (day_row["count"] or 0) + delta
+
+
+def add_report_count(vet, statut, last_modified, delta):
+  """
+  Adds `delta` (+1 or -1) to the status and day counters of a vet. Runs in
+  the caller's transaction, so the counters change with the report or not at
+  all; Anvil transactions do not nest. Drift can still be repaired with
+  admin_rebuild_report_counters.
+  """
+  if vet is None:
+    return
+  _bump(vet, statut or UNSPECIFIED_STATUS, _day_of(last_modified), delta)
+
+
+def move_report_count(vet, old_statut, old_last_modified, new_statut, new_last_modified):
+  """Moves one report between counters, in the caller's transaction."""
+  add_report_count(vet, old_statut, old_last_modified, -1)
+  add_report_count(vet, new_statut, new_last_modified, 1)
+
+
+@anvil.server.callable(require_user=True)
+def get_structure_report_summary(structure_name, days=SUMMARY_DEFAULT_DAYS):
+  """
+  Returns report counts for a structure, read from the precomputed counters.
+  Only supervisors of the structure may call it.
+
+  Returns:
+      dict: {"total", "by_status": {status: n}, "by_vet": [{"email", "name",
+      "total", "by_status"}], "by_day": {"YYYY-MM-DD": n}} where by_day covers
+      the last `days` days of last modification.
+  """
+  current_user = anvil.users.get_user()
+  structure_row = app_tables.structures.get(name=structure_name)
+  if (
+    not structure_row
+    or not current_user["supervisor"]
+    or current_user["structure"] != structure_row
+  ):
+    logger.warning(
+      f"[SECURITY] User '{current_user['email']}' denied the summary of structure '{structure_name}'."
+    )
+    return None
+
+  vets = list(
+    app_tables.users.search(q.fetch_only("name", "email"), structure=structure_row)
+  )
+  summary = {"total": 0, "by_status": {}, "by_vet": [], "by_day": {}}
+  if not vets:
+    return summary
+
+  per_vet = {
+    vet.get_id(): {"email": vet["email"], "name": vet["name"], "total": 0, "by_status": {}}
+    for vet in vets
+  }
+  for row in app_tables.report_status_counters.search(
+    q.fetch_only("statut", "count", vet=q.fetch_only()), vet=q.any_of(*vets)
+  ):
+    count = row["count"] or 0
+    if not count:
+      continue
+    vet_summary = per_vet[row["vet"].get_id()]
+    vet_summary["total"] += count
+    vet_summary["by_status"][row["statut"]] = count
+    summary["total"] += count
+    summary["by_status"][row["statut"]] = summary["by_status"].get(row["statut"], 0) + count
+
+  since = date.today() - timedelta(days=days)
+  for row in app_tables.report_day_counters.search(
+    q.fetch_only("day", "count"),
+    vet=q.any_of(*vets),
+    day=q.greater_than_or_equal_to(since),
+  ):
+    if row["count"]:
+      key = row["day"].strftime("%Y-%m-%d")
+      summary["by_day"][key] = summary["by_day"].get(key, 0) + row["count"]
+
+  summary["by_vet"] = sorted(per_vet.values(), key=lambda v: -v["total"])
+  return summary
+
+
+@anvil.server.callable
+@admin_required
+def admin_rebuild_report_counters():
+  """
+  Admin function recomputing every counter from the reports table, for the
+  initial backfill or after drift. Runs as a background task.
+  """
+  logger.info("Launching report counters rebuild background task...")
+  return anvil.server.launch_background_task("bg_rebuild_report_counters")
+
+
+@anvil.server.background_task
+def bg_rebuild_report_counters():
+  """Background task behind admin_rebuild_report_counters."""
+  status_counts = {}
+  day_counts = {}
+  for report in app_tables.reports.search(
+    q.fetch_only("statut", "last_modified", vet=q.fetch_only())
+  ):
+    vet = report["vet"]
+    if vet is None:
+      continue
+    status_key = (vet.get_id(), report["statut"] or UNSPECIFIED_STATUS)
+    status_counts[status_key] = status_counts.get(status_key, 0) + 1
+    day = _day_of(report["last_modified"])
+    if day is not None:
+      day_key = (vet.get_id(), day)
+      day_counts[day_key] = day_counts.get(day_key, 0) + 1
+
+  app_tables.report_status_counters.delete_all_rows()
+  app_tables.report_day_counters.delete_all_rows()
+  vets = {vet_id: app_tables.users.get_by_id(vet_id) for vet_id, _ in status_counts}
+  for (vet_id, statut), count in status_counts.items():
+    app_tables.report_status_counters.add_row(
+      vet=vets[vet_id], statut=statut, count=count
+    )
+  for (vet_id, day), count in day_counts.items():
+    app_tables.report_day_counters.add_row(vet=vets[vet_id], day=day, count=count)
+
+  logger.info(
+    f"Report counters rebuilt: {len(status_counts)} status and "
+    f"{len(day_counts)} day counter(s)."
+  )
+  return {"status_counters": len(status_counts), "day_counters": len(day_counts)}
@@ -0,0 +1,456 @@
+import anvil.server
+import anvil.tables as tables
+import anvil.tables.query as q
+from anvil.tables import app_tables
+import html
+import math
+import random
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from datetime import datetime
+from ..auth import admin_required
+from ..data.report_bodies import read_body
+from ..logging_server import get_logger
+
+logger = get_logger(__name__)
+
+# --- Search settings ---
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+# Matching rows ranked per query, newest first. Older matches beyond this are
+# not ranked, which keeps very common words from scanning a whole archive.
+MAX_RANKED_CANDIDATES = 1000
+# Plain text kept per report for snippets.
+MAX_INDEXED_TEXT_CHARS = 50000
+SNIPPET_CHARS = 160
+# BM25 parameters.
+BM25_K1 = 1.2
+BM25_B = 0.75
+# The document count and the documents per term of a search scope only weigh
+# the ranking, so this process caches them instead of recounting the whole
+# scope on every query.
+CORPUS_STATS_TTL_SECONDS = 600
+MAX_CACHED_CORPUS_STATS = 2000
+_corpus_stats_lock = threading.Lock()
+# (scope key, term or None for the document count) -> (expiry, count)
+_corpus_stats = OrderedDict()
+
+# Letters that Unicode decomposition does not split into a base letter.
+_LIGATURES = str.maketrans({"ß": "ss", "æ": "ae", "œ": "oe", "ø": "o", "ł": "l", "đ": "d"})
+_WORD = re.compile(r"\w+")
+_SKIPPED_BLOCKS = re.compile(r"<(style|script)\b.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+_TAG = re.compile(r"<[^>]+>")
+_SPACES = re.compile(r"\s+")
+
+# Function words of the app's languages, already folded. They match nearly
+# every report and would only slow the search down.
+STOP_WORDS = frozenset(
+  """
+  le la les un une des du de au aux et ou est sont il elle ils elles on en dans
+  par pour sur avec sans ce cet cette ces qui que quoi pas ne plus se sa son ses
+  the an and or is are was were of to in on at by for with without this that it
+  el los las unos unas del al y es son por para con sin este esta que lo su sus
+  der die das ein eine einen dem den des und oder ist sind mit ohne fur auf im
+  zu von bei nicht sich er sie es
+  het een en van op te met voor zonder dat deze die niet zijn is aan bij ook
+  """.split()
+)
+
+
+def fold(text):
+  """Lowercases and strips accents, so 'Lésion' and 'lesion' index alike."""
+  text = text.lower().translate(_LIGATURES)
+  decomposed = unicodedata.normalize("NFKD", text)
+  return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text):
+  """Returns the folded, indexable words of a text, in order."""
+  if not text:
+    return []
+  return [
+    token
+    for token in _WORD.findall(fold(text))
+    if len(token) > 1 and token not in STOP_WORDS
+  ]
+
+
+def plain_text(content):
+  """Strips the HTML of a report body down to its visible text."""
+  if not content:
+    return ""
+  if not isinstance(content, str):
+    content = str(content)
+  content = _SKIPPED_BLOCKS.sub(" ", content)
+  content = _TAG.sub(" ", content)
+  return _SPACES.sub(" ", html.unescape(content)).strip()
+
+
+def _document(report_rich, transcript):
+  """Returns (text, tokens) for a report: its body first, then its transcript."""
+  text = "\n".join(part for part in (plain_text(report_rich), transcript or "") if part)
+  return text[:MAX_INDEXED_TEXT_CHARS], tokenize(text)
+
+
+# --- Ranking, shared by the table index and the benchmark's stand-in store ---
+def bm25_scores(query_terms, candidates, doc_count, doc_freqs):
+  """
+  Scores candidates with BM25.
+
+  Args:
+      query_terms (list): Folded, distinct query terms.
+      candidates (list): (key, term_counts, length) tuples.
+      doc_count (int): Documents in the searched collection.
+      doc_freqs (dict): Documents containing each query term.
+
+  Returns:
+      dict: key -> score.
+  """
+  if not candidates:
+    return {}
+  avg_length = sum(length for _, _, length in candidates) / len(candidates) or 1
+  idf = {
+    term: math.log(1 + (doc_count - doc_freqs.get(term, 0) + 0.5) / (doc_freqs.get(term, 0) + 0.5))
+    for term in query_terms
+  }
+  scores = {}
+  for key, counts, length in candidates:
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+    score = 0.0
+    for term in query_terms:
+      tf = counts.get(term, 0)
+      if tf:
+        score += idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+    scores[key] = score
+  return scores
+
+
+def make_snippet(text, query_terms, width=SNIPPET_CHARS):
+  """
+  Cuts the part of `text` around the first query term.
+
+  Returns:
+      dict: {"text", "highlights"} where highlights are [start, end] offsets
+      of the matched words within the snippet text.
+  """
+  terms = set(query_terms)
+  words = list(_WORD.finditer(text or ""))
+  hits = [m for m in words if fold(m.group()) in terms]
+  if not hits:
+    return {"text": (text or "")[:width].strip(), "highlights": []}
+
+  start = max(0, hits[0].start() - width // 3)
+  if start:
+    # Start on a word boundary.
+    start = next((m.start() for m in words if m.start() >= start), hits[0].start())
+  end = min(len(text), start + width)
+  prefix = "…" if start else ""
+  snippet = prefix + text[start:end].rstrip() + ("…" if end < len(text) else "")
+  highlights = [
+    [m.start() - start + len(prefix), m.end() - start + len(prefix)]
+    for m in hits
+    if m.end() <= end
+  ]
+  return {"text": snippet, "highlights": highlights}
+
+
+def _query_terms(query):
+  return list(dict.fromkeys(tokenize(query)))
+
+
+# --- Index maintenance ---
+def index_report(report_row, body):
+  """
+  Adds or refreshes the search entry of a report after it was written, given
+  its HTML body. Never raises: indexing must not fail the save. Missing
+  entries can be rebuilt with admin_rebuild_report_search_index.
+  """
+  try:
+    text, tokens = _document(body, report_row["transcript"])
+    fields = {
+      "vet": report_row["vet"],
+      "terms": " ".join(tokens),
+      "text": text,
+      "length": len(tokens),
+      "last_modified": report_row["last_modified"],
+      "updated_at": datetime.now(),
+    }
+    entry = app_tables.report_search_index.get(report=report_row)
+    if entry is None:
+      app_tables.report_search_index.add_row(report=report_row, **fields)
+    else:
+      entry.update(**fields)
+  except Exception as e:
+    logger.warning(f"Could not index report: {e}")
+
+
+def unindex_report(report_row):
+  """Removes the search entry of a report about to be deleted. Never raises."""
+  try:
+    entry = app_tables.report_search_index.get(report=report_row)
+    if entry is not None:
+      entry.delete()
+  except Exception as e:
+    logger.warning(f"Could not unindex report: {e}")
+
+
+# --- Search ---
+def _corpus_count(scope_key, term, count):
+  """Returns count() for a scope and term, cached for CORPUS_STATS_TTL_SECONDS."""
+  key = (scope_key, term)
+  now = time.monotonic()
+  with _corpus_stats_lock:
+    entry = _corpus_stats.get(key)
+    if entry is not None and entry[0] > now:
+      _corpus_stats.move_to_end(key)
+      return entry[1]
+  value = count()
+  with _corpus_stats_lock:
+    _corpus_stats[key] = (now + CORPUS_STATS_TTL_SECONDS, value)
+    _corpus_stats.move_to_end(key)
+    while len(_corpus_stats) > MAX_CACHED_CORPUS_STATS:
+      _corpus_stats.popitem(last=False)
+  return value
+
+
+def search_index(vets, query, limit=SEARCH_DEFAULT_LIMIT, date_from=None, date_to=None):
+  """
+  Ranks the reports of `vets` matching every word of `query`.
+
+  Rows are matched with the table's full-text search over the folded terms,
+  then the newest MAX_RANKED_CANDIDATES are ranked with BM25, whose corpus
+  statistics come from _corpus_count.
+
+  Returns:
+      list: (report_row, score, snippet) tuples, best first.
+  """
+  query_terms = _query_terms(query)
+  if not query_terms or not vets:
+    return []
+  limit = max(1, min(int(limit or SEARCH_DEFAULT_LIMIT), SEARCH_MAX_LIMIT))
+
+  scope = {"vet": q.any_of(*vets)}
+  if date_from or date_to:
+    bounds = []
+    if date_from:
+      bounds.append(q.greater_than_or_equal_to(date_from))
+    if date_to:
+      bounds.append(q.less_than_or_equal_to(date_to))
+    scope["last_modified"] = q.all_of(*bounds)
+
+  matches = app_tables.report_search_index.search(
+    tables.order_by("updated_at", ascending=False),
+    q.fetch_only("terms", "length", "report"),
+    terms=q.full_text_match(" ".join(query_terms)),
+    **scope,
+  )
+  candidates = []
+  entries = {}
+  for entry in matches:
+    if len(candidates) >= MAX_RANKED_CANDIDATES:
+      break
+    key = entry.get_id()
+    entries[key] = entry
+    candidates.append((key, Counter(entry["terms"].split()), entry["length"] or 0))
+  if not candidates:
+    return []
+
+  scope_key = (tuple(sorted(vet.get_id() for vet in vets)), date_from, date_to)
+  doc_count = _corpus_count(
+    scope_key, None, lambda: len(app_tables.report_search_index.search(**scope))
+  )
+  doc_freqs = {
+    term: _corpus_count(
+      scope_key,
+      term,
+      lambda term=term: len(
+        app_tables.report_search_index.search(terms=q.full_text_match(term), **scope)
+      ),
+    )
+    for term in query_terms
+  }
+  scores = bm25_scores(query_terms, candidates, doc_count, doc_freqs)
+  # Candidates are newest first and sorted() is stable, so ties stay newest first.
+  best = sorted(scores, key=lambda key: -scores[key])[:limit]
+  return [
+    (
+      entries[key]["report"],
+      round(scores[key], 3),
+      make_snippet(entries[key]["text"], query_terms),
+    )
+    for key in best
+  ]
+
+
+# --- Backfill ---
+@anvil.server.callable
+@admin_required
+def admin_rebuild_report_search_index():
+  """
+  Admin function indexing every report, for the initial backfill or after
+  drift. Runs as a background task.
+  """
+  logger.info("Launching report search index rebuild background task...")
+  return anvil.server.launch_background_task("bg_rebuild_report_search_index")
+
+
+@anvil.server.background_task
+def bg_rebuild_report_search_index():
+  """Background task behind admin_rebuild_report_search_index."""
+  app_tables.report_search_index.delete_all_rows()
+  indexed = 0
+  for report_row in app_tables.reports.search():
+    index_report(report_row, read_body(report_row))
+    indexed += 1
+    if indexed % 500 == 0:
+      anvil.server.task_state["indexed"] = indexed
+  logger.info(f"Report search index rebuilt: {indexed} report(s).")
+  return {"indexed": indexed}
+
+
+# --- BENCHMARK ON A LOCAL STAND-IN STORE ---
+class MemorySearchStore:
+  """
+  In-memory stand-in for the report_search_index table: an inverted index
+  with the same tokenizer and ranking, used to benchmark them at a scale the
+  data tables of a test app do not hold.
+  """
+
+  def __init__(self):
+    self._postings = {}
+    self._docs = {}
+    self._by_vet = {}
+
+  def put(self, key, vet, report_rich, transcript):
+    self.delete(key)
+    text, tokens = _document(report_rich, transcript)
+    counts = Counter(tokens)
+    self._docs[key] = (vet, text, counts, len(tokens))
+    self._by_vet.setdefault(vet, set()).add(key)
+    for term in counts:
+      self._postings.setdefault(term, set()).add(key)
+
+  def delete(self, key):
+    doc = self._docs.pop(key, None)
+    if doc is None:
+      return
+    self._by_vet[doc[0]].discard(key)
+    for term in doc[2]:
+      keys = self._postings.get(term)
+      keys.discard(key)
+      if not keys:
+        del self._postings[term]
+
+  def search(self, vet, query, limit=SEARCH_DEFAULT_LIMIT):
+    query_terms = _query_terms(query)
+    postings = [self._postings.get(term, set()) for term in query_terms]
+    if not postings:
+      return []
+    vet_docs = self._by_vet.get(vet, set())
+    matched = set.intersection(*postings) & vet_docs
+    candidates = [
+      (key, self._docs[key][2], self._docs[key][3])
+      for key in sorted(matched, reverse=True)[:MAX_RANKED_CANDIDATES]
+    ]
+    doc_freqs = {term: len(keys & vet_docs) for term, keys in zip(query_terms, postings)}
+    scores = bm25_scores(query_terms, candidates, len(vet_docs), doc_freqs)
+    best = sorted(scores, key=lambda key: -scores[key])[:limit]
+    return [
+      (key, scores[key], make_snippet(self._docs[key][1], query_terms))
+      for key in best
+    ]
+
+  def term_count(self):
+    return len(self._postings)
+
+
+# Vocabulary of the synthetic reports, mixing the app's languages and accents.
+_BENCHMARK_WORDS = (
+  "fourbure laminitis boiterie lésion œdème fièvre vomissement diarrhée "
+  "cojera fiebre lesión hinchazón vómito herida pezuña "
+  "Hufrehe Lahmheit Schwellung Läsion Fieber Durchfall Hüfte Größe "
+  "hoefbevangenheid kreupelheid zwelling koorts diarree wond "
+  "radiographie échographie antibiotique anti-inflammatoire pansement suture"
+).split()
+
+
+def _synthetic_report(rng, filler):
+  words = [rng.choice(filler) for _ in range(rng.randint(80, 250))]
+  for _ in range(rng.randint(1, 4)):
+    words.insert(rng.randrange(len(words)), rng.choice(_BENCHMARK_WORDS))
+  body = " ".join(words)
+  return f"<h2>Compte rendu</h2><p>{body}</p>", body[: len(body) // 2]
+
+
+def _percentile(values, fraction):
+  ordered = sorted(values)
+  return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+@anvil.server.callable
+@admin_required
+def admin_benchmark_report_search(report_count=100000, vet_count=20, queries=200):
+  """
+  Admin function benchmarking the search index on MemorySearchStore with
+  `report_count` synthetic reports spread over `vet_count` vets. Runs as a
+  background task; its return value holds the index build time, the query
+  latencies and the update and delete costs.
+  """
+  logger.info("Launching report search benchmark background task...")
+  return anvil.server.launch_background_task(
+    "bg_benchmark_report_search", report_count, vet_count, queries
+  )
+
+
+@anvil.server.background_task
+def bg_benchmark_report_search(report_count, vet_count, queries):
+  """Background task behind admin_benchmark_report_search."""
+  rng = random.Random(42)
+  filler = [
+    "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 10)))
+    for _ in range(20000)
+  ]
+  store = MemorySearchStore()
+
+  started = time.perf_counter()
+  for key in range(report_count):
+    report_rich, transcript = _synthetic_report(rng, filler)
+    store.put(key, key % vet_count, report_rich, transcript)
+  build_seconds = time.perf_counter() - started
+
+  latencies = []
+  hits = 0
+  for _ in range(queries):
+    words = rng.sample(_BENCHMARK_WORDS, rng.choice([1, 1, 2]))
+    started = time.perf_counter()
+    hits += len(store.search(rng.randrange(vet_count), " ".join(words)))
+    latencies.append(time.perf_counter() - started)
+
+  started = time.perf_counter()
+  for key in range(min(1000, report_count)):
+    report_rich, transcript = _synthetic_report(rng, filler)
+    store.put(key, key % vet_count, report_rich, transcript)
+  update_ms = (time.perf_counter() - started) * 1000 / max(1, min(1000, report_count))
+
+  started = time.perf_counter()
+  for key in range(min(1000, report_count)):
+    store.delete(key)
+  delete_ms = (time.perf_counter() - started) * 1000 / max(1, min(1000, report_count))
+
+  result = {
+    "reports": report_count,
+    "vets": vet_count,
+    "terms": store.term_count(),
+    "build_seconds": round(build_seconds, 1),
+    "query_p50_ms": round(_percentile(latencies, 0.5) * 1000, 1),
+    "query_p95_ms": round(_percentile(latencies, 0.95) * 1000, 1),
+    "query_max_ms": round(max(latencies) * 1000, 1),
+    "avg_results": round(hits / queries, 1),
+    "update_ms": round(update_ms, 3),
+    "delete_ms": round(delete_ms, 3),
+  }
+  logger.info(f"Report search benchmark complete: {result}")
+  return result
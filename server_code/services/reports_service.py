@@ -6,6 +6,17 @@ from anvil.tables import app_tables
 import anvil.server
 import json
 import openai
+import time
+from datetime import datetime, timedelta
+from ..auth import admin_required
+from ..data.reports import (
+  report_summary,
+  REPORT_STATUSES,
+  SUMMARY_FETCH,
+  TOMBSTONE_RETENTION,
+)
+from ..data.report_bodies import read_body
+from .report_search import search_index, SEARCH_DEFAULT_LIMIT
 from ..logging_server import get_logger
 logger = get_logger(__name__)
 
@@ -16,7 +27,7 @@ def get_status_options():
   Returns the list of valid, English-keyed report statuses.
   This acts as a single source of truth for the application.
   """
-  return ["pending_correction", "validated", "sent", "not_specified"]
+  return list(REPORT_STATUSES)
 
 
 @anvil.server.callable
@@ -282,52 +293,328 @@ def load_report_content(clicked_value):
     return None, f"No report found with fileName: {file_name}"
 
 
-@anvil.server.callable
+# Only the columns a structure listing shows are loaded, linked rows included,
+# so iterating the results never triggers a lazy fetch per report.
+STRUCTURE_REPORT_FETCH = q.fetch_only(
+  "file_name",
+  "last_modified",
+  "statut",
+  animal=q.fetch_only("name"),
+  vet=q.fetch_only(),
+)
+
+
+def _structure_vets_by_id(structure_row):
+  """Loads the structure's users once, keyed by row id."""
+  user_rows = app_tables.users.search(
+    q.fetch_only("name", "email"), structure=structure_row
+  )
+  return {user_row.get_id(): user_row for user_row in user_rows}
+
+
+def _structure_report_entry(report_row, vets_by_id):
+  """Builds a structure listing entry, joining the vet from the prefetched map."""
+  animal_row = report_row["animal"]
+  vet_row = report_row["vet"]
+  vet = vets_by_id.get(vet_row.get_id()) if vet_row else None
+  return {
+    "id": report_row.get_id(),
+    "file_name": report_row["file_name"],
+    "name": animal_row["name"] if animal_row else None,
+    "last_modified": (
+      report_row["last_modified"].strftime("%Y-%m-%d %H:%M:%S")
+      if report_row["last_modified"]
+      else None
+    ),
+    "owner_email": vet["email"] if vet else None,
+    "statut": report_row["statut"],
+    "vet_display_name": (vet["name"] or vet["email"]) if vet else "Unknown Vet",
+  }
+
+
+def _structure_reports(structure_row):
+  """Summaries of every report of the structure's vets, newest first. No access check."""
+  vets_by_id = _structure_vets_by_id(structure_row)
+  if not vets_by_id:
+    return []
+  reports_query = app_tables.reports.search(
+    STRUCTURE_REPORT_FETCH,
+    tables.order_by("last_modified", ascending=False),
+    vet=q.any_of(*vets_by_id.values()),
+  )
+  return [_structure_report_entry(row, vets_by_id) for row in reports_query]
+
+
+@anvil.server.callable(require_user=True)
 def get_reports_by_structure(structure_name):
+  """
+  Returns the summaries of every report written by the vets of a structure,
+  newest first. Report content is fetched with read_report when opened.
+  Only supervisors of the structure may call it.
+  """
   print(
     f"DEBUG: Entering get_reports_by_structure with structure_name='{structure_name}'"
   )
+  current_user = anvil.users.get_user()
+  structure_row = app_tables.structures.get(name=structure_name)
+  if (
+    not structure_row
+    or not current_user["supervisor"]
+    or current_user["structure"] != structure_row
+  ):
+    logger.warning(
+      f"[SECURITY] User '{current_user['email']}' denied the reports of structure '{structure_name}'."
+    )
+    return []
   try:
+    results = _structure_reports(structure_row)
+    print(f"DEBUG: Returning {len(results)} report(s) for structure '{structure_name}'")
+    return results
+  except Exception as e:
+    print(f"ERROR: Unexpected error in get_reports_by_structure: {e}")
+    return []
+
+
+# The returned high-water mark is moved back by this margin, so that a write
+# committed while the sync query ran is sent again next time rather than lost.
+SYNC_OVERLAP = timedelta(seconds=5)
+
+
+@anvil.server.callable(require_user=True)
+def sync_reports(since=None, structure_name=None):
+  """
+  Delta sync for the client report cache.
+
+  Args:
+      since (str | None): The opaque `sync_token` returned by the previous
+          sync. None only returns a token, to be taken before a full load.
+      structure_name (str | None): Also sync the structure's reports, for its
+          supervisors.
+
+  Returns:
+      dict: {"sync_token", "full_resync", "changed", "deleted",
+      "structure_changed", "structure_deleted"}. Changed entries have the same
+      shape as list_reports and get_reports_by_structure entries; deleted
+      entries are report ids. When `full_resync` is True, `since` predates the
+      kept deletions and the client must reload its lists instead.
+  """
+  current_user = anvil.users.get_user()
+  now = datetime.now()
+  result = {
+    "sync_token": (now - SYNC_OVERLAP).isoformat(),
+    "full_resync": False,
+    "changed": [],
+    "deleted": [],
+    "structure_changed": [],
+    "structure_deleted": [],
+  }
+  if since is None:
+    return result
+  # A string keeps the token naive server time, as the columns it is compared to.
+  since = datetime.fromisoformat(since)
+  if since < now - TOMBSTONE_RETENTION:
+    result["full_resync"] = True
+    return result
+
+  result["changed"] = [
+    report_summary(row)
+    for row in app_tables.reports.search(
+      SUMMARY_FETCH,
+      tables.order_by("updated_at", ascending=False),
+      vet=current_user,
+      updated_at=q.greater_than(since),
+    )
+  ]
+  result["deleted"] = [
+    tombstone["report_id"]
+    for tombstone in app_tables.report_tombstones.search(
+      vet=current_user, deleted_at=q.greater_than(since)
+    )
+  ]
+
+  structure_row = app_tables.structures.get(name=structure_name) if structure_name else None
+  vets_by_id = {}
+  if (
+    structure_row
+    and current_user["supervisor"]
+    and current_user["structure"] == structure_row
+  ):
+    vets_by_id = _structure_vets_by_id(structure_row)
+  if vets_by_id:
+    vets = q.any_of(*vets_by_id.values())
+    result["structure_changed"] = [
+      _structure_report_entry(row, vets_by_id)
+      for row in app_tables.reports.search(
+        STRUCTURE_REPORT_FETCH,
+        tables.order_by("updated_at", ascending=False),
+        vet=vets,
+        updated_at=q.greater_than(since),
+      )
+    ]
+    result["structure_deleted"] = [
+      tombstone["report_id"]
+      for tombstone in app_tables.report_tombstones.search(
+        vet=vets, deleted_at=q.greater_than(since)
+      )
+    ]
+
+  logger.debug(
+    f"sync_reports since {since}: {len(result['changed'])} changed, "
+    f"{len(result['deleted'])} deleted, {len(result['structure_changed'])} "
+    f"structure changed, {len(result['structure_deleted'])} structure deleted."
+  )
+  return result
+
+
+@anvil.server.callable(require_user=True)
+def search_report_content(
+  query, structure_name=None, limit=SEARCH_DEFAULT_LIMIT, date_from=None, date_to=None
+):
+  """
+  Full-text search inside report bodies and transcripts, ranked by relevance.
+  Accents and case are ignored and every word of `query` must match.
+
+  Args:
+      query (str): The words to look for.
+      structure_name (str | None): Search the whole structure's reports
+          instead of the caller's own, for its supervisors.
+      limit (int): Maximum results, capped at SEARCH_MAX_LIMIT.
+      date_from (date | None): Only reports last modified on or after it.
+      date_to (date | None): Only reports last modified on or before it.
+
+  Returns:
+      list: Listing entries, best first, each with "score" and "snippet"
+      ({"text", "highlights"}). Structure entries also carry the vet.
+  """
+  current_user = anvil.users.get_user()
+  vets_by_id = {}
+  if structure_name:
     structure_row = app_tables.structures.get(name=structure_name)
-    if not structure_row:
+    if (
+      not structure_row
+      or not current_user["supervisor"]
+      or current_user["structure"] != structure_row
+    ):
+      logger.warning(
+        f"[SECURITY] User '{current_user['email']}' denied the search of structure '{structure_name}'."
+      )
       return []
+    vets_by_id = _structure_vets_by_id(structure_row)
+    vets = list(vets_by_id.values())
+  else:
+    vets = [current_user]
+
+  results = []
+  for report_row, score, snippet in search_index(
+    vets, query, limit, date_from=date_from, date_to=date_to
+  ):
+    entry = (
+      _structure_report_entry(report_row, vets_by_id)
+      if structure_name
+      else report_summary(report_row)
+    )
+    entry["score"] = score
+    entry["snippet"] = snippet
+    results.append(entry)
+  logger.debug(f"search_report_content: {len(results)} result(s) for '{query}'.")
+  return results
 
-    users_in_structure = app_tables.users.search(structure=structure_row)
-    user_rows = list(users_in_structure)
-    if not user_rows:
-      return []
 
-    reports_query = app_tables.reports.search(
-      tables.order_by("last_modified", ascending=False), vet=q.any_of(*user_rows)
-    )
+@anvil.server.callable
+@admin_required
+def admin_benchmark_structure_reports(structure_name):
+  """
+  Admin function timing the structure listing against the former per-row
+  link traversal on a real structure. Runs as a background task; its return
+  value holds the row count and both durations.
+  """
+  logger.info("Launching structure listing benchmark background task...")
+  return anvil.server.launch_background_task(
+    "bg_benchmark_structure_reports", structure_name
+  )
 
-    results = []
-    for report_row in reports_query:
+
+@anvil.server.background_task
+def bg_benchmark_structure_reports(structure_name):
+  """Background task behind admin_benchmark_structure_reports."""
+  structure_row = app_tables.structures.get(name=structure_name)
+  if not structure_row:
+    raise ValueError(f"Structure '{structure_name}' not found.")
+
+  # The former implementation: every report dereferences its animal and vet.
+  start = time.monotonic()
+  user_rows = list(app_tables.users.search(structure=structure_row))
+  naive_count = 0
+  if user_rows:
+    for report_row in app_tables.reports.search(
+      tables.order_by("last_modified", ascending=False), vet=q.any_of(*user_rows)
+    ):
       animal_row = report_row["animal"]
-      animal_name = animal_row["name"] if animal_row else None
-      dt_str = (
-        report_row["last_modified"].strftime("%Y-%m-%d %H:%M:%S")
-        if report_row["last_modified"]
-        else None
-      )
-      vet_display_name = "Unknown Vet"
+      _ = animal_row["name"] if animal_row else None
       vet_row = report_row["vet"]
       if vet_row:
-        vet_display_name = vet_row["name"] or vet_row["email"]
-
-      results.append({
-        "id": report_row.get_id(),  # --- MODIFIED: Return Anvil's unique Row ID
-        "file_name": report_row["file_name"],
-        "name": animal_name,
-        "last_modified": dt_str,
-        "owner_email": report_row["vet"]["email"] if report_row["vet"] else None,
-        "report_rich": report_row["report_rich"],
-        "statut": report_row["statut"],
-        "vet_display_name": vet_display_name,
-      })
+        _ = (vet_row["name"] or vet_row["email"], vet_row["email"])
+      naive_count += 1
+  naive_ms = round((time.monotonic() - start) * 1000)
 
-    print(f"DEBUG: Returning {len(results)} report(s) for structure '{structure_name}'")
-    return results
-  except Exception as e:
-    print(f"ERROR: Unexpected error in get_reports_by_structure: {e}")
-    return []
\ No newline at end of file
+  start = time.monotonic()
+  batched_count = len(_structure_reports(structure_row))
+  batched_ms = round((time.monotonic() - start) * 1000)
+
+  logger.info(
+    f"Structure listing benchmark on '{structure_name}': {naive_count} report(s), "
+    f"per-row {naive_ms} ms, batched {batched_ms} ms."
+  )
+  return {
+    "reports": batched_count,
+    "per_row_ms": naive_ms,
+    "batched_ms": batched_ms,
+  }
+
+
+@anvil.server.callable
+@admin_required
+def admin_benchmark_archives_payload(email):
+  """
+  Admin function measuring the bytes one Archives load moves for the user
+  with `email`: the listing as sent now, the former listing that carried
+  every body, and the bodies as stored compressed. Runs as a background task.
+  """
+  logger.info("Launching Archives payload benchmark background task...")
+  return anvil.server.launch_background_task("bg_benchmark_archives_payload", email)
+
+
+@anvil.server.background_task
+def bg_benchmark_archives_payload(email):
+  """Background task behind admin_benchmark_archives_payload."""
+  user_row = app_tables.users.get(email=email)
+  if not user_row:
+    raise ValueError(f"User '{email}' not found.")
+
+  report_rows = list(app_tables.reports.search(SUMMARY_FETCH, vet=user_row))
+  listing_bytes = sum(len(json.dumps(report_summary(row))) for row in report_rows)
+  body_bytes = sum(len(json.dumps(read_body(row) or "")) for row in report_rows)
+
+  stored = {"bodies": 0, "size": 0, "stored_size": 0}
+  if report_rows:
+    for body_row in app_tables.report_bodies.search(
+      q.fetch_only("size", "stored_size"), report=q.any_of(*report_rows)
+    ):
+      stored["bodies"] += 1
+      stored["size"] += body_row["size"] or 0
+      stored["stored_size"] += body_row["stored_size"] or 0
+
+  result = {
+    "reports": len(report_rows),
+    "listing_bytes": listing_bytes,
+    "former_listing_bytes": listing_bytes + body_bytes,
+    "reduction": (
+      round((listing_bytes + body_bytes) / listing_bytes, 1) if listing_bytes else None
+    ),
+    "migrated_bodies": stored["bodies"],
+    "compression_ratio": (
+      round(stored["size"] / stored["stored_size"], 1) if stored["stored_size"] else None
+    ),
+  }
+  logger.info(f"Archives payload benchmark for '{email}': {result}")
+  return result
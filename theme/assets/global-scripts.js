@@ -263,4 +263,101 @@ window.toggleStructureBrandingControls = function(canEdit) {
     controls.style.display = canEdit ? 'block' : 'none';
     disabledMsg.style.display = canEdit ? 'none' : 'block';
   }
-};
\ No newline at end of file
+};
+/**
+ * Persistent client cache, used by Cache.py so screens can render from disk
+ * on startup and revalidate afterwards. Entries are JSON strings tagged with
+ * their owner (the user id) and the payload schema version; a mismatch on
+ * either reads as a miss. Bumping PERSISTENT_CACHE_DB_VERSION drops the store.
+ */
+const PERSISTENT_CACHE_DB = 'checkvetCacheDB';
+const PERSISTENT_CACHE_DB_VERSION = 1;
+const PERSISTENT_CACHE_STORE = 'entries';
+let persistentCacheDbPromise = null;
+
+function openPersistentCacheDb() {
+  if (!persistentCacheDbPromise) {
+    persistentCacheDbPromise = new Promise((resolve, reject) => {
+      if (!window.indexedDB) {
+        reject(new Error('IndexedDB is not available.'));
+        return;
+      }
+      const request = indexedDB.open(PERSISTENT_CACHE_DB, PERSISTENT_CACHE_DB_VERSION);
+      request.onupgradeneeded = () => {
+        // Everything in this store can be refetched, so upgrades start empty.
+        const db = request.result;
+        if (db.objectStoreNames.contains(PERSISTENT_CACHE_STORE)) {
+          db.deleteObjectStore(PERSISTENT_CACHE_STORE);
+        }
+        db.createObjectStore(PERSISTENT_CACHE_STORE, { keyPath: 'key' });
+      };
+      request.onsuccess = () => resolve(request.result);
+      request.onerror = () => reject(request.error);
+    }).catch(err => {
+      persistentCacheDbPromise = null;
+      throw err;
+    });
+  }
+  return persistentCacheDbPromise;
+}
+
+function persistentCacheRequest(mode, action) {
+  return openPersistentCacheDb().then(db => new Promise((resolve, reject) => {
+    const tx = db.transaction(PERSISTENT_CACHE_STORE, mode);
+    const request = action(tx.objectStore(PERSISTENT_CACHE_STORE));
+    tx.oncomplete = () => resolve(request.result);
+    tx.onerror = () => reject(tx.error);
+  }));
+}
+
+/**
+ * Reads a cache entry.
+ * @param {string} key - The entry name ('reports', 'templates', ...).
+ * @param {string} owner - The id of the user the entry must belong to.
+ * @param {number} schemaVersion - The payload version the caller understands.
+ * @returns {Promise<string|null>} The JSON payload, or null on any miss or error.
+ */
+window.persistentCacheGet = function(key, owner, schemaVersion) {
+  return persistentCacheRequest('readonly', store => store.get(key))
+    .then(entry => {
+      if (!entry || entry.owner !== owner || entry.schemaVersion !== schemaVersion) {
+        return null;
+      }
+      return entry.data;
+    })
+    .catch(err => {
+      globalLogger.warn(`persistentCacheGet: could not read '${key}'.`, err);
+      return null;
+    });
+};
+
+/**
+ * Writes a cache entry in the background; errors are logged, never raised.
+ * @param {string} key - The entry name.
+ * @param {string} owner - The id of the user the entry belongs to.
+ * @param {number} schemaVersion - The payload version.
+ * @param {string} data - The JSON payload.
+ */
+window.persistentCachePut = function(key, owner, schemaVersion, data) {
+  persistentCacheRequest('readwrite', store => store.put({
+    key, owner, schemaVersion, data, savedAt: Date.now()
+  })).catch(err => globalLogger.warn(`persistentCachePut: could not write '${key}'.`, err));
+};
+
+/**
+ * Deletes one cache entry in the background.
+ * @param {string} key - The entry name.
+ */
+window.persistentCacheDelete = function(key) {
+  persistentCacheRequest('readwrite', store => store.delete(key))
+    .catch(err => globalLogger.warn(`persistentCacheDelete: could not delete '${key}'.`, err));
+};
+
+/**
+ * Deletes every cache entry, e.g. on logout.
+ * @returns {Promise<void>}
+ */
+window.persistentCacheClear = function() {
+  return persistentCacheRequest('readwrite', store => store.clear())
+    .catch(err => globalLogger.warn('persistentCacheClear: could not clear the cache.', err));
+};